@@ -0,0 +1,374 @@
+import math
+
+import numpy as np
+
+# Order codes used by the batch kernel
+HOLD = 0
+BUY = 1
+SELL = -1
+
+# How buys are sized: "sequential" is the per-fill capital / n_symbols split of
+# the per-day loop; the others size every buy of a day from its opening cash
+ALLOCATIONS = ("sequential", "equal", "signal")
+
+
+class CostModel:
+    """Transaction costs and cash / position constraints applied to every fill
+
+    A buy spends at most its investment and never more than the cash on hand;
+    the fixed `fee` comes out of that budget and the rest buys shares at the
+    close marked up by half the spread plus market impact. A sell is capped at
+    the shares held and receives the close marked down the same way, less the
+    fee. Impact is `impact_bps * participation ** impact_exponent`, where
+    participation is the order's share of the bar's volume, and
+    `max_participation` caps an order at that share of the volume. Bars without
+    a positive volume get no impact and no cap.
+    """
+
+    def __init__(self, fee=0.0, spread_bps=0.0, impact_bps=0.0, impact_exponent=0.5, max_participation=None):
+        self.fee = fee
+        self.spread_bps = spread_bps
+        self.impact_bps = impact_bps
+        self.impact_exponent = impact_exponent
+        self.max_participation = max_participation
+
+    @property
+    def needs_volume(self):
+        return self.impact_bps > 0 or self.max_participation is not None
+
+    def __repr__(self):
+        return (f"CostModel(fee={self.fee}, spread_bps={self.spread_bps}, impact_bps={self.impact_bps}, "
+                f"impact_exponent={self.impact_exponent}, max_participation={self.max_participation})")
+
+    def fill(self, action, investment, close, volume, cash, held):
+        """(shares, price, cash flow, cost) of one order; zero shares when it cannot trade"""
+        if action == BUY:
+            shares = (min(investment, cash) - self.fee) / close
+        else:
+            shares = min(investment / close, held)
+        if shares <= 0:
+            return 0.0, close, 0.0, 0.0
+
+        slip = self.spread_bps / 2e4
+        if volume > 0:
+            if self.max_participation is not None:
+                shares = min(shares, self.max_participation * volume)
+            if self.impact_bps > 0:
+                slip += self.impact_bps / 1e4 * math.pow(shares / volume, self.impact_exponent)
+
+        if action == BUY:
+            price = close * (1 + slip)
+            # The budget pays for the markup too, so buy fewer shares at the worse price
+            shares = shares / (1 + slip)
+            flow = -(shares * price + self.fee)
+        else:
+            price = close * (1 - slip)
+            flow = shares * price - self.fee
+            if flow <= 0:
+                return 0.0, close, 0.0, 0.0
+        return shares, price, flow, shares * close * slip + self.fee
+
+    def fill_day(self, buy, investment, close, volume, cash, held):
+        """Vectorized fill for one day's orders, all sized from the same opening cash
+
+        `buy` marks buys, the other entries are sells. When the day's buys ask
+        for more than `cash` they are scaled down together. Returns shares,
+        price, cash flow and cost arrays; orders that cannot trade get zero shares.
+        """
+        budget = np.where(buy, investment, 0.0)
+        asked = budget.sum()
+        if asked > cash:
+            budget *= max(cash, 0.0) / asked
+        shares = np.where(buy, (budget - self.fee) / close, np.minimum(investment / close, held))
+        np.maximum(shares, 0.0, out=shares)
+
+        slip = self.spread_bps / 2e4
+        if self.needs_volume:
+            with np.errstate(divide="ignore", invalid="ignore"):
+                liquid = volume > 0
+                if self.max_participation is not None:
+                    shares = np.where(liquid, np.minimum(shares, self.max_participation * volume), shares)
+                if self.impact_bps > 0:
+                    impact = self.impact_bps / 1e4 * np.power(shares / volume, self.impact_exponent)
+                    slip = slip + np.where(liquid, impact, 0.0)
+
+        markup = np.where(buy, slip, -slip) + 1.0
+        price = close * markup
+        shares = np.where(buy, shares / markup, shares)
+        value = shares * price
+        flow = np.where(buy, -(value + self.fee), value - self.fee)
+        filled = (shares > 0) & (buy | (flow > 0))
+        return (np.where(filled, shares, 0.0), np.where(filled, price, close), np.where(filled, flow, 0.0),
+                np.where(filled, shares * close * np.abs(markup - 1.0) + self.fee, 0.0))
+
+
+def symbol_matrix(data, symbols, column, n_days):
+    """(days x symbols) array of one column, NaN where a symbol has no row"""
+    out = np.full((n_days, len(symbols)), np.nan)
+    for j, symbol in enumerate(symbols):
+        if symbol in data and column in data[symbol]:
+            values = data[symbol][column].iloc[:n_days].to_numpy(dtype=float)
+            out[:len(values), j] = values
+    return out
+
+
+def predict_probabilities(models, data, symbols, features, n_days):
+    """Run predict_proba once per symbol over the whole feature matrix"""
+    n_symbols = len(symbols)
+    p_down = np.full((n_days, n_symbols), np.nan)
+    p_up = np.full((n_days, n_symbols), np.nan)
+    closes = np.full((n_days, n_symbols), np.nan)
+    present = np.zeros((n_days, n_symbols), dtype=bool)
+    tradable = np.zeros((n_days, n_symbols), dtype=bool)
+
+    for j, symbol in enumerate(symbols):
+        if symbol not in data:
+            continue
+        frame = data[symbol].iloc[:n_days]
+        rows = len(frame)
+        if rows == 0:
+            continue
+        present[:rows, j] = True
+
+        try:
+            closes[:rows, j] = frame["close"].to_numpy(dtype=float)
+            probs = models[symbol].predict_proba(frame[features])
+        except (KeyError, IndexError) as e:
+            print(f"Error processing {symbol}: {e}")
+            continue
+
+        p_down[:rows, j] = probs[:, 0]
+        p_up[:rows, j] = probs[:, 1]
+        tradable[:rows, j] = True
+
+    return p_down, p_up, closes, present, tradable
+
+
+def decide_orders(p_down, p_up, p_up_threshold, p_down_threshold,
+                  strong_threshold=0.8, strong_fraction=0.3, weak_fraction=0.1):
+    """Vectorized version of TradingSimulator.trade_strategy over every (day, symbol)"""
+    # NaN probabilities compare False everywhere, so missing bars fall through to Hold
+    strong_buy = p_up > strong_threshold
+    weak_buy = ~strong_buy & (p_up > p_up_threshold)
+    buy = strong_buy | weak_buy
+    strong_sell = ~buy & (p_down > strong_threshold)
+    weak_sell = ~buy & ~strong_sell & (p_down > p_down_threshold)
+
+    side = np.select([buy, strong_sell | weak_sell], [BUY, SELL], HOLD).astype(np.int8)
+    fraction = np.select(
+        [strong_buy, weak_buy, strong_sell, weak_sell],
+        [strong_fraction, weak_fraction, strong_fraction, weak_fraction],
+        0.0,
+    )
+    return side, fraction
+
+
+def simulate_trades(side, fraction, closes, present, tradable, capital, holdings,
+                    reference_capital, allocation_divisor, costs=None, volumes=None):
+    """Apply precomputed orders in a single pass over time
+
+    Cash is shared across symbols, so fills have to be applied in day and symbol
+    order; everything that does not depend on cash is decided up front by
+    decide_orders. Arithmetic is done in the same order as the per-day loop so
+    results match it exactly. With a CostModel, fills go through `costs.fill`
+    using the (days x symbols) `volumes`.
+    """
+    n_days, n_symbols = closes.shape
+    side = side.tolist()
+    fraction = fraction.tolist()
+    close_rows = closes.tolist()
+    present = present.tolist()
+    tradable = tradable.tolist()
+    holdings = list(holdings)
+    if costs is not None:
+        volume_rows = volumes.tolist() if volumes is not None else [[math.nan] * n_symbols] * n_days
+    total_cost = 0.0
+
+    values = np.full((n_days, n_symbols), np.nan)
+    positions = np.empty((n_days, n_symbols))
+    cash = np.empty(n_days)
+    total = np.empty(n_days)
+    stock_sum = np.empty(n_days)
+    last_value = [None] * n_symbols
+    trades = {"day": [], "symbol": [], "side": [], "quantity": [], "price": [], "cash": []}
+
+    for day in range(n_days):
+        day_side = side[day]
+        day_fraction = fraction[day]
+        day_close = close_rows[day]
+        day_tradable = tradable[day]
+
+        for j in range(n_symbols):
+            if not day_tradable[j]:
+                continue
+            close = day_close[j]
+            action = day_side[j]
+            price = close
+            if costs is not None and action != HOLD:
+                investment = day_fraction[j] * (capital / allocation_divisor if action == BUY else holdings[j])
+                quantity, price, flow, cost = costs.fill(action, investment, close, volume_rows[day][j],
+                                                         capital, holdings[j])
+                if quantity > 0:
+                    holdings[j] += quantity if action == BUY else -quantity
+                    capital += flow
+                    total_cost += cost
+                else:
+                    action = HOLD
+            elif action == BUY:
+                investment = day_fraction[j] * (capital / allocation_divisor)
+                quantity = investment / close
+                holdings[j] += quantity
+                capital -= investment
+            elif action == SELL:
+                investment = day_fraction[j] * holdings[j]
+                quantity = investment / close
+                holdings[j] -= quantity
+                capital += investment
+            if action != HOLD:
+                trades["day"].append(day)
+                trades["symbol"].append(j)
+                trades["side"].append(action)
+                trades["quantity"].append(quantity)
+                trades["price"].append(price)
+                trades["cash"].append(capital)
+            last_value[j] = holdings[j] * close
+            values[day, j] = last_value[j]
+
+        total_value = 0
+        for value in last_value:
+            if value is not None:
+                total_value += value
+        total_value += capital - reference_capital
+        total[day] = total_value
+        positions[day] = holdings
+        cash[day] = capital
+
+        day_present = present[day]
+        stock_total = 0
+        for j in range(n_symbols):
+            if day_present[j]:
+                stock_total += day_close[j]
+        stock_sum[day] = stock_total
+
+    return {
+        "capital": capital,
+        "holdings": holdings,
+        "values": values,
+        "positions": positions,
+        "cash": cash,
+        "total": total,
+        "stock_sum": stock_sum,
+        "trades": trades,
+        "trade_count": len(trades["day"]),
+        "costs": total_cost,
+    }
+
+
+def allocation_weights(side, p_up, p_up_threshold, scheme="equal"):
+    """Share of a day's opening cash each buy order may draw on, per (day, symbol)
+
+    "equal" gives every symbol in the universe 1 / n_symbols. "signal" splits
+    the day's cash across that day's buys in proportion to how far p_up clears
+    the buy threshold, so cash follows conviction instead of universe size.
+    """
+    n_symbols = side.shape[1]
+    buy = side == BUY
+    if scheme == "equal":
+        return np.where(buy, 1.0 / n_symbols, 0.0)
+    if scheme == "signal":
+        edge = np.where(buy, np.maximum(p_up - p_up_threshold, 0.0), 0.0)
+        totals = edge.sum(axis=1, keepdims=True)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(totals > 0, edge / totals, 0.0)
+    raise ValueError(f"Unknown allocation scheme '{scheme}', expected one of {ALLOCATIONS}")
+
+
+def simulate_cross_sectional(side, fraction, weights, closes, present, tradable, capital, holdings,
+                             reference_capital, costs=None, volumes=None):
+    """Apply precomputed orders one whole day at a time
+
+    Every buy of a day is sized from the cash at the open (fraction * weight *
+    cash) instead of the cash left after the previous symbol's fill, so a day
+    is a handful of array operations however many symbols trade. A CostModel
+    is applied to the whole day at once with `costs.fill_day`. Returns the
+    same result layout as simulate_trades.
+    """
+    n_days, n_symbols = closes.shape
+    holdings = np.array(holdings, dtype=float)
+
+    values = np.full((n_days, n_symbols), np.nan)
+    positions = np.empty((n_days, n_symbols))
+    cash = np.empty(n_days)
+    total = np.empty(n_days)
+    stock_sum = np.where(present, closes, 0.0).sum(axis=1)
+    # Symbols without a mark yet contribute nothing to the total
+    last_value = np.zeros(n_symbols)
+    fills = []
+    total_cost = 0.0
+
+    for day in range(n_days):
+        live = tradable[day]
+        close = closes[day]
+        buy = live & (side[day] == BUY)
+        sell = live & (side[day] == SELL)
+        traded = np.flatnonzero(buy | sell)
+
+        if len(traded):
+            # Sells keep the per-day loop's sizing: fraction of the share count
+            investment = np.where(buy, fraction[day] * weights[day] * capital, fraction[day] * holdings)[traded]
+            bought = buy[traded]
+            price = close[traded]
+            if costs is None:
+                quantity = investment / price
+                flow = np.where(bought, -investment, investment)
+            else:
+                volume = volumes[day][traded] if volumes is not None else np.full(len(traded), np.nan)
+                quantity, price, flow, cost = costs.fill_day(bought, investment, price, volume, capital,
+                                                             holdings[traded])
+                total_cost += float(cost.sum())
+                filled = quantity > 0
+                traded, bought, quantity, price, flow = (
+                    traded[filled], bought[filled], quantity[filled], price[filled], flow[filled]
+                )
+        if len(traded):
+            holdings[traded] += np.where(bought, quantity, -quantity)
+            running = capital + np.cumsum(flow)
+            capital = float(running[-1])
+            fills.append((np.full(len(traded), day), traded, side[day][traded], quantity, price, running))
+
+        marked = holdings[live] * close[live]
+        values[day, live] = marked
+        last_value[live] = marked
+        total[day] = last_value.sum() + capital - reference_capital
+        positions[day] = holdings
+        cash[day] = capital
+
+    columns = ("day", "symbol", "side", "quantity", "price", "cash")
+    if fills:
+        trades = {name: np.concatenate(parts).tolist() for name, parts in zip(columns, zip(*fills))}
+    else:
+        trades = {name: [] for name in columns}
+
+    return {
+        "capital": capital,
+        "holdings": holdings.tolist(),
+        "values": values,
+        "positions": positions,
+        "cash": cash,
+        "total": total,
+        "stock_sum": stock_sum,
+        "trades": trades,
+        "trade_count": len(trades["day"]),
+        "costs": total_cost,
+    }
+
+
+def max_drawdown(equity):
+    """Largest peak-to-trough drop of an equity curve, as a fraction of the peak"""
+    equity = np.asarray(equity, dtype=float)
+    if equity.size == 0:
+        return 0.0
+    peaks = np.maximum.accumulate(equity)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        drawdowns = np.where(peaks > 0, 1.0 - equity / peaks, 0.0)
+    return float(np.max(drawdowns))
@@ -0,0 +1,121 @@
+import csv
+import heapq
+import os
+import time
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from market_store import CSV_SUFFIX, DATA_PATH
+
+# One daily bar: a datetime64[D] date, the symbol and the row's fields
+Bar = namedtuple("Bar", ["date", "symbol", "row"])
+
+
+def _parse_date(value):
+    """datetime64[D] for a date string, NaT if it does not parse"""
+    try:
+        return np.datetime64(pd.Timestamp(value).date(), "D")
+    except (ValueError, TypeError):
+        return np.datetime64("NaT")
+
+
+def _parse_value(value):
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return value
+
+
+def csv_bars(symbol, data_path=DATA_PATH, start=None, end=None, chunksize=10000, date_column="datetime"):
+    """Bars for one symbol read from its CSV a chunk at a time
+
+    Rows whose date does not parse are skipped, like in the date-aligned panel.
+    """
+    start = None if start is None else np.datetime64(pd.Timestamp(start).date(), "D")
+    end = None if end is None else np.datetime64(pd.Timestamp(end).date(), "D")
+    path = os.path.join(data_path, f"{symbol}{CSV_SUFFIX}")
+    for chunk in pd.read_csv(path, chunksize=chunksize):
+        dates = pd.to_datetime(chunk[date_column], format="ISO8601", errors="coerce")
+        dates = dates.to_numpy().astype("datetime64[D]")
+        for date, row in zip(dates, chunk.to_dict("records")):
+            if np.isnat(date):
+                continue
+            if start is not None and date < start:
+                continue
+            if end is not None and date > end:
+                return
+            yield Bar(date, symbol, row)
+
+
+def follow_csv(path, symbol, poll_interval=1.0, idle_timeout=None, date_column="datetime"):
+    """Bars from a CSV that another process keeps appending to, like `tail -f`
+
+    Existing rows are replayed first. The generator then waits for new lines
+    and stops after `idle_timeout` seconds without any, or never if it is None.
+    """
+    with open(path, newline="") as f:
+        header = next(csv.reader([f.readline()]))
+        pending = ""
+        idle = 0.0
+        while True:
+            line = f.readline()
+            if not line or not line.endswith("\n"):
+                # Keep a partially written line until the writer finishes it
+                pending += line
+                if idle_timeout is not None and idle >= idle_timeout:
+                    return
+                time.sleep(poll_interval)
+                idle += poll_interval
+                continue
+            idle = 0.0
+            line, pending = pending + line, ""
+            if not line.strip():
+                continue
+            row = {name: _parse_value(value) for name, value in zip(header, next(csv.reader([line])))}
+            date = _parse_date(row.get(date_column))
+            if not np.isnat(date):
+                yield Bar(date, symbol, row)
+
+
+def _ranked(source, rank):
+    for sequence, bar in enumerate(source):
+        yield bar.date, rank, sequence, bar
+
+
+def merge_bars(sources):
+    """k-way merge of per-symbol bar streams into one date-ordered stream
+
+    Each source must already be in date order. Bars on the same date come out
+    in the order the sources were given. Only one pending bar per source is
+    held in memory.
+    """
+    for _, _, _, bar in heapq.merge(*(_ranked(source, rank) for rank, source in enumerate(sources))):
+        yield bar
+
+
+def group_by_date(bars):
+    """Collect a date-ordered bar stream into (date, {symbol: row}) days
+
+    A repeated (date, symbol) keeps its first bar and bars that go back in
+    time are dropped.
+    """
+    current = None
+    day = {}
+    for bar in bars:
+        if current is not None and bar.date < current:
+            print(f"Dropping out-of-order bar for {bar.symbol} on {bar.date}")
+            continue
+        if current is not None and bar.date != current:
+            yield current, day
+            day = {}
+        current = bar.date
+        day.setdefault(bar.symbol, bar.row)
+    if current is not None:
+        yield current, day
+
+
+def csv_days(symbols, data_path=DATA_PATH, start=None, end=None, chunksize=10000):
+    """Date-ordered days across several symbols' CSVs"""
+    return group_by_date(merge_bars([csv_bars(symbol, data_path, start, end, chunksize) for symbol in symbols]))
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Benchmark the per-day simulation loop against the batch backtest engine.
+Runs both over the full CSV history and checks that they produce the same results.
+"""
+
+import sys
+import time
+
+import numpy as np
+
+from daily_trades import INITIAL_CAPITAL, SYMBOLS, TradingSimulator, load_models, load_stock_data
+
+
+def results_match(loop_sim, batch_sim):
+    """Check that two simulators ended in the same state"""
+    if loop_sim.capital != batch_sim.capital:
+        return False
+    if loop_sim.holdings != batch_sim.holdings:
+        return False
+    for symbol in SYMBOLS:
+        if not np.array_equal(loop_sim.portfolio_values[symbol], batch_sim.portfolio_values[symbol]):
+            return False
+    if not np.array_equal(loop_sim.total_portfolio_value, batch_sim.total_portfolio_value):
+        return False
+    return np.array_equal(loop_sim.stock_shares, batch_sim.stock_shares)
+
+
+def time_run(method, models, data, sample_size):
+    """Time a single simulation run"""
+    start = time.perf_counter()
+    method(models, data, sample_size)
+    return time.perf_counter() - start
+
+
+def main():
+    """Run the backtest benchmark"""
+    models = load_models()
+    if not models:
+        print("Failed to load models. Exiting.")
+        return 1
+
+    # A sample size larger than any CSV keeps the full history
+    data = load_stock_data(sample_size=sys.maxsize)
+    if not data:
+        print("Failed to load stock data. Exiting.")
+        return 1
+    sample_size = max(len(df) for df in data.values())
+
+    print(f"Benchmarking {sample_size} days x {len(SYMBOLS)} symbols...")
+
+    loop_sim = TradingSimulator(INITIAL_CAPITAL)
+    loop_time = time_run(loop_sim.run_simulation, models, data, sample_size)
+
+    batch_sim = TradingSimulator(INITIAL_CAPITAL)
+    batch_time = time_run(batch_sim.run_batch_simulation, models, data, sample_size)
+
+    print(f"Per-day loop:  {loop_time:.3f}s")
+    print(f"Batch engine:  {batch_time:.3f}s")
+    print(f"Speedup:       {loop_time / batch_time:.1f}x")
+
+    if not results_match(loop_sim, batch_sim):
+        print("✗ Batch results differ from the per-day loop")
+        return 1
+    print("✓ Batch results match the per-day loop")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+Benchmark data loading, indicator computation, inference and simulation on synthetic data.
+Generates a reproducible OHLCV universe of any size, times each pipeline stage and
+optionally compares the results against a saved baseline to flag regressions.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import joblib
+import numpy as np
+import pandas as pd
+import sklearn
+from sklearn.ensemble import RandomForestClassifier
+
+import graph
+import robustness
+from backtest import (
+    CostModel, allocation_weights, decide_orders, predict_probabilities, simulate_cross_sectional, simulate_trades,
+    symbol_matrix,
+)
+from daily_trades import INITIAL_CAPITAL, P_DOWN_THRESHOLD, P_UP_THRESHOLD, SYMBOLS, TradingSimulator
+from indicators import FEATURES, IndicatorEngine, compute_features, compute_grouped_features
+from market_store import CSV_SUFFIX, MarketStore, convert_csv_to_store, load_symbol_frame, open_long_store
+from model_registry import MODEL_SUFFIX
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+DEFAULT_TOLERANCE = 0.2
+START_DATE = "2000-01-03"
+
+# Entry points timed by --startup, and the packages they should not load up front
+ENTRY_POINTS = ["daily_trades", "graph"]
+HEAVY_MODULES = ["pandas", "matplotlib", "sklearn", "joblib"]
+
+# Columns of the long-format price_data.csv files
+LONG_COLUMNS = ["close", "datetime", "high", "low", "open", "symbol", "volume"]
+
+
+def synthetic_symbols(n_symbols):
+    """The simulator's symbols first, then generated names"""
+    return [SYMBOLS[i] if i < len(SYMBOLS) else f"SYN{i:04d}" for i in range(n_symbols)]
+
+
+def synthetic_ohlcv(symbol, n_days, seed=0):
+    """Random-walk daily bars in the price_data CSV layout, with features and labels"""
+    rng = np.random.default_rng(seed)
+    returns = rng.normal(0.0003, 0.015, n_days)
+    close = 100.0 * np.exp(np.cumsum(returns))
+    open_ = close * np.exp(rng.normal(0.0, 0.005, n_days))
+    high = np.maximum(open_, close) * np.exp(np.abs(rng.normal(0.0, 0.008, n_days)))
+    low = np.minimum(open_, close) * np.exp(-np.abs(rng.normal(0.0, 0.008, n_days)))
+    volume = rng.integers(1_000_000, 50_000_000, n_days).astype(float)
+
+    df = pd.DataFrame({
+        "symbol": symbol,
+        "datetime": pd.bdate_range(START_DATE, periods=n_days).strftime("%Y-%m-%d"),
+        "close": close,
+        "high": high,
+        "low": low,
+        "open": open_,
+        "volume": volume,
+    })
+    df = pd.concat([df, compute_features(df)], axis=1)
+    # Label each day with the direction of the next close, as the notebooks do
+    df["Prediction"] = np.where(df["close"].shift(-1) >= df["close"], 1.0, -1.0)
+    return df
+
+
+def write_universe(directory, n_symbols, n_days, seed=0, n_trees=100):
+    """Write synthetic CSVs and one trained model per symbol; returns (data_path, model_path)"""
+    data_path = os.path.join(directory, "stock_data")
+    model_path = os.path.join(directory, "models")
+    os.makedirs(data_path, exist_ok=True)
+    os.makedirs(model_path, exist_ok=True)
+    for i, symbol in enumerate(synthetic_symbols(n_symbols)):
+        df = synthetic_ohlcv(symbol, n_days, seed + i)
+        df.to_csv(os.path.join(data_path, f"{symbol}{CSV_SUFFIX}"), index=False)
+        train = df.dropna(subset=FEATURES)
+        model = RandomForestClassifier(n_estimators=n_trees, random_state=seed, n_jobs=-1)
+        model.fit(train[FEATURES], train["Prediction"])
+        model.n_jobs = None
+        joblib.dump(model, os.path.join(model_path, f"{symbol}{MODEL_SUFFIX}"))
+    return data_path, model_path
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, None where unavailable"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+class StageTimer:
+    """Collects wall time per named stage across repeats, and each stage's own peak allocation
+
+    With trace_memory set, stages run under tracemalloc and record the peak
+    of the memory they allocated instead of a time, so tracing overhead never
+    reaches the timings. The process-wide ru_maxrss cannot be split by stage:
+    after the largest stage it is the same for every later one.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.trace_memory = False
+
+    def run(self, name, func, *args, **kwargs):
+        stage = self.stages.setdefault(name, {"runs": [], "peak_alloc_mb": None})
+        with contextlib.redirect_stdout(io.StringIO()):
+            if self.trace_memory:
+                tracemalloc.start()
+                try:
+                    result = func(*args, **kwargs)
+                    peak = tracemalloc.get_traced_memory()[1]
+                finally:
+                    tracemalloc.stop()
+                stage["peak_alloc_mb"] = peak / (1024 * 1024)
+                return result
+            start = time.perf_counter()
+            result = func(*args, **kwargs)
+            elapsed = time.perf_counter() - start
+        stage["runs"].append(elapsed)
+        return result
+
+    def results(self):
+        return {
+            name: {
+                "min": min(stage["runs"]),
+                "median": statistics.median(stage["runs"]),
+                "runs": stage["runs"],
+                "peak_alloc_mb": stage["peak_alloc_mb"],
+            }
+            for name, stage in self.stages.items()
+        }
+
+
+def run_pipeline(timer, symbols, data_path, model_path, store_path, loop):
+    """One pass over every stage"""
+    data = timer.run("load_csv", lambda: {s: load_symbol_frame(s, data_path) for s in symbols})
+    timer.run("store_convert", convert_csv_to_store, data_path, store_path, symbols)
+    store = MarketStore(store_path)
+    timer.run("load_store", lambda: {s: load_symbol_frame(s, data_path, store) for s in symbols})
+
+    timer.run("features_batch", lambda: [compute_features(data[s]) for s in symbols])
+    timer.run("features_stream", lambda: [IndicatorEngine().update_frame(data[s]) for s in symbols])
+    panel = pd.concat([data[s].assign(symbol=s) for s in symbols], ignore_index=True)
+    timer.run("features_grouped", compute_grouped_features, panel)
+
+    # The same bars as one long-format file, rows interleaved by date like a multi-symbol download
+    long_path = f"{store_path}_prices.csv"
+    panel.sort_values("datetime", kind="stable")[LONG_COLUMNS].to_csv(long_path, index=False)
+    long_store = timer.run("long_partition", open_long_store, long_path, f"{store_path}_long")
+    month = (START_DATE, pd.bdate_range(START_DATE, periods=21)[-1].strftime("%Y-%m-%d"))
+
+    def long_filter_csv():
+        df = pd.read_csv(long_path)
+        return df[df["symbol"].isin(symbols[:2]) & df["datetime"].between(*month)].sort_values(["symbol", "datetime"])
+
+    timer.run("long_filter_csv", long_filter_csv)
+    timer.run("long_query", long_store.query, symbols[:2], *month)
+
+    models = timer.run(
+        "load_models", lambda: {s: joblib.load(os.path.join(model_path, f"{s}{MODEL_SUFFIX}")) for s in symbols}
+    )
+    n_days = max(len(df) for df in data.values())
+    p_down, p_up, closes, present, tradable = timer.run(
+        "predict", predict_probabilities, models, data, symbols, FEATURES, n_days
+    )
+
+    def simulate():
+        side, fraction = decide_orders(p_down, p_up, P_UP_THRESHOLD, P_DOWN_THRESHOLD)
+        return simulate_trades(side, fraction, closes, present, tradable, INITIAL_CAPITAL,
+                               [0] * len(symbols), INITIAL_CAPITAL, len(symbols))
+
+    timer.run("simulate_batch", simulate)
+
+    def simulate_universe():
+        side, fraction = decide_orders(p_down, p_up, P_UP_THRESHOLD, P_DOWN_THRESHOLD)
+        weights = allocation_weights(side, p_up, P_UP_THRESHOLD, "equal")
+        return simulate_cross_sectional(side, fraction, weights, closes, present, tradable, INITIAL_CAPITAL,
+                                        [0] * len(symbols), INITIAL_CAPITAL)
+
+    timer.run("simulate_universe", simulate_universe)
+
+    # Same orders with fees, spread and volume impact on every fill
+    costs = CostModel(fee=0.01, spread_bps=5, impact_bps=20, max_participation=0.1)
+    volumes = symbol_matrix(data, symbols, "volume", n_days)
+
+    def simulate_costs():
+        side, fraction = decide_orders(p_down, p_up, P_UP_THRESHOLD, P_DOWN_THRESHOLD)
+        return simulate_trades(side, fraction, closes, present, tradable, INITIAL_CAPITAL,
+                               [0] * len(symbols), INITIAL_CAPITAL, len(symbols), costs, volumes)
+
+    timer.run("simulate_costs", simulate_costs)
+    timer.run("graph_simulation", graph.run_trading_simulation, models, data, 10000, symbols)
+    timer.run("robustness_paths", robustness.run_robustness, models, data, 1000, 75, "block",
+              robustness.BLOCK_SIZE, 0, 1, None, symbols)
+
+    if loop:
+        # run_simulation only trades the four original symbols
+        timer.run("simulate_loop", TradingSimulator().run_simulation, models, data, n_days)
+
+
+def import_profile(statement, cwd=None):
+    """Run `statement` under python -X importtime in a fresh interpreter
+
+    Returns {module: cumulative import time in seconds} for every module loaded.
+    """
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        cwd=cwd or os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True, text=True, check=True,
+    )
+    profile = {}
+    for line in completed.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        profile[name.strip()] = int(cumulative) / 1e6
+    return profile
+
+
+def startup_times(repeat=3):
+    """Best import time of each entry point, and which heavy packages it pulled in"""
+    results = {}
+    for module in ENTRY_POINTS:
+        runs = [import_profile(f"import {module}") for _ in range(repeat)]
+        results[module] = {
+            "min": min(profile[module] for profile in runs),
+            "heavy_imports": [name for name in HEAVY_MODULES if name in runs[0]],
+        }
+    return results
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Stages whose best time regressed past the tolerance, as {stage: ratio}"""
+    regressions = {}
+    for name, stage in results["stages"].items():
+        reference = baseline.get("stages", {}).get(name)
+        if not reference or reference["min"] <= 0:
+            continue
+        ratio = stage["min"] / reference["min"]
+        if ratio > 1 + tolerance:
+            regressions[name] = ratio
+    return regressions
+
+
+def main(argv=None):
+    """Run the benchmark suite"""
+    parser = argparse.ArgumentParser(description="Benchmark the trading pipeline on synthetic data")
+    parser.add_argument("--symbols", type=int, default=len(SYMBOLS))
+    parser.add_argument("--days", type=int, default=2500)
+    parser.add_argument("--trees", type=int, default=100, help="Trees per synthetic model")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--loop", action="store_true", help="Also time the per-day run_simulation loop (slow)")
+    parser.add_argument("--startup", action="store_true",
+                        help="Only measure entry-point import time with -X importtime")
+    parser.add_argument("--output", default=None, help="Write results as JSON")
+    parser.add_argument("--baseline", default=None, help="Results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Allowed slowdown before a stage counts as a regression (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    if args.startup:
+        print(f"{'Entry point':18} {'import (ms)':>12}  heavy imports")
+        for module, stats in startup_times(args.repeat).items():
+            print(f"{module:18} {stats['min'] * 1000:12.1f}  {', '.join(stats['heavy_imports']) or '-'}")
+        return 0
+
+    symbols = synthetic_symbols(args.symbols)
+    timer = StageTimer()
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"Generating {args.symbols} symbols x {args.days} days...")
+        data_path, model_path = write_universe(directory, args.symbols, args.days, args.seed, args.trees)
+        for i in range(args.repeat):
+            store_path = os.path.join(directory, f"store{i}")
+            start = time.perf_counter()
+            run_pipeline(timer, symbols, data_path, model_path, store_path, args.loop)
+            print(f"Run {i + 1}/{args.repeat}: {time.perf_counter() - start:.3f}s")
+        print("Measuring each stage's peak allocation...")
+        timer.trace_memory = True
+        run_pipeline(timer, symbols, data_path, model_path, os.path.join(directory, "store_traced"), args.loop)
+
+    results = {
+        "config": {
+            "symbols": args.symbols, "days": args.days, "trees": args.trees,
+            "repeat": args.repeat, "seed": args.seed, "loop": args.loop,
+        },
+        "environment": {
+            "python": platform.python_version(), "platform": platform.platform(),
+            "numpy": np.__version__, "pandas": pd.__version__, "sklearn": sklearn.__version__,
+        },
+        "stages": timer.results(),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+    print(f"\n{'Stage':18} {'min (s)':>10} {'median (s)':>11} {'peak alloc (MB)':>16}")
+    for name, stage in results["stages"].items():
+        print(f"{name:18} {stage['min']:10.4f} {stage['median']:11.4f} {stage['peak_alloc_mb']:16.1f}")
+    if results["peak_rss_mb"] is not None:
+        print(f"Peak RSS of the whole run: {results['peak_rss_mb']:.1f} MB")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults saved to '{args.output}'")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("config") != results["config"]:
+            print("Warning: baseline was recorded with a different configuration")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            for name, ratio in regressions.items():
+                print(f"✗ {name} is {ratio:.2f}x slower than the baseline")
+            return 1
+        print(f"✓ No stage slower than the baseline by more than {args.tolerance:.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,19 +1,33 @@
-import joblib
-import pandas as pd
-import matplotlib.pyplot as plt
+import argparse
 import os
 from datetime import datetime, timedelta
 
-def load_models():
+from backtest import (
+    ALLOCATIONS, BUY, SELL, CostModel, allocation_weights, decide_orders, predict_probabilities,
+    simulate_cross_sectional, simulate_trades, symbol_matrix,
+)
+from indicators import FEATURES, IndicatorEngine
+from instrumentation import METRICS
+from ledger import PortfolioLedger
+
+# joblib (and sklearn through the pickles), pandas and matplotlib are imported
+# where they are first needed so headless runs and --help start quickly
+
+def load_models(lazy=False, max_bytes=None, mmap_mode=None, compact=False, symbols=None):
     """Load pre-trained models with error handling"""
     model_path = "stock_notebooks/models/"
     models = {}
     
+    if lazy:
+        # Models load on first access and are evicted LRU past max_bytes
+        from model_registry import ModelRegistry
+        return ModelRegistry(model_path, max_bytes=max_bytes, mmap_mode=mmap_mode, compact=compact, symbols=symbols)
+    
     try:
-        models['AAPL'] = joblib.load(os.path.join(model_path, "AAPL_model.pkl"))
-        models['AMZN'] = joblib.load(os.path.join(model_path, "AMZN_model.pkl"))
-        models['KO'] = joblib.load(os.path.join(model_path, "KO_model.pkl"))
-        models['MSFT'] = joblib.load(os.path.join(model_path, "MSFT_model.pkl"))
+        import joblib
+        for symbol in symbols or SYMBOLS:
+            with METRICS.timer("model_load"):
+                models[symbol] = joblib.load(os.path.join(model_path, f"{symbol}_model.pkl"))
         return models
     except FileNotFoundError as e:
         print(f"Error loading models: {e}")
@@ -22,16 +36,37 @@ def load_models():
         print(f"Unexpected error loading models: {e}")
         return None
 
-def load_stock_data(sample_size=75):
-    """Load stock data with error handling"""
+def load_stock_data(sample_size=75, start=None, end=None, feature_cache=None, symbols=None, prices=None):
+    """Load stock data with error handling, recomputing features through feature_cache if given
+
+    Symbols whose model train.py fitted on recomputed features (see
+    model_registry.feature_source) get them from the feature cache too.
+
+    `prices` is a long-format CSV (one row per symbol and date) to read instead
+    of the per-symbol files. It only holds OHLCV, so its indicators always come
+    from a feature cache.
+    """
+    from feature_cache import FeatureCache, load_feature_frame
+    from market_store import STORE_PATH, MarketStore, load_symbol_frame, open_long_store
+    from model_registry import feature_source
+
     data_path = "stock_notebooks/stock_data/"
+    store = MarketStore(STORE_PATH)
     data = {}
     
     try:
-        data['AAPL'] = pd.read_csv(os.path.join(data_path, "AAPL_price_data.csv")).tail(sample_size)
-        data['AMZN'] = pd.read_csv(os.path.join(data_path, "AMZN_price_data.csv")).tail(sample_size)
-        data['KO'] = pd.read_csv(os.path.join(data_path, "KO_price_data.csv")).tail(sample_size)
-        data['MSFT'] = pd.read_csv(os.path.join(data_path, "MSFT_price_data.csv")).tail(sample_size)
+        if prices is not None:
+            store, data_path = open_long_store(prices), None
+            feature_cache = feature_cache or FeatureCache()
+        for symbol in symbols or SYMBOLS:
+            cache = feature_cache
+            if cache is None and feature_source(symbol) == "computed":
+                # Serve the features the model was trained on
+                cache = FeatureCache()
+            if cache is not None:
+                data[symbol] = load_feature_frame(symbol, cache, data_path, store, start, end, sample_size)
+            else:
+                data[symbol] = load_symbol_frame(symbol, data_path, store, start=start, end=end, tail=sample_size)
         return data
     except FileNotFoundError as e:
         print(f"Error loading stock data: {e}")
@@ -45,46 +80,106 @@ P_UP_THRESHOLD = 0.6
 P_DOWN_THRESHOLD = 0.6
 INITIAL_CAPITAL = 1000
 
-# Feature columns for model prediction
-FEATURES = [
-    "RSI",
-    "k_percent",
-    "r_percent",
-    "Price_Rate_Of_Change",
-    "MACD",
-    "On Balance Volume",
-]
+# Position sizing: strong signals trade a larger fraction than weak ones
+STRONG_THRESHOLD = 0.8
+STRONG_FRACTION = 0.3
+WEAK_FRACTION = 0.1
+
+# Symbols traded by the simulator unless a universe is given
+SYMBOLS = ['AAPL', 'AMZN', 'KO', 'MSFT']
+
+# Per-symbol lines and holdings shown by plot_results / print_summary
+MAX_PLOTTED_SYMBOLS = 10
 
 class TradingSimulator:
-    def __init__(self, initial_capital=INITIAL_CAPITAL):
+    def __init__(self, initial_capital=INITIAL_CAPITAL, p_up_threshold=P_UP_THRESHOLD,
+                 p_down_threshold=P_DOWN_THRESHOLD, strong_threshold=STRONG_THRESHOLD,
+                 strong_fraction=STRONG_FRACTION, weak_fraction=WEAK_FRACTION, symbols=None,
+                 allocation="sequential", costs=None):
+        if allocation not in ALLOCATIONS:
+            raise ValueError(f"Unknown allocation scheme '{allocation}', expected one of {ALLOCATIONS}")
+        self.initial_capital = initial_capital
         self.capital = initial_capital
-        self.holdings = {'AAPL': 0, 'AMZN': 0, 'KO': 0, 'MSFT': 0}
-        self.portfolio_values = {'AAPL': [], 'AMZN': [], 'KO': [], 'MSFT': []}
-        self.total_portfolio_value = []
-        self.stock_shares = []
+        self.p_up_threshold = p_up_threshold
+        self.p_down_threshold = p_down_threshold
+        self.strong_threshold = strong_threshold
+        self.strong_fraction = strong_fraction
+        self.weak_fraction = weak_fraction
+        self.symbols = list(symbols) if symbols is not None else list(SYMBOLS)
+        self.allocation = allocation
+        # Optional backtest.CostModel; without one every order fills at the close for free
+        self.costs = costs
+        self.costs_paid = 0.0
+        self.last_fill = ("Hold", 0.0, 0.0)
+        self.holdings = {symbol: 0 for symbol in self.symbols}
+        # IndicatorEngine per symbol for replays with compute_features, kept so a stream can be continued
+        self.engines = {}
+        # Per-day positions, values and totals plus the trade blotter
+        self.ledger = PortfolioLedger(self.symbols, initial_capital)
+
+    @property
+    def portfolio_values(self):
+        """Marked value of each symbol on the days it traded"""
+        return {symbol: self.ledger.symbol_values(symbol) for symbol in self.ledger.symbols}
+
+    @property
+    def total_portfolio_value(self):
+        return self.ledger.total
+
+    @property
+    def stock_shares(self):
+        return self.ledger.stock_sum
+
+    def _require_sequential(self, method):
+        if self.allocation != "sequential":
+            raise ValueError(f"{method} only supports the sequential allocation, not '{self.allocation}'; "
+                             f"use run_batch_simulation")
+
+    def record_trade(self, day, symbol, action, quantity, price, capital, date=None):
+        """Log a Buy or Sell in the ledger's trade blotter"""
+        if action == "Hold":
+            return
+        side = BUY if action == "Buy" else SELL
+        METRICS.count("trades", side=action.lower())
+        self.ledger.record_trade(day, symbol, side, quantity, price, capital, date)
         
     def trade_strategy(self, capital_allocation, p_down, p_up, holdings):
         """Determine trading action based on prediction probabilities"""
         action = "Hold"
         investment = 0
 
-        if p_up > 0.8:
+        if p_up > self.strong_threshold:
             action = "Buy"
-            investment = 0.3 * capital_allocation
-        elif p_up > P_UP_THRESHOLD:
+            investment = self.strong_fraction * capital_allocation
+        elif p_up > self.p_up_threshold:
             action = "Buy"
-            investment = 0.1 * capital_allocation
-        elif p_down > 0.8:
+            investment = self.weak_fraction * capital_allocation
+        elif p_down > self.strong_threshold:
             action = "Sell"
-            investment = 0.3 * holdings
-        elif p_down > P_DOWN_THRESHOLD:
+            investment = self.strong_fraction * holdings
+        elif p_down > self.p_down_threshold:
             action = "Sell"
-            investment = 0.1 * holdings
+            investment = self.weak_fraction * holdings
 
         return action, investment
 
-    def execute_trade(self, action, investment, holdings, close_price):
-        """Execute a trade and return updated capital and holdings"""
+    def execute_trade(self, action, investment, holdings, close_price, volume=float("nan")):
+        """Execute a trade and return updated capital and holdings
+
+        The fill, (action, shares, price), is kept in self.last_fill; with a
+        cost model an order that cannot trade becomes a Hold.
+        """
+        self.last_fill = (action, investment / close_price, close_price)
+        if action != "Hold" and self.costs is not None:
+            side = BUY if action == "Buy" else SELL
+            shares, price, flow, cost = self.costs.fill(side, investment, close_price, volume, self.capital, holdings)
+            if shares <= 0:
+                self.last_fill = ("Hold", 0.0, close_price)
+                return holdings
+            self.last_fill = (action, shares, price)
+            self.capital += flow
+            self.costs_paid += cost
+            return holdings + shares if side == BUY else holdings - shares
         if action == "Buy":
             shares_bought = investment / close_price
             holdings += shares_bought
@@ -96,89 +191,247 @@ class TradingSimulator:
         return holdings
 
     def run_simulation(self, models, data, sample_size=75):
-        """Run the trading simulation"""
+        """Run the trading simulation
+
+        Buys are sized from an equal share of the capital, so only the
+        "sequential" allocation is supported; run_batch_simulation implements
+        the cross-sectional schemes.
+        """
+        self._require_sequential("run_simulation")
         if not models or not data:
             print("Cannot run simulation: models or data not loaded")
             return
             
+        self.ledger.reserve(sample_size)
+        last_value = self.ledger.last_values()
         for day in range(sample_size):
             # Get current day data for each stock
             current_data = {}
-            for symbol in ['AAPL', 'AMZN', 'KO', 'MSFT']:
-                if day < len(data[symbol]):
+            day_values = {}
+            ledger_day = self.ledger.days
+            for symbol in self.symbols:
+                if symbol in data and day < len(data[symbol]):
                     current_data[symbol] = data[symbol].iloc[day]
                 else:
                     continue
                     
             # Get predictions for each stock
-            for symbol in ['AAPL', 'AMZN', 'KO', 'MSFT']:
+            for symbol in self.symbols:
                 if symbol not in current_data:
                     continue
                     
                 try:
-                    probs = models[symbol].predict_proba([current_data[symbol][FEATURES]])[0]
+                    with METRICS.timer("predict"):
+                        probs = models[symbol].predict_proba([current_data[symbol][FEATURES]])[0]
+                    METRICS.count("predict_calls")
                     action, investment = self.trade_strategy(
-                        self.capital / 4, probs[0], probs[1], self.holdings[symbol]
+                        self.capital / len(self.symbols), probs[0], probs[1], self.holdings[symbol]
                     )
                     
                     # Execute trade
-                    self.holdings[symbol] = self.execute_trade(
-                        action, investment, self.holdings[symbol], current_data[symbol]["close"]
-                    )
+                    with METRICS.timer("trade_execution"):
+                        self.holdings[symbol] = self.execute_trade(
+                            action, investment, self.holdings[symbol], current_data[symbol]["close"],
+                            current_data[symbol].get("volume", float("nan"))
+                        )
+                    self.record_trade(ledger_day, symbol, *self.last_fill, self.capital)
                     
                     # Track portfolio values
                     stock_value = self.holdings[symbol] * current_data[symbol]["close"]
-                    self.portfolio_values[symbol].append(stock_value)
+                    day_values[symbol] = stock_value
+                    last_value[symbol] = stock_value
                     
                 except (KeyError, IndexError) as e:
                     print(f"Error processing {symbol} on day {day}: {e}")
+                    METRICS.count("errors", stage="predict")
                     continue
             
+            if not day_values:
+                METRICS.count("skipped_days")
+            
             # Calculate total portfolio value
-            total_value = sum(self.portfolio_values[symbol][-1] for symbol in ['AAPL', 'AMZN', 'KO', 'MSFT'] if self.portfolio_values[symbol])
-            total_value += self.capital - INITIAL_CAPITAL
-            self.total_portfolio_value.append(total_value)
+            total_value = sum(last_value[symbol] for symbol in self.symbols if symbol in last_value)
+            total_value += self.capital - self.initial_capital
             
             # Track stock shares (sum of close prices)
-            stock_sum = sum(current_data[symbol]["close"] for symbol in ['AAPL', 'AMZN', 'KO', 'MSFT'] if symbol in current_data)
-            self.stock_shares.append(stock_sum)
+            stock_sum = sum(current_data[symbol]["close"] for symbol in self.symbols if symbol in current_data)
+            self.ledger.record_day(dict(self.holdings), day_values, self.capital, total_value, stock_sum)
+
+    def run_batch_simulation(self, models, data, sample_size=75):
+        """Run the trading simulation with one predict_proba call per symbol
+
+        With the default "sequential" allocation the result matches
+        run_simulation exactly, costs included. The cross-sectional schemes decide each day
+        for the whole universe in a few array operations (see
+        backtest.simulate_cross_sectional).
+        """
+        if not models or not data:
+            print("Cannot run simulation: models or data not loaded")
+            return
+
+        symbols = self.symbols
+        with METRICS.timer("predict"):
+            p_down, p_up, closes, present, tradable = predict_probabilities(
+                models, data, symbols, FEATURES, sample_size
+            )
+        METRICS.count("predict_calls", int(tradable.any(axis=0).sum()))
+        with METRICS.timer("simulate"):
+            side, fraction = decide_orders(
+                p_down, p_up, self.p_up_threshold, self.p_down_threshold,
+                self.strong_threshold, self.strong_fraction, self.weak_fraction
+            )
+            holdings = [self.holdings[symbol] for symbol in symbols]
+            volumes = None
+            if self.costs is not None and self.costs.needs_volume:
+                volumes = symbol_matrix(data, symbols, "volume", sample_size)
+            if self.allocation == "sequential":
+                result = simulate_trades(
+                    side, fraction, closes, present, tradable,
+                    self.capital, holdings, self.initial_capital, len(symbols), self.costs, volumes
+                )
+            else:
+                weights = allocation_weights(side, p_up, self.p_up_threshold, self.allocation)
+                result = simulate_cross_sectional(
+                    side, fraction, weights, closes, present, tradable,
+                    self.capital, holdings, self.initial_capital, self.costs, volumes
+                )
+        if METRICS.enabled:
+            sides = result["trades"]["side"]
+            METRICS.count("trades", sides.count(BUY), side="buy")
+            METRICS.count("trades", sides.count(SELL), side="sell")
+            METRICS.count("skipped_days", int((~tradable.any(axis=1)).sum()))
+
+        self.capital = result["capital"]
+        self.costs_paid += result["costs"]
+        for j, symbol in enumerate(symbols):
+            self.holdings[symbol] = result["holdings"][j]
+        self.ledger.record_batch(result, symbols)
+
+    def replay(self, models, days, symbols=None, compute_features=False):
+        """Trade a stream of (date, {symbol: row}) days and yield a portfolio snapshot per day
+
+        Only the latest value per symbol is kept, so memory does not grow with
+        the number of days. With compute_features the model features are
+        updated from OHLCV by an IndicatorEngine per symbol instead of being
+        read from the rows; the engines stay on the simulator, so a later
+        replay of the following days continues from the same state. Like
+        run_simulation, it only supports the "sequential" allocation.
+        """
+        self._require_sequential("replay")
+        import pandas as pd
+
+        symbols = list(symbols) if symbols is not None else self.symbols
+        for symbol in symbols:
+            self.holdings.setdefault(symbol, 0)
+            if compute_features:
+                self.engines.setdefault(symbol, IndicatorEngine())
+        engines = self.engines if compute_features else None
+        last_value = self.ledger.last_values()
+
+        for date, bars in days:
+            values = {}
+            trades = []
+            for symbol in symbols:
+                if symbol not in bars:
+                    continue
+                row = bars[symbol]
+                if engines is not None:
+                    row = {**row, **engines[symbol].update(row["close"], row["high"], row["low"], row["volume"])}
+                    bars[symbol] = row
+
+                try:
+                    with METRICS.timer("predict"):
+                        # A named one-row frame, as the forests were fitted with feature names
+                        X = pd.DataFrame([[row[feature] for feature in FEATURES]], columns=FEATURES)
+                        probs = models[symbol].predict_proba(X)[0]
+                    METRICS.count("predict_calls")
+                    action, investment = self.trade_strategy(
+                        self.capital / len(symbols), probs[0], probs[1], self.holdings[symbol]
+                    )
+                    with METRICS.timer("trade_execution"):
+                        self.holdings[symbol] = self.execute_trade(
+                            action, investment, self.holdings[symbol], row["close"], row.get("volume", float("nan"))
+                        )
+                    if self.last_fill[0] != "Hold":
+                        trades.append((symbol, *self.last_fill, self.capital))
+                    values[symbol] = self.holdings[symbol] * row["close"]
+                    last_value[symbol] = values[symbol]
+                except (KeyError, IndexError) as e:
+                    print(f"Error processing {symbol} on {date}: {e}")
+                    METRICS.count("errors", stage="predict")
+                    continue
+
+            if not values:
+                METRICS.count("skipped_days")
+
+            total_value = sum(last_value[symbol] for symbol in symbols if symbol in last_value)
+            total_value += self.capital - self.initial_capital
+            yield {
+                "date": date,
+                "capital": self.capital,
+                "holdings": {symbol: self.holdings[symbol] for symbol in symbols},
+                "values": values,
+                "trades": trades,
+                "total_value": total_value,
+                "stock_sum": sum(bars[symbol]["close"] for symbol in symbols if symbol in bars),
+            }
+
+    def run_stream_simulation(self, models, days, symbols=None, compute_features=False):
+        """Replay a day stream and record its history for plot_results"""
+        for snapshot in self.replay(models, days, symbols, compute_features):
+            self.record_snapshot(snapshot)
+
+    def record_snapshot(self, snapshot):
+        """Add one replay snapshot and its fills to the ledger"""
+        day = self.ledger.days
+        for symbol, action, quantity, price, capital in snapshot["trades"]:
+            self.record_trade(day, symbol, action, quantity, price, capital, snapshot["date"])
+        self.ledger.record_day(
+            snapshot["holdings"], snapshot["values"], snapshot["capital"],
+            snapshot["total_value"], snapshot["stock_sum"], snapshot["date"]
+        )
 
     def plot_results(self):
         """Plot portfolio performance over time"""
-        if not self.total_portfolio_value:
+        if len(self.ledger) == 0:
             print("No data to plot")
             return
+
+        import matplotlib.pyplot as plt
+        import pandas as pd
             
         # Generate date range based on data length
         start_date = datetime.now() - timedelta(days=len(self.total_portfolio_value))
         dates = pd.date_range(start=start_date, end=datetime.now(), periods=len(self.total_portfolio_value))
         
-        plt.figure(figsize=(14, 10))
+        with METRICS.timer("plot"):
+            plt.figure(figsize=(14, 10))
         
-        # Plot individual stock portfolio values
-        for symbol in ['AAPL', 'AMZN', 'KO', 'MSFT']:
-            if self.portfolio_values[symbol]:
-                plt.plot(dates[:len(self.portfolio_values[symbol])], 
-                        self.portfolio_values[symbol], 
-                        label=f"{symbol} Portfolio Value")
+            # Plot individual stock portfolio values; a large universe only gets the totals
+            portfolio_values = self.portfolio_values if len(self.symbols) <= MAX_PLOTTED_SYMBOLS else {}
+            for symbol in self.symbols:
+                if len(portfolio_values.get(symbol, [])):
+                    plt.plot(dates[:len(portfolio_values[symbol])], 
+                            portfolio_values[symbol], 
+                            label=f"{symbol} Portfolio Value")
         
-        # Plot total portfolio value
-        plt.plot(dates[:len(self.total_portfolio_value)], 
-                self.total_portfolio_value, 
-                label="Total Portfolio Value", linewidth=2)
+            # Plot total portfolio value
+            plt.plot(dates[:len(self.total_portfolio_value)], 
+                    self.total_portfolio_value, 
+                    label="Total Portfolio Value", linewidth=2)
         
-        # Plot stock shares
-        if self.stock_shares:
-            plt.plot(dates[:len(self.stock_shares)], 
-                    self.stock_shares, 
-                    label="Stock Shares", linestyle='--')
+            # Plot stock shares
+            if len(self.stock_shares):
+                plt.plot(dates[:len(self.stock_shares)], 
+                        self.stock_shares, 
+                        label="Stock Shares", linestyle='--')
         
-        plt.title("Portfolio Performance Over Time")
-        plt.xlabel("Date")
-        plt.ylabel("Value ($)")
-        plt.legend()
-        plt.grid(True, alpha=0.3)
-        plt.tight_layout()
+            plt.title("Portfolio Performance Over Time")
+            plt.xlabel("Date")
+            plt.ylabel("Value ($)")
+            plt.legend()
+            plt.grid(True, alpha=0.3)
+            plt.tight_layout()
         plt.show()
         
         # Print summary statistics
@@ -189,33 +442,104 @@ class TradingSimulator:
         print("\n" + "="*50)
         print("TRADING SIMULATION SUMMARY")
         print("="*50)
-        print(f"Initial Capital: ${INITIAL_CAPITAL:,.2f}")
+        stats = self.ledger.summary()
+        print(f"Initial Capital: ${self.initial_capital:,.2f}")
         print(f"Final Capital: ${self.capital:,.2f}")
-        print(f"Total Return: ${self.capital - INITIAL_CAPITAL:,.2f}")
-        print(f"Return Percentage: {((self.capital - INITIAL_CAPITAL) / INITIAL_CAPITAL * 100):.2f}%")
+        print(f"Final Portfolio Value: ${stats['final_value']:,.2f}")
+        print(f"Total Return: ${stats['total_return']:,.2f}")
+        print(f"Return Percentage: {stats['return_pct']:.2f}%")
+        print(f"Max Drawdown: {stats['max_drawdown_pct']:.2f}%")
+        print(f"Sharpe Ratio: {stats['sharpe']:.2f}")
+        print(f"Trades: {stats['trades']} ({stats['buys']} buys, {stats['sells']} sells), turnover {stats['turnover']:.2f}x")
+        if self.costs is not None:
+            print(f"Transaction Costs: ${self.costs_paid:,.2f}")
         print("\nFinal Holdings:")
-        for symbol, shares in self.holdings.items():
+        held = list(self.holdings.items())
+        if len(held) > MAX_PLOTTED_SYMBOLS:
+            held = [(symbol, shares) for symbol, shares in held if shares]
+        for symbol, shares in held[:MAX_PLOTTED_SYMBOLS]:
             print(f"  {symbol}: {shares:.4f} shares")
+        if len(held) > MAX_PLOTTED_SYMBOLS:
+            print(f"  ... and {len(held) - MAX_PLOTTED_SYMBOLS} more")
         print("="*50)
 
-def main():
+def main(argv=None):
     """Main function to run the trading simulation"""
-    print("Loading trading models...")
-    models = load_models()
+    parser = argparse.ArgumentParser(description="Run the daily trading simulation")
+    parser.add_argument("--no-plot", action="store_true",
+                        help="Headless run: print the summary without opening a chart")
+    parser.add_argument("--universe", default=None,
+                        help="Tickers to trade: a universe file, comma separated symbols, or 'scan' for every "
+                             "symbol with data and a model (default: universe.txt if present, else the four)")
+    parser.add_argument("--prices", default=None,
+                        help="Long-format price CSV (one row per symbol and date) to trade instead of the "
+                             "per-symbol files; without --universe every symbol in it with a model is traded")
+    parser.add_argument("--allocation", choices=ALLOCATIONS, default="sequential",
+                        help="How buys share capital across the universe; the default matches the per-day loop, "
+                             "equal and signal scale to large universes")
+    parser.add_argument("--fee", type=float, default=0.0, help="Fixed commission per trade, in dollars")
+    parser.add_argument("--spread-bps", type=float, default=0.0, help="Bid-ask spread in basis points")
+    parser.add_argument("--impact-bps", type=float, default=0.0,
+                        help="Market impact in basis points at 100%% of the day's volume (square-root law)")
+    parser.add_argument("--max-participation", type=float, default=None,
+                        help="Cap each order at this fraction of the day's volume")
+    parser.add_argument("--checkpoint", metavar="PATH", default=None,
+                        help="Replay the per-symbol CSVs day by day, resuming from this checkpoint "
+                             "(e.g. stock_notebooks/sim_checkpoint.npz) and trading only the new days")
+    parser.add_argument("--start", default=None, help="First date of the checkpointed replay")
+    parser.add_argument("--compute-features", action="store_true",
+                        help="With --checkpoint, update the features from OHLCV instead of reading them")
+    args = parser.parse_args(argv)
+    if args.checkpoint and args.prices:
+        parser.error("--checkpoint replays the per-symbol CSVs and cannot be combined with --prices")
+    if args.checkpoint and args.allocation != "sequential":
+        parser.error("--checkpoint replays day by day and only supports --allocation sequential")
+
+    costs = None
+    if args.fee or args.spread_bps or args.impact_bps or args.max_participation is not None:
+        costs = CostModel(args.fee, args.spread_bps, args.impact_bps, max_participation=args.max_participation)
+
+    from universe import resolve_universe
+    symbols = resolve_universe(args.universe, prices=args.prices)
+    if symbols is None:
+        symbols = SYMBOLS
+    elif not symbols:
+        print("Universe is empty. Exiting.")
+        return
+
+    print(f"Loading trading models for {len(symbols)} symbols...")
+    # Large universes load each model on first use instead of all up front
+    models = load_models(lazy=len(symbols) > len(SYMBOLS), symbols=symbols)
     if not models:
         print("Failed to load models. Exiting.")
         return
     
-    print("Loading stock data...")
-    data = load_stock_data()
-    if not data:
-        print("Failed to load stock data. Exiting.")
-        return
-    
-    print("Starting trading simulation...")
-    simulator = TradingSimulator(INITIAL_CAPITAL)
-    simulator.run_simulation(models, data)
-    simulator.plot_results()
+    if args.checkpoint:
+        from bar_stream import csv_days
+        from sim_checkpoint import model_stamps, resume_simulation
+
+        print(f"Resuming simulation from {args.checkpoint}...")
+        simulator, stats = resume_simulation(
+            models, lambda: csv_days(symbols, start=args.start), args.checkpoint, symbols, args.compute_features,
+            costs, model_stamps(symbols), initial_capital=INITIAL_CAPITAL, allocation=args.allocation,
+        )
+        print(f"Traded {stats['new_days']} new days after {stats['resumed_days']} checkpointed days "
+              f"(last date {stats['last_date']})")
+    else:
+        print("Loading stock data...")
+        data = load_stock_data(symbols=symbols, prices=args.prices)
+        if not data:
+            print("Failed to load stock data. Exiting.")
+            return
+
+        print("Starting trading simulation...")
+        simulator = TradingSimulator(INITIAL_CAPITAL, symbols=symbols, allocation=args.allocation, costs=costs)
+        simulator.run_batch_simulation(models, data)
+    if args.no_plot:
+        simulator.print_summary()
+    else:
+        simulator.plot_results()
+    METRICS.finish_run()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,178 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from bar_stream import csv_days
+from daily_trades import SYMBOLS, TradingSimulator
+from market_store import DATA_PATH
+from model_registry import MODEL_PATH, ModelRegistry
+
+MAX_POINTS = 1000
+RESPONSE_CACHE_SIZE = 256
+
+
+def downsample(values, max_points=MAX_POINTS):
+    """Row indices that keep each bucket's min and max, plus the first and last row
+
+    Peaks and troughs survive, so a downsampled equity curve shows the same
+    drawdowns as the full one.
+    """
+    n = len(values)
+    if max_points is None or n <= max_points:
+        return np.arange(n)
+    buckets = max(1, max_points // 2)
+    bucket = np.arange(n) * buckets // n
+    # Sort by value within each bucket; each bucket's first and last entries are its min and max
+    order = np.lexsort((np.nan_to_num(values, nan=np.inf), bucket))
+    starts = np.searchsorted(bucket[order], np.arange(buckets), side="left")
+    ends = np.searchsorted(bucket[order], np.arange(buckets), side="right") - 1
+    keep = np.concatenate([order[starts], order[ends], [0, n - 1]])
+    return np.unique(keep)
+
+
+def _iso(dates):
+    return np.datetime_as_string(dates, unit="D").tolist()
+
+
+def _floats(values):
+    """JSON-safe list with None for NaN"""
+    return [None if value != value else value for value in np.asarray(values, dtype=float).tolist()]
+
+
+class PortfolioFeed:
+    """A streaming simulation advanced in steps, with cached range queries over its ledger
+
+    Responses are cached by query and by the ledger version, which changes
+    whenever the simulation advances, so repeated requests cost a dict lookup
+    and clients can revalidate with the ETag alone.
+    """
+
+    def __init__(self, simulator, snapshots, cache_size=RESPONSE_CACHE_SIZE):
+        self.simulator = simulator
+        self.snapshots = snapshots
+        self.cache_size = cache_size
+        self.version = 0
+        self.finished = False
+        # `lock` guards the ledger and response cache; predictions for the next day run outside it
+        self.lock = threading.Lock()
+        self._advance_lock = threading.Lock()
+        self._responses = OrderedDict()
+
+    def advance(self, days=None):
+        """Replay up to `days` more days (all remaining if None) and return how many were added"""
+        added = 0
+        with self._advance_lock:
+            while not self.finished and (days is None or added < days):
+                try:
+                    snapshot = next(self.snapshots)
+                except StopIteration:
+                    self.finished = True
+                    break
+                with self.lock:
+                    self.simulator.record_snapshot(snapshot)
+                    self.version += 1
+                    self._responses.clear()
+                added += 1
+        return added
+
+    def run_in_background(self, batch_days=25, interval=0.2):
+        """Advance the simulation from a daemon thread until the stream ends"""
+        def run():
+            while not self.finished:
+                self.advance(batch_days)
+                time.sleep(interval)
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
+
+    def etag(self, name, params):
+        key = json.dumps([name, params, self.version], sort_keys=True, default=str)
+        return hashlib.sha1(key.encode()).hexdigest()
+
+    def response(self, name, params):
+        """(etag, JSON body) for a query, built once per ledger version"""
+        with self.lock:
+            etag = self.etag(name, params)
+            if etag in self._responses:
+                self._responses.move_to_end(etag)
+                return etag, self._responses[etag]
+            body = json.dumps(getattr(self, "_" + name)(**params))
+            self._responses[etag] = body
+            if len(self._responses) > self.cache_size:
+                self._responses.popitem(last=False)
+            return etag, body
+
+    def _rows(self, start, end):
+        dates = self.simulator.ledger.dates
+        lo = 0 if start is None else int(np.searchsorted(dates, np.datetime64(start, "D"), side="left"))
+        hi = len(dates) if end is None else int(np.searchsorted(dates, np.datetime64(end, "D"), side="right"))
+        return slice(lo, hi)
+
+    def _status(self):
+        ledger = self.simulator.ledger
+        return {
+            "days": ledger.days,
+            "first_date": _iso(ledger.dates[:1])[0] if ledger.days else None,
+            "last_date": _iso(ledger.dates[-1:])[0] if ledger.days else None,
+            "finished": self.finished,
+            "version": self.version,
+            "symbols": ledger.symbols,
+            "summary": ledger.summary(),
+        }
+
+    def _portfolio(self, start=None, end=None, points=MAX_POINTS):
+        ledger = self.simulator.ledger
+        rows = self._rows(start, end)
+        equity = ledger.equity()[rows]
+        keep = downsample(equity, points)
+        return {
+            "dates": _iso(ledger.dates[rows][keep]),
+            "equity": _floats(equity[keep]),
+            "stock_sum": _floats(ledger.stock_sum[rows][keep]),
+            "rows": len(equity),
+        }
+
+    def _symbols(self, start=None, end=None, points=MAX_POINTS):
+        ledger = self.simulator.ledger
+        rows = self._rows(start, end)
+        values = ledger.values[rows]
+        keep = downsample(np.nansum(values, axis=1), points)
+        return {
+            "dates": _iso(ledger.dates[rows][keep]),
+            "values": {symbol: _floats(values[keep, j]) for j, symbol in enumerate(ledger.symbols)},
+            "rows": len(values),
+        }
+
+    def _trades(self, start=None, end=None, limit=500):
+        ledger = self.simulator.ledger
+        trades = ledger.trades
+        rows = self._rows(start, end)
+        trades = trades[(trades["day"] >= rows.start) & (trades["day"] < rows.stop)]
+        total = len(trades)
+        trades = trades[-limit:]
+        symbols = np.asarray(ledger.symbols, dtype=object)
+        return {
+            "trades": [
+                {"date": date, "symbol": symbol, "side": "Buy" if side > 0 else "Sell",
+                 "quantity": quantity, "price": price, "cash": cash}
+                for date, symbol, side, quantity, price, cash in zip(
+                    _iso(trades["date"]), symbols[trades["symbol"]].tolist(), trades["side"].tolist(),
+                    trades["quantity"].tolist(), trades["price"].tolist(), trades["cash"].tolist(),
+                )
+            ],
+            "total": total,
+        }
+
+
+def build_feed(symbols=None, start=None, end=None, data_path=DATA_PATH, model_path=MODEL_PATH):
+    """Feed that replays the CSV history for the trading symbols"""
+    symbols = list(symbols) if symbols is not None else SYMBOLS
+    models = ModelRegistry(model_path, compact=True)
+    simulator = TradingSimulator()
+    snapshots = simulator.replay(models, csv_days(symbols, data_path, start=start, end=end), symbols)
+    return PortfolioFeed(simulator, snapshots)
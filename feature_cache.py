@@ -0,0 +1,212 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sys
+
+import joblib
+import numpy as np
+import pandas as pd
+
+import indicators
+from indicators import IndicatorEngine
+from market_store import DATA_PATH, STORE_PATH, MarketStore, load_symbol_frame
+
+FEATURE_CACHE_PATH = "stock_notebooks/feature_cache/"
+FEATURE_CACHE_VERSION = 1
+MAX_CACHE_BYTES = 256 * 1024 * 1024
+
+# Raw columns the indicators read; only these go into the fingerprint
+INPUT_COLUMNS = ["close", "high", "low", "volume"]
+INDICATOR_PARAMETERS = ["RSI_PERIOD", "STOCHASTIC_PERIOD", "MACD_FAST", "MACD_SLOW", "MACD_SIGNAL", "ROC_PERIOD"]
+
+
+def _dates(df):
+    """Bar dates as datetime64[D], NaT where the frame has none"""
+    for name in ("date", "datetime"):
+        if name in df.columns:
+            dates = pd.to_datetime(df[name], format="ISO8601", errors="coerce")
+            return dates.to_numpy().astype("datetime64[D]")
+    return np.full(len(df), np.datetime64("NaT"), dtype="datetime64[D]")
+
+
+def _fingerprint(inputs, dates):
+    """Hash of the raw indicator inputs and dates"""
+    digest = hashlib.sha256()
+    digest.update(np.ascontiguousarray(inputs).tobytes())
+    digest.update(np.ascontiguousarray(dates).tobytes())
+    return digest.hexdigest()
+
+
+class FeatureCache:
+    """On-disk cache of computed indicator matrices, one entry per series
+
+    An entry is found by the series name, the indicator parameters and the
+    first bar, and is valid while the fingerprint of its rows still matches.
+    When bars are appended to a cached series, the stored IndicatorEngine
+    state is resumed so only the new tail is computed. Entries are evicted
+    least recently used first once the cache passes `max_bytes`.
+    """
+
+    def __init__(self, cache_path=FEATURE_CACHE_PATH, max_bytes=MAX_CACHE_BYTES, dtype=np.float64):
+        self.cache_path = cache_path
+        self.max_bytes = max_bytes
+        self.dtype = np.dtype(dtype)
+        self.stats = {"hits": 0, "misses": 0, "recomputes": 0, "rows_computed": 0, "evictions": 0}
+
+    def _params_key(self):
+        params = {name: getattr(indicators, name) for name in INDICATOR_PARAMETERS}
+        return json.dumps({
+            "version": FEATURE_CACHE_VERSION,
+            "params": params,
+            "dtype": self.dtype.str,
+        }, sort_keys=True)
+
+    def _entry_path(self, name, inputs, dates):
+        # The first bar is part of the key so different windows of one symbol get their own entries
+        first = inputs[:1].tobytes() + dates[:1].tobytes()
+        key = hashlib.sha256(self._params_key().encode() + b"|" + str(name).encode() + b"|" + first).hexdigest()
+        return os.path.join(self.cache_path, f"{name}_{key[:16]}.pkl")
+
+    def _load(self, path):
+        if not os.path.exists(path):
+            return None
+        try:
+            return joblib.load(path)
+        except Exception as e:
+            print(f"Ignoring unreadable feature cache {path}: {e}")
+            return None
+
+    def _save(self, path, entry):
+        os.makedirs(self.cache_path, exist_ok=True)
+        joblib.dump(entry, path + ".tmp")
+        os.replace(path + ".tmp", path)
+        self._evict(keep=path)
+
+    def _evict(self, keep=None):
+        """Remove least recently used entries until the cache fits max_bytes"""
+        if self.max_bytes is None:
+            return
+        entries = []
+        for path in glob.glob(os.path.join(self.cache_path, "*.pkl")):
+            try:
+                info = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((info.st_mtime_ns, info.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            self.stats["evictions"] += 1
+
+    def _compute(self, engine, df):
+        rows = engine.update_frame(df)
+        self.stats["rows_computed"] += len(rows)
+        return rows.to_numpy(dtype=self.dtype), list(rows.columns)
+
+    def features(self, name, df):
+        """Indicator columns for an OHLCV frame, from the cache where possible"""
+        inputs = df[INPUT_COLUMNS].to_numpy(dtype=np.float64)
+        dates = _dates(df)
+        path = self._entry_path(name, inputs, dates)
+        entry = self._load(path)
+        rows = len(df)
+
+        if entry is not None and entry["rows"] == rows and entry["fingerprint"] == _fingerprint(inputs, dates):
+            self.stats["hits"] += 1
+            os.utime(path)
+            values, columns = entry["values"], entry["columns"]
+        elif (entry is not None and entry["rows"] < rows
+              and entry["fingerprint"] == _fingerprint(inputs[:entry["rows"]], dates[:entry["rows"]])):
+            # Bars were appended: resume the engine where the cached rows stopped
+            self.stats["recomputes"] += 1
+            engine = entry["engine"]
+            tail, columns = self._compute(engine, df.iloc[entry["rows"]:])
+            values = np.concatenate([entry["values"], tail])
+            self._save(path, self._entry(name, values, columns, dates, inputs, engine))
+        else:
+            self.stats["misses"] += 1
+            engine = IndicatorEngine()
+            values, columns = self._compute(engine, df)
+            self._save(path, self._entry(name, values, columns, dates, inputs, engine))
+
+        return pd.DataFrame(values, index=df.index, columns=columns)
+
+    def _entry(self, name, values, columns, dates, inputs, engine):
+        return {
+            "name": name,
+            "rows": len(values),
+            "fingerprint": _fingerprint(inputs, dates),
+            "columns": columns,
+            "values": values,
+            "dates": dates,
+            "engine": engine,
+        }
+
+    def with_features(self, name, df):
+        """Copy of df with its indicator columns replaced by cached values"""
+        df = df.copy()
+        features = self.features(name, df)
+        for column in features.columns:
+            df[column] = features[column]
+        return df
+
+
+def load_feature_frame(symbol, cache, data_path=DATA_PATH, store=None, start=None, end=None, tail=None):
+    """Load a symbol's full history, attach cached features, then cut the requested window
+
+    Features are computed over the whole history so the window's values do not
+    depend on where it starts. Rows whose date does not parse, e.g. the
+    notebooks' overwritten "1.0" rows, are dropped before the indicators see
+    them; one bar of 1.0s would poison the rolling lows and OBV for good.
+    """
+    df = load_symbol_frame(symbol, data_path, store)
+    df = cache.with_features(symbol, df[~np.isnat(_dates(df))])
+    if start is not None or end is not None:
+        dates = pd.Series(_dates(df), index=df.index)
+        keep = pd.Series(True, index=df.index)
+        if start is not None:
+            keep &= dates >= np.datetime64(pd.Timestamp(start).date(), "D")
+        if end is not None:
+            keep &= dates <= np.datetime64(pd.Timestamp(end).date(), "D")
+        df = df[keep]
+    if tail is not None:
+        df = df.tail(tail)
+    return df
+
+
+def main(argv=None):
+    """Warm the feature cache for every symbol and report hit/miss counts"""
+    parser = argparse.ArgumentParser(description="Build and inspect the indicator feature cache")
+    parser.add_argument("--data-path", default=DATA_PATH)
+    parser.add_argument("--cache-path", default=FEATURE_CACHE_PATH)
+    parser.add_argument("--max-bytes", type=int, default=MAX_CACHE_BYTES)
+    parser.add_argument("--float32", action="store_true", help="Store features as float32")
+    parser.add_argument("symbols", nargs="*", help="Symbols to process (default: every CSV)")
+    args = parser.parse_args(argv)
+
+    symbols = args.symbols or sorted(
+        os.path.basename(path)[:-len("_price_data.csv")]
+        for path in glob.glob(os.path.join(args.data_path, "*_price_data.csv"))
+    )
+    cache = FeatureCache(args.cache_path, args.max_bytes, np.float32 if args.float32 else np.float64)
+    store = MarketStore(STORE_PATH)
+    for symbol in symbols:
+        # The same rows and cache entries the simulators read
+        df = load_feature_frame(symbol, cache, args.data_path, store)
+        print(f"{symbol:6} {len(df):6} rows")
+    print(json.dumps(cache.stats))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,19 +1,32 @@
-import pandas as pd
-import joblib
-import matplotlib.pyplot as plt
+import argparse
 import os
 from datetime import datetime, timedelta
 
-def load_models():
+import numpy as np
+
+from instrumentation import METRICS
+
+# Symbols charted unless a universe is given
+DEFAULT_SYMBOLS = ['AAPL', 'AMZN', 'KO', 'MSFT']
+
+# joblib (and sklearn through the pickles), pandas and matplotlib are imported
+# where they are first needed so headless runs and --help start quickly
+
+def load_models(lazy=False, max_bytes=None, mmap_mode=None, compact=False, symbols=None):
     """Load pre-trained models with error handling"""
     model_path = "stock_notebooks/models/"
     models = {}
     
+    if lazy:
+        # Models load on first access and are evicted LRU past max_bytes
+        from model_registry import ModelRegistry
+        return ModelRegistry(model_path, max_bytes=max_bytes, mmap_mode=mmap_mode, compact=compact, symbols=symbols)
+    
     try:
-        models['AAPL'] = joblib.load(os.path.join(model_path, "AAPL_model.pkl"))
-        models['AMZN'] = joblib.load(os.path.join(model_path, "AMZN_model.pkl"))
-        models['KO'] = joblib.load(os.path.join(model_path, "KO_model.pkl"))
-        models['MSFT'] = joblib.load(os.path.join(model_path, "MSFT_model.pkl"))
+        import joblib
+        for symbol in symbols or DEFAULT_SYMBOLS:
+            with METRICS.timer("model_load"):
+                models[symbol] = joblib.load(os.path.join(model_path, f"{symbol}_model.pkl"))
         return models
     except FileNotFoundError as e:
         print(f"Error loading models: {e}")
@@ -22,16 +35,37 @@ def load_models():
         print(f"Unexpected error loading models: {e}")
         return None
 
-def load_stock_data():
-    """Load stock data with error handling"""
+def load_stock_data(start=None, end=None, feature_cache=None, symbols=None, prices=None):
+    """Load stock data with error handling, recomputing features through feature_cache if given
+
+    Symbols whose model train.py fitted on recomputed features (see
+    model_registry.feature_source) get them from the feature cache too.
+
+    `prices` is a long-format CSV (one row per symbol and date) to read instead
+    of the per-symbol files. It only holds OHLCV, so its indicators always come
+    from a feature cache.
+    """
+    from feature_cache import FeatureCache, load_feature_frame
+    from market_store import STORE_PATH, MarketStore, load_symbol_frame, open_long_store
+    from model_registry import feature_source
+
     data_path = "stock_notebooks/stock_data/"
+    store = MarketStore(STORE_PATH)
     data = {}
     
     try:
-        data['AAPL'] = pd.read_csv(os.path.join(data_path, "AAPL_price_data.csv"))
-        data['AMZN'] = pd.read_csv(os.path.join(data_path, "AMZN_price_data.csv"))
-        data['KO'] = pd.read_csv(os.path.join(data_path, "KO_price_data.csv"))
-        data['MSFT'] = pd.read_csv(os.path.join(data_path, "MSFT_price_data.csv"))
+        if prices is not None:
+            store, data_path = open_long_store(prices), None
+            feature_cache = feature_cache or FeatureCache()
+        for symbol in symbols or DEFAULT_SYMBOLS:
+            cache = feature_cache
+            if cache is None and feature_source(symbol) == "computed":
+                # Serve the features the model was trained on
+                cache = FeatureCache()
+            if cache is not None:
+                data[symbol] = load_feature_frame(symbol, cache, data_path, store, start, end)
+            else:
+                data[symbol] = load_symbol_frame(symbol, data_path, store, start=start, end=end)
         return data
     except FileNotFoundError as e:
         print(f"Error loading stock data: {e}")
@@ -40,114 +74,138 @@ def load_stock_data():
         print(f"Unexpected error loading stock data: {e}")
         return None
 
-def run_trading_simulation(models, data, initial_capital=10000):
+def run_trading_simulation(models, data, initial_capital=10000, symbols=None, max_days=None):
     """Run trading simulation with proper date handling"""
     if not models or not data:
         print("Cannot run simulation: models or data not loaded")
         return None, None
     
-    # Find common date range across all datasets
-    common_dates = set()
-    for symbol, df in data.items():
-        if 'date' in df.columns:
-            df['date'] = pd.to_datetime(df['date'])
-            common_dates.update(df['date'].dt.date)
+    if symbols is None:
+        symbols = [symbol for symbol in data if symbol in models]
+    else:
+        symbols = [symbol for symbol in symbols if symbol in models and symbol in data]
+
+    from panel import build_panel
+
+    # Align every symbol on a shared date axis so each (date, symbol) is a direct index
+    required_features = ['RSI', 'k_percent', 'r_percent', 'Price_Rate_Of_Change', 'MACD', 'On Balance Volume']
+    panel = build_panel(data, required_features + ['open'], symbols)
     
-    if not common_dates:
+    if len(panel) == 0:
         print("No common dates found across datasets")
         return None, None
     
-    # Sort dates and filter to reasonable range
-    sorted_dates = sorted(list(common_dates))
-    if len(sorted_dates) > 100:  # Limit to last 100 days if too many
-        sorted_dates = sorted_dates[-100:]
-    
-    capital = initial_capital
-    portfolio_value = []
-    dates_used = []
-    
-    print(f"Running simulation for {len(sorted_dates)} trading days...")
+    # Limit to the most recent days if requested
+    rows = panel.tail(max_days) if max_days else slice(0, len(panel))
     
-    for date in sorted_dates:
+    # Predict once per symbol over every date it has a bar for
+    signals = np.full((len(panel), len(panel.symbols)), np.nan)
+    for j, symbol in enumerate(panel.symbols):
+        if not set(required_features + ['open']) <= panel.available[symbol]:
+            continue
+        has_bar = panel.mask[rows, j]
+        if not has_bar.any():
+            continue
         try:
-            # Get predictions for each stock
-            total_investment = 0
-            
-            for symbol in ['AAPL', 'AMZN']:  # Focus on main stocks for this example
-                if symbol in models and symbol in data:
-                    # Find data for this date
-                    date_data = data[symbol][data[symbol]['date'].dt.date == date]
-                    if not date_data.empty:
-                        # Use first row if multiple entries for same date
-                        row = date_data.iloc[0]
-                        
-                        # Check if required features exist
-                        required_features = ['RSI', 'k_percent', 'r_percent', 'Price_Rate_Of_Change', 'MACD', 'On Balance Volume']
-                        if all(feature in row.index for feature in required_features):
-                            features = [row[feature] for feature in required_features]
-                            
-                            # Get prediction
-                            prediction = models[symbol].predict([features])[0]
-                            
-                            # Simple strategy: Buy if prediction is 1, sell if 0
-                            if 'open' in row.index:
-                                if prediction == 1 and capital > 0:
-                                    # Buy with 10% of available capital
-                                    investment = min(capital * 0.1, capital)
-                                    capital -= investment
-                                    total_investment += investment
-                                elif prediction == 0 and total_investment > 0:
-                                    # Sell and add back to capital
-                                    capital += total_investment * 0.1
-                                    total_investment *= 0.9
-            
-            # Track portfolio value
-            portfolio_value.append(capital + total_investment)
-            dates_used.append(date)
-            
+            features = panel.features(symbol, required_features)[rows][has_bar]
+            with METRICS.timer("predict"):
+                signals[np.flatnonzero(has_bar) + rows.start, j] = models[symbol].predict(features)
+            METRICS.count("predict_calls")
         except Exception as e:
-            print(f"Error processing date {date}: {e}")
-            continue
+            print(f"Error predicting {symbol}: {e}")
+            METRICS.count("errors", stage="predict")
+    
+    capital = initial_capital
+    portfolio_value = []
+    dates_used = panel.dates[rows].astype(object).tolist()
+    
+    print(f"Running simulation for {len(dates_used)} trading days...")
+    
+    for day_signals in signals[rows].tolist():
+        total_investment = 0
+        
+        for prediction in day_signals:
+            # Simple strategy: Buy if prediction is 1, sell if 0
+            if prediction == 1 and capital > 0:
+                # Buy with 10% of available capital
+                investment = min(capital * 0.1, capital)
+                capital -= investment
+                total_investment += investment
+            elif prediction == 0 and total_investment > 0:
+                # Sell and add back to capital
+                capital += total_investment * 0.1
+                total_investment *= 0.9
+        
+        # Track portfolio value
+        portfolio_value.append(capital + total_investment)
     
     return dates_used, portfolio_value
 
-def plot_portfolio_performance(dates, portfolio_values, initial_capital):
-    """Plot portfolio performance over time"""
+def plot_portfolio_performance(dates, portfolio_values, initial_capital, show=True):
+    """Plot portfolio performance over time, only saving the PNG when show is False"""
     if not dates or not portfolio_values:
         print("No data to plot")
         return
-    
-    plt.figure(figsize=(12, 8))
-    plt.plot(dates, portfolio_values, linewidth=2, color='blue')
-    plt.axhline(y=initial_capital, color='red', linestyle='--', alpha=0.7, label=f'Initial Capital: ${initial_capital:,.2f}')
-    
-    plt.title("Portfolio Value Over Time")
-    plt.xlabel("Date")
-    plt.ylabel("Portfolio Value ($)")
-    plt.legend()
-    plt.grid(True, alpha=0.3)
-    plt.xticks(rotation=45)
-    plt.tight_layout()
+
+    import matplotlib
+    if not show:
+        # Agg renders to files without a display
+        matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    
+    with METRICS.timer("plot"):
+        plt.figure(figsize=(12, 8))
+        plt.plot(dates, portfolio_values, linewidth=2, color='blue')
+        plt.axhline(y=initial_capital, color='red', linestyle='--', alpha=0.7, label=f'Initial Capital: ${initial_capital:,.2f}')
+    
+        plt.title("Portfolio Value Over Time")
+        plt.xlabel("Date")
+        plt.ylabel("Portfolio Value ($)")
+        plt.legend()
+        plt.grid(True, alpha=0.3)
+        plt.xticks(rotation=45)
+        plt.tight_layout()
     
     # Save the plot
     try:
-        plt.savefig("portfolio_performance.png", dpi=300, bbox_inches='tight')
+        with METRICS.timer("plot_save"):
+            plt.savefig("portfolio_performance.png", dpi=300, bbox_inches='tight')
         print("Portfolio performance chart saved as 'portfolio_performance.png'")
     except Exception as e:
         print(f"Error saving plot: {e}")
     
-    plt.show()
+    if show:
+        plt.show()
 
-def main():
+def main(argv=None):
     """Main function to run the trading simulation and visualization"""
+    parser = argparse.ArgumentParser(description="Simulate the portfolio and chart its value")
+    parser.add_argument("--no-plot", action="store_true",
+                        help="Headless run: save portfolio_performance.png on the Agg backend without a window")
+    parser.add_argument("--universe", default=None,
+                        help="Tickers to chart: a universe file, comma separated symbols, or 'scan' "
+                             "(default: universe.txt if present, else the four)")
+    parser.add_argument("--prices", default=None,
+                        help="Long-format price CSV (one row per symbol and date) to chart instead of the "
+                             "per-symbol files; without --universe every symbol in it with a model is used")
+    args = parser.parse_args(argv)
+
+    from universe import resolve_universe
+    symbols = resolve_universe(args.universe, prices=args.prices)
+    if symbols is None:
+        symbols = DEFAULT_SYMBOLS
+    elif not symbols:
+        print("Universe is empty. Exiting.")
+        return
+
     print("Loading trading models...")
-    models = load_models()
+    models = load_models(lazy=len(symbols) > len(DEFAULT_SYMBOLS), symbols=symbols)
     if not models:
         print("Failed to load models. Exiting.")
         return
     
     print("Loading stock data...")
-    data = load_stock_data()
+    data = load_stock_data(symbols=symbols, prices=args.prices)
     if not data:
         print("Failed to load stock data. Exiting.")
         return
@@ -155,13 +213,15 @@ def main():
     initial_capital = 10000
     print(f"Starting trading simulation with ${initial_capital:,.2f} initial capital...")
     
-    dates, portfolio_values = run_trading_simulation(models, data, initial_capital)
+    dates, portfolio_values = run_trading_simulation(models, data, initial_capital, symbols)
     
     if dates and portfolio_values:
         print(f"Simulation completed. Final portfolio value: ${portfolio_values[-1]:,.2f}")
-        plot_portfolio_performance(dates, portfolio_values, initial_capital)
+        plot_portfolio_performance(dates, portfolio_values, initial_capital, show=not args.no_plot)
     else:
         print("Simulation failed to produce results.")
 
+    METRICS.finish_run()
+
 if __name__ == "__main__":
     main()
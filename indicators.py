@@ -0,0 +1,417 @@
+import math
+from collections import deque
+
+import numpy as np
+
+# Indicator parameters used by the stock notebooks
+RSI_PERIOD = 14
+STOCHASTIC_PERIOD = 14
+MACD_FAST = 12
+MACD_SLOW = 26
+MACD_SIGNAL = 9
+ROC_PERIOD = 9
+
+# Feature columns for model prediction
+FEATURES = [
+    "RSI",
+    "k_percent",
+    "r_percent",
+    "Price_Rate_Of_Change",
+    "MACD",
+    "On Balance Volume",
+]
+
+
+def _divide(a, b):
+    """Float division with pandas semantics for a zero denominator"""
+    if b == 0:
+        if a > 0:
+            return math.inf
+        if a < 0:
+            return -math.inf
+        return math.nan
+    return a / b
+
+
+class EWMean:
+    """Incremental x.ewm(span=span).mean() with pandas' default adjust=True weighting"""
+
+    def __init__(self, span):
+        alpha = 2.0 / (span + 1.0)
+        self.decay = 1.0 - alpha
+        self.weighted = math.nan
+        self.old_weight = 1.0
+        self.observations = 0
+
+    def update(self, value):
+        """Add one value and return the current mean"""
+        is_observation = value == value
+        if self.observations == 0 and self.weighted != self.weighted:
+            if is_observation:
+                self.weighted = value
+                self.observations = 1
+            return self.weighted
+
+        # Same update order as pandas' ewm kernel, so results match bit for bit
+        self.old_weight *= self.decay
+        if is_observation:
+            self.observations += 1
+            if self.weighted != value:
+                self.weighted = self.old_weight * self.weighted + value
+                self.weighted /= self.old_weight + 1.0
+            self.old_weight += 1.0
+        return self.weighted
+
+
+class RollingExtreme:
+    """Rolling min or max over a fixed window using a monotonic deque"""
+
+    def __init__(self, window, mode="min"):
+        if mode not in ("min", "max"):
+            raise ValueError(f"mode must be 'min' or 'max', got {mode!r}")
+        self.window = window
+        self.mode = mode
+        self.count = 0
+        self.candidates = deque()
+
+    def update(self, value):
+        """Add one value and return the extreme of the last `window` values"""
+        index = self.count
+        self.count += 1
+        if self.mode == "min":
+            while self.candidates and self.candidates[-1][1] >= value:
+                self.candidates.pop()
+        else:
+            while self.candidates and self.candidates[-1][1] <= value:
+                self.candidates.pop()
+        self.candidates.append((index, value))
+        if self.candidates[0][0] <= index - self.window:
+            self.candidates.popleft()
+
+        if self.count < self.window:
+            return math.nan
+        return self.candidates[0][1]
+
+
+class RateOfChange:
+    """Percent change against the value `periods` bars ago, kept in a ring buffer"""
+
+    def __init__(self, periods):
+        self.periods = periods
+        self.buffer = [math.nan] * periods
+        self.position = 0
+
+    def update(self, value):
+        """Add one value and return value / value[t - periods] - 1"""
+        previous = self.buffer[self.position]
+        self.buffer[self.position] = value
+        self.position = (self.position + 1) % self.periods
+        return _divide(value, previous) - 1
+
+
+class OnBalanceVolume:
+    """Running On Balance Volume"""
+
+    def __init__(self):
+        self.value = 0
+
+    def update(self, change, volume):
+        """Add one bar's price change and volume"""
+        if change > 0:
+            self.value = self.value + volume
+        elif change < 0:
+            self.value = self.value - volume
+        return self.value
+
+
+class IndicatorEngine:
+    """O(1)-per-bar update of the model features for a single symbol"""
+
+    EWM_STATES = ["ewm_up", "ewm_down", "ema_fast", "ema_slow", "macd_signal"]
+    EXTREME_STATES = ["low_min", "high_max"]
+
+    def __init__(self):
+        self.previous_close = math.nan
+        self.ewm_up = EWMean(RSI_PERIOD)
+        self.ewm_down = EWMean(RSI_PERIOD)
+        self.low_min = RollingExtreme(STOCHASTIC_PERIOD, "min")
+        self.high_max = RollingExtreme(STOCHASTIC_PERIOD, "max")
+        self.ema_fast = EWMean(MACD_FAST)
+        self.ema_slow = EWMean(MACD_SLOW)
+        self.macd_signal = EWMean(MACD_SIGNAL)
+        self.roc = RateOfChange(ROC_PERIOD)
+        self.obv = OnBalanceVolume()
+        self.bars = 0
+
+    def update(self, close, high, low, volume):
+        """Add one daily bar and return the indicator values for it"""
+        change = close - self.previous_close
+        self.previous_close = close
+        self.bars += 1
+
+        # Up and down moves keep NaN for the first bar, as in the notebooks
+        up = change if change != change else (0.0 if change < 0 else change)
+        down = change if change != change else abs(0.0 if change > 0 else change)
+        ewma_up = self.ewm_up.update(up)
+        ewma_down = self.ewm_down.update(down)
+        rsi = 100.0 - (100.0 / (1.0 + _divide(ewma_up, ewma_down)))
+
+        low_14 = self.low_min.update(low)
+        high_14 = self.high_max.update(high)
+        k_percent = 100 * _divide(close - low_14, high_14 - low_14)
+        r_percent = _divide(high_14 - close, high_14 - low_14) * -100
+
+        macd = self.ema_fast.update(close) - self.ema_slow.update(close)
+
+        return {
+            "change_in_price": change,
+            "RSI": rsi,
+            "low_14": low_14,
+            "high_14": high_14,
+            "k_percent": k_percent,
+            "r_percent": r_percent,
+            "MACD": macd,
+            "MACD_EMA": self.macd_signal.update(macd),
+            "Price_Rate_Of_Change": self.roc.update(close),
+            "On Balance Volume": self.obv.update(change, volume),
+        }
+
+    def to_arrays(self):
+        """The engine's state as named numeric arrays, for np.savez without pickle"""
+        arrays = {
+            "previous_close": np.float64(self.previous_close),
+            "bars": np.int64(self.bars),
+            "roc_buffer": np.asarray(self.roc.buffer, dtype=np.float64),
+            "roc_position": np.int64(self.roc.position),
+            "obv": np.float64(self.obv.value),
+        }
+        for name in self.EWM_STATES:
+            ewm = getattr(self, name)
+            arrays[name] = np.array([ewm.weighted, ewm.old_weight, ewm.observations], dtype=np.float64)
+        for name in self.EXTREME_STATES:
+            extreme = getattr(self, name)
+            arrays[f"{name}_count"] = np.int64(extreme.count)
+            # (bar index, value) pairs of the monotonic deque
+            arrays[f"{name}_candidates"] = np.array(list(extreme.candidates), dtype=np.float64).reshape(-1, 2)
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """Rebuild an engine from to_arrays() output or the matching entries of an opened .npz file"""
+        engine = cls()
+        engine.previous_close = float(arrays["previous_close"])
+        engine.bars = int(arrays["bars"])
+        engine.roc.buffer = arrays["roc_buffer"].tolist()
+        engine.roc.position = int(arrays["roc_position"])
+        engine.obv.value = float(arrays["obv"])
+        for name in cls.EWM_STATES:
+            ewm = getattr(engine, name)
+            ewm.weighted, ewm.old_weight, observations = arrays[name].tolist()
+            ewm.observations = int(observations)
+        for name in cls.EXTREME_STATES:
+            extreme = getattr(engine, name)
+            extreme.count = int(arrays[f"{name}_count"])
+            extreme.candidates = deque((int(index), value) for index, value in arrays[f"{name}_candidates"].tolist())
+        return engine
+
+    def update_frame(self, df):
+        """Feed every bar of a frame through the engine and return the indicator rows"""
+        import pandas as pd
+
+        rows = [
+            self.update(close, high, low, volume)
+            for close, high, low, volume in zip(
+                df["close"].tolist(), df["high"].tolist(), df["low"].tolist(), df["volume"].tolist()
+            )
+        ]
+        return pd.DataFrame(rows, index=df.index)
+
+
+def compute_features(df):
+    """Compute the notebook indicators for one symbol's OHLCV frame in a single batch"""
+    import pandas as pd
+
+    close = df["close"]
+    change = close.diff()
+
+    up = change.where(~(change < 0), 0.0)
+    down = change.where(~(change > 0), 0.0).abs()
+    relative_strength = up.ewm(span=RSI_PERIOD).mean() / down.ewm(span=RSI_PERIOD).mean()
+
+    low_14 = df["low"].rolling(window=STOCHASTIC_PERIOD).min()
+    high_14 = df["high"].rolling(window=STOCHASTIC_PERIOD).max()
+
+    macd = close.ewm(span=MACD_FAST).mean() - close.ewm(span=MACD_SLOW).mean()
+
+    # Cumulative sum of signed volume is the notebook's obv() loop without the loop
+    signed_volume = np.where(change > 0, df["volume"], np.where(change < 0, -df["volume"], 0.0))
+
+    return pd.DataFrame({
+        "change_in_price": change,
+        "RSI": 100.0 - (100.0 / (1.0 + relative_strength)),
+        "low_14": low_14,
+        "high_14": high_14,
+        "k_percent": 100 * ((close - low_14) / (high_14 - low_14)),
+        "r_percent": ((high_14 - close) / (high_14 - low_14)) * -100,
+        "MACD": macd,
+        "MACD_EMA": macd.ewm(span=MACD_SIGNAL).mean(),
+        "Price_Rate_Of_Change": close.pct_change(periods=ROC_PERIOD),
+        "On Balance Volume": np.cumsum(signed_volume),
+    }, index=df.index)
+
+
+class Segments:
+    """Contiguous per-symbol runs of a concatenated multi-symbol array
+
+    pad() lays the runs side by side as the columns of a (max_length x
+    segments) block, NaN past each run's end, so the column kernels below
+    process every symbol with one vectorized step per bar. unpad() flattens
+    a block back into the original row order.
+    """
+
+    def __init__(self, starts, lengths, order=None):
+        self.starts = np.asarray(starts, dtype=np.intp)
+        self.lengths = np.asarray(lengths, dtype=np.intp)
+        # Rows of the source array in segment order, None if already grouped
+        self.order = order
+        total = int(self.lengths.sum())
+        self.columns = np.repeat(np.arange(len(self.lengths)), self.lengths)
+        self.positions = np.arange(total) - np.repeat(self.starts, self.lengths)
+        self.shape = (int(self.lengths.max()) if len(self.lengths) else 0, len(self.lengths))
+
+    @classmethod
+    def from_keys(cls, keys):
+        """Segments of equal keys; rows keep their relative order within a key"""
+        codes = _factorize(keys)
+        if len(codes) == 0:
+            return cls([], [])
+        # Codes number keys by first appearance, so grouped rows never step back
+        order = None
+        if np.any(codes[1:] < codes[:-1]):
+            order = np.argsort(codes, kind="stable")
+            codes = codes[order]
+        starts = np.concatenate([[0], np.flatnonzero(codes[1:] != codes[:-1]) + 1])
+        lengths = np.diff(np.append(starts, len(codes)))
+        return cls(starts, lengths, order)
+
+    def pad(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        if self.order is not None:
+            values = values[self.order]
+        block = np.full(self.shape, np.nan)
+        block[self.positions, self.columns] = values
+        return block
+
+    def unpad(self, block):
+        values = block[self.positions, self.columns]
+        if self.order is None:
+            return values
+        restored = np.empty_like(values)
+        restored[self.order] = values
+        return restored
+
+
+def _factorize(keys):
+    """Integer code per key in order of first appearance"""
+    _, first, codes = np.unique(np.asarray(keys), return_index=True, return_inverse=True)
+    # Renumber so codes follow first appearance rather than sort order
+    rank = np.empty(len(first), dtype=np.intp)
+    rank[np.argsort(first, kind="stable")] = np.arange(len(first))
+    return rank[codes.ravel()]
+
+
+def shift_columns(block, periods=1):
+    """Each column shifted down by `periods` bars, NaN-filled at the top"""
+    shifted = np.full_like(block, np.nan)
+    if periods < len(block):
+        shifted[periods:] = block[:len(block) - periods]
+    return shifted
+
+
+def ewm_mean_columns(block, span):
+    """x.ewm(span=span).mean() down every column at once
+
+    Steps through the bars in the same order as EWMean, vectorized across
+    columns, so each column matches pandas bit for bit.
+    """
+    decay = 1.0 - 2.0 / (span + 1.0)
+    n_bars, n_columns = block.shape
+    out = np.empty_like(block)
+    weighted = np.full(n_columns, np.nan)
+    old_weight = np.ones(n_columns)
+    started = np.zeros(n_columns, dtype=bool)
+
+    with np.errstate(invalid="ignore"):
+        for t in range(n_bars):
+            value = block[t]
+            observed = value == value
+            # A column's first observation is taken as is; running columns decay,
+            # then fold the observation in
+            first = ~started & observed
+            old_weight = np.where(started, old_weight * decay, old_weight)
+            update = started & observed
+            blended = (old_weight * weighted + value) / (old_weight + 1.0)
+            weighted = np.where(first, value, np.where(update & (weighted != value), blended, weighted))
+            old_weight = np.where(update, old_weight + 1.0, old_weight)
+            started = started | first
+            out[t] = weighted
+    return out
+
+
+def rolling_extreme_columns(block, window, mode="min"):
+    """x.rolling(window).min() / .max() down every column, NaN until the window is full"""
+    if mode not in ("min", "max"):
+        raise ValueError(f"mode must be 'min' or 'max', got {mode!r}")
+    out = np.full_like(block, np.nan)
+    if len(block) >= window:
+        windows = np.lib.stride_tricks.sliding_window_view(block, window, axis=0)
+        # Any NaN in the window leaves fewer than `window` observations, which pandas reports as NaN
+        out[window - 1:] = windows.min(axis=-1) if mode == "min" else windows.max(axis=-1)
+    return out
+
+
+def compute_feature_columns(close, high, low, volume):
+    """compute_features over (bars x symbols) blocks; returns {column: block}"""
+    change = close - shift_columns(close)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        up = np.where(change < 0, 0.0, change)
+        down = np.abs(np.where(change > 0, 0.0, change))
+        relative_strength = ewm_mean_columns(up, RSI_PERIOD) / ewm_mean_columns(down, RSI_PERIOD)
+
+        low_14 = rolling_extreme_columns(low, STOCHASTIC_PERIOD, "min")
+        high_14 = rolling_extreme_columns(high, STOCHASTIC_PERIOD, "max")
+
+        macd = ewm_mean_columns(close, MACD_FAST) - ewm_mean_columns(close, MACD_SLOW)
+
+        # OBV restarts at zero for every symbol, unlike the notebook's loop over the combined frame
+        signed_volume = np.where(change > 0, volume, np.where(change < 0, -volume, 0.0))
+
+        return {
+            "change_in_price": change,
+            "RSI": 100.0 - (100.0 / (1.0 + relative_strength)),
+            "low_14": low_14,
+            "high_14": high_14,
+            "k_percent": 100 * ((close - low_14) / (high_14 - low_14)),
+            "r_percent": ((high_14 - close) / (high_14 - low_14)) * -100,
+            "MACD": macd,
+            "MACD_EMA": ewm_mean_columns(macd, MACD_SIGNAL),
+            "Price_Rate_Of_Change": close / shift_columns(close, ROC_PERIOD) - 1,
+            "On Balance Volume": np.cumsum(signed_volume, axis=0),
+        }
+
+
+def compute_grouped_features(df, by="symbol"):
+    """compute_features for a concatenated multi-symbol frame in one pass
+
+    Rows are grouped by `by` and must be in date order within each symbol,
+    as in the notebooks' price_data sorted by symbol and datetime. Gives the
+    same values as compute_features run on each symbol separately.
+    """
+    import pandas as pd
+
+    segments = Segments.from_keys(df[by].to_numpy())
+    blocks = compute_feature_columns(*(
+        segments.pad(df[column].to_numpy(dtype=np.float64)) for column in ("close", "high", "low", "volume")
+    ))
+    return pd.DataFrame({name: segments.unpad(block) for name, block in blocks.items()}, index=df.index)
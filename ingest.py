@@ -0,0 +1,212 @@
+import abc
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import pandas as pd
+
+from market_store import CSV_SUFFIX
+
+BAR_CACHE_PATH = "stock_notebooks/bar_cache/"
+DEFAULT_START = "2020-01-01"
+CONCURRENCY = 16
+
+# Column order the notebooks' grab_price_data() writes
+RAW_COLUMNS = ["close", "datetime", "high", "low", "open", "symbol", "volume"]
+PROVIDER_COLUMNS = {"Close": "close", "High": "high", "Low": "low", "Open": "open", "Volume": "volume"}
+
+
+class Provider(abc.ABC):
+    """Source of daily bars; subclasses implement fetch()
+
+    fetch() returns a frame shaped like yfinance history(): a DatetimeIndex and
+    Open/High/Low/Close/Volume columns, empty if there are no bars.
+    """
+
+    @abc.abstractmethod
+    async def fetch(self, symbol, start=None, end=None):
+        """Daily bars for one symbol from start up to, not including, end"""
+
+
+class YahooProvider(Provider):
+    """Daily bars from Yahoo Finance through yfinance, run off the event loop
+
+    Each fetch uses its own yf.Ticker. yf.download() resets and reads
+    module-global result tables, so concurrent downloads can lose or swap
+    symbols' frames.
+    """
+
+    def __init__(self):
+        try:
+            import yfinance
+        except ImportError as e:
+            raise ImportError("YahooProvider needs yfinance (pip install yfinance)") from e
+        self.yfinance = yfinance
+
+    async def fetch(self, symbol, start=None, end=None):
+        ticker = self.yfinance.Ticker(symbol.replace("/", "-"))
+        return await asyncio.to_thread(ticker.history, start=start, end=end, auto_adjust=False, actions=False)
+
+
+class CSVProvider(Provider):
+    """Daily bars from a directory of {symbol}.csv files in yf.download() layout
+
+    Useful as a fixture, or to replay a saved download without the network.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    async def fetch(self, symbol, start=None, end=None):
+        path = os.path.join(self.directory, f"{_file_symbol(symbol)}.csv")
+        history = await asyncio.to_thread(pd.read_csv, path, index_col=0, parse_dates=True, float_precision="round_trip")
+        if start is not None:
+            history = history[history.index >= pd.Timestamp(start)]
+        if end is not None:
+            history = history[history.index < pd.Timestamp(end)]
+        return history
+
+
+def _file_symbol(symbol):
+    """Symbol as used in file names (BRK/B -> BRK-B)"""
+    return symbol.replace("/", "-")
+
+
+def cache_file(cache_path, symbol):
+    return os.path.join(cache_path, f"{_file_symbol(symbol)}{CSV_SUFFIX}")
+
+
+def to_price_frame(history, symbol):
+    """Convert a provider frame to the notebooks' price_data layout without iterating rows"""
+    if isinstance(history.columns, pd.MultiIndex):
+        # Recent yfinance versions return (field, ticker) columns even for one ticker
+        history = history.droplevel(-1, axis=1)
+    if history.empty:
+        return pd.DataFrame(columns=RAW_COLUMNS)
+    frame = pd.DataFrame({PROVIDER_COLUMNS[name]: history[name].to_numpy(dtype=float) for name in PROVIDER_COLUMNS})
+    frame["datetime"] = pd.DatetimeIndex(history.index).strftime("%Y-%m-%d")
+    frame["symbol"] = symbol
+    frame = frame[RAW_COLUMNS]
+    return frame[~frame["datetime"].duplicated()].sort_values("datetime", kind="stable").reset_index(drop=True)
+
+
+def _last_line(path, block_size=4096):
+    """Last non-empty line of a text file, read from the end"""
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        tail = b""
+        while position > 0:
+            step = min(block_size, position)
+            position -= step
+            f.seek(position)
+            tail = f.read(step) + tail
+            lines = tail.rstrip(b"\r\n").split(b"\n")
+            if len(lines) > 1 or position == 0:
+                return lines[-1].decode()
+    return ""
+
+
+def last_cached_date(path):
+    """Date of the last bar in a cached CSV, None if there is no usable cache"""
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        header = f.readline().rstrip("\r\n").split(",")
+    if "datetime" not in header:
+        return None
+    line = _last_line(path).split(",")
+    if len(line) != len(header):
+        return None
+    date = pd.to_datetime(line[header.index("datetime")], format="ISO8601", errors="coerce")
+    return None if pd.isna(date) else date.normalize()
+
+
+def append_bars(path, frame, last_date=None):
+    """Append bars newer than last_date to a cached CSV and return how many were written"""
+    if last_date is not None:
+        frame = frame[pd.to_datetime(frame["datetime"]) > last_date]
+    if frame.empty:
+        return 0
+    exists = os.path.exists(path)
+    frame.to_csv(path, mode="a" if exists else "w", header=not exists, index=False)
+    return len(frame)
+
+
+async def fetch_all(provider, requests, concurrency=CONCURRENCY, retries=2):
+    """Fetch {symbol: (start, end)} with at most `concurrency` requests in flight"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch_one(symbol, start, end):
+        async with semaphore:
+            for attempt in range(retries + 1):
+                try:
+                    return symbol, await provider.fetch(symbol, start, end)
+                except Exception as e:
+                    if attempt == retries:
+                        print(f"Error fetching {symbol}: {e}")
+                        return symbol, None
+                    await asyncio.sleep(0.5 * 2 ** attempt)
+
+    results = await asyncio.gather(*(fetch_one(symbol, *window) for symbol, window in requests.items()))
+    return {symbol: history for symbol, history in results if history is not None}
+
+
+async def refresh(provider, symbols, cache_path=BAR_CACHE_PATH, start=DEFAULT_START, end=None,
+                  concurrency=CONCURRENCY):
+    """Bring every symbol's cached CSV up to date, fetching only bars after its last cached date"""
+    os.makedirs(cache_path, exist_ok=True)
+    last_dates = {symbol: last_cached_date(cache_file(cache_path, symbol)) for symbol in symbols}
+    requests = {
+        symbol: (start if last_date is None else (last_date + pd.Timedelta(days=1)).strftime("%Y-%m-%d"), end)
+        for symbol, last_date in last_dates.items()
+    }
+    histories = await fetch_all(provider, requests, concurrency)
+
+    appended = {}
+    for symbol in symbols:
+        if symbol not in histories:
+            continue
+        frame = to_price_frame(histories[symbol], symbol)
+        appended[symbol] = append_bars(cache_file(cache_path, symbol), frame, last_dates[symbol])
+    return appended
+
+
+def refresh_universe(symbols, provider=None, cache_path=BAR_CACHE_PATH, start=DEFAULT_START, end=None,
+                     concurrency=CONCURRENCY):
+    """Synchronous wrapper around refresh() for scripts and notebooks"""
+    provider = provider if provider is not None else YahooProvider()
+    return asyncio.run(refresh(provider, symbols, cache_path, start, end, concurrency))
+
+
+def main(argv=None):
+    """Download or update daily bars for a list of symbols"""
+    parser = argparse.ArgumentParser(description="Refresh the local daily bar cache")
+    parser.add_argument("symbols", nargs="+")
+    parser.add_argument("--cache-path", default=BAR_CACHE_PATH)
+    parser.add_argument("--start", default=DEFAULT_START, help="First date for symbols with no cache")
+    parser.add_argument("--end", default=None)
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    parser.add_argument("--source-dir", default=None, help="Read yf.download-style CSVs from here instead of Yahoo")
+    args = parser.parse_args(argv)
+
+    try:
+        provider = CSVProvider(args.source_dir) if args.source_dir else YahooProvider()
+    except ImportError as e:
+        print(e)
+        return 1
+
+    started = time.perf_counter()
+    appended = refresh_universe(args.symbols, provider, args.cache_path, args.start, args.end, args.concurrency)
+    elapsed = time.perf_counter() - started
+    for symbol in args.symbols:
+        rows = appended.get(symbol)
+        print(f"{symbol:8} {'failed' if rows is None else f'{rows} new bars'}")
+    print(f"Refreshed {len(appended)}/{len(args.symbols)} symbols in {elapsed:.1f}s")
+    return 0 if len(appended) == len(args.symbols) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
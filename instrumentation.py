@@ -0,0 +1,257 @@
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+# Upper bounds (seconds) of the stage-duration histogram buckets
+BUCKETS = [0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, float("inf")]
+METRIC_PREFIX = "trading_"
+
+
+class _NullTimer:
+    """Shared do-nothing context manager returned while metrics are disabled"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    def __init__(self, registry, stage):
+        self.registry = registry
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.registry.observe(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+class Histogram:
+    """Cumulative-bucket histogram of durations, as Prometheus expects"""
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def to_dict(self):
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip(BUCKETS, self.counts):
+            cumulative += count
+            buckets["+Inf" if bound == float("inf") else repr(bound)] = cumulative
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else 0.0,
+            "min": self.min if self.count else 0.0,
+            "max": self.max,
+            "buckets": buckets,
+        }
+
+
+class SamplingProfiler:
+    """Samples one thread's Python stack at a fixed interval from a background thread
+
+    Stacks are kept in collapsed "outer;inner;leaf" form with sample counts,
+    which flame graph tools read directly.
+    """
+
+    def __init__(self, interval=0.005, thread_id=None, max_depth=64):
+        self.interval = interval
+        self.thread_id = thread_id if thread_id is not None else threading.main_thread().ident
+        self.max_depth = max_depth
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        frame = sys._current_frames().get(self.thread_id)
+        names = []
+        while frame is not None and len(names) < self.max_depth:
+            code = frame.f_code
+            names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+            frame = frame.f_back
+        if names:
+            self.stacks[";".join(reversed(names))] += 1
+            self.samples += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self
+
+    def top(self, n=20):
+        """Most frequently sampled stacks"""
+        return dict(self.stacks.most_common(n))
+
+    def collapsed(self):
+        """Collapsed-stack text for flamegraph.pl or speedscope"""
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common())
+
+
+class MetricsRegistry:
+    """Stage timers and labelled counters for the simulators and loaders
+
+    Everything is a no-op until enable() is called: timer() hands back a
+    shared null context and count() returns after one attribute check, so
+    instrumented hot paths cost close to nothing in normal runs.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.profiler = None
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.histograms = {}
+            self.counters = {}
+
+    def enable(self, profile=False, interval=0.005):
+        """Start recording, optionally with a sampling profiler on the calling thread"""
+        self.enabled = True
+        if profile and self.profiler is None:
+            self.profiler = SamplingProfiler(interval, threading.get_ident()).start()
+        return self
+
+    def disable(self):
+        self.enabled = False
+        if self.profiler is not None:
+            self.profiler.stop()
+
+    def timer(self, stage):
+        """Context manager that records the block's duration under `stage`"""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, stage)
+
+    def observe(self, stage, seconds):
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = Histogram()
+            histogram.observe(seconds)
+
+    def count(self, name, value=1, **labels):
+        """Add to a counter, e.g. count("trades", side="buy")"""
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def to_dict(self):
+        with self._lock:
+            counters = {}
+            for (name, labels), value in sorted(self.counters.items()):
+                label = ",".join(f"{k}={v}" for k, v in labels)
+                counters[f"{name}{{{label}}}" if label else name] = value
+            result = {
+                "stages": {stage: histogram.to_dict() for stage, histogram in sorted(self.histograms.items())},
+                "counters": counters,
+            }
+        if self.profiler is not None:
+            result["profile"] = {"samples": self.profiler.samples, "top_stacks": self.profiler.top()}
+        return result
+
+    def to_json(self, indent=None):
+        return json.dumps(self.to_dict(), indent=indent)
+
+    def to_prometheus(self):
+        """Metrics in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            if self.histograms:
+                name = f"{METRIC_PREFIX}stage_seconds"
+                lines += [f"# HELP {name} Time spent per pipeline stage.", f"# TYPE {name} histogram"]
+                for stage, histogram in sorted(self.histograms.items()):
+                    for bound, cumulative in histogram.to_dict()["buckets"].items():
+                        lines.append(f'{name}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                    lines.append(f'{name}_sum{{stage="{stage}"}} {histogram.sum}')
+                    lines.append(f'{name}_count{{stage="{stage}"}} {histogram.count}')
+
+            seen = set()
+            for (counter, labels), value in sorted(self.counters.items()):
+                name = f"{METRIC_PREFIX}{counter}_total"
+                if name not in seen:
+                    lines.append(f"# TYPE {name} counter")
+                    seen.add(name)
+                label = ",".join(f'{k}="{v}"' for k, v in labels)
+                lines.append(f"{name}{{{label}}} {value}" if label else f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def save(self, path):
+        """Write the metrics to a .json file, or Prometheus text for any other extension"""
+        with open(path, "w") as f:
+            f.write(self.to_json(indent=2) if path.endswith(".json") else self.to_prometheus())
+
+    def finish_run(self):
+        """End-of-run hook for the scripts: report, and save to TRADING_METRICS_FILE if set"""
+        if not self.enabled:
+            return
+        self.report()
+        path = os.environ.get("TRADING_METRICS_FILE")
+        if path:
+            self.save(path)
+            print(f"Metrics saved to '{path}'")
+        if self.profiler is not None:
+            self.profiler.stop()
+            print(f"\nTop sampled stacks ({self.profiler.samples} samples):")
+            for stack, count in self.profiler.top(10).items():
+                print(f"{count:6}  {stack.rsplit(';', 3)[-3:]}")
+
+    def report(self):
+        """Print a per-stage timing table and the counters"""
+        data = self.to_dict()
+        print(f"\n{'Stage':20} {'count':>8} {'total (s)':>10} {'mean (ms)':>10} {'max (ms)':>10}")
+        for stage, stats in data["stages"].items():
+            print(f"{stage:20} {stats['count']:8} {stats['sum']:10.3f} "
+                  f"{stats['mean'] * 1000:10.3f} {stats['max'] * 1000:10.3f}")
+        for name, value in data["counters"].items():
+            print(f"{name:40} {value}")
+
+
+METRICS = MetricsRegistry()
+
+# TRADING_METRICS=1 turns recording on for a whole run; TRADING_PROFILE=1 adds the sampler
+if os.environ.get("TRADING_METRICS") or os.environ.get("TRADING_PROFILE"):
+    METRICS.enable(profile=bool(os.environ.get("TRADING_PROFILE")))
@@ -0,0 +1,284 @@
+import numpy as np
+
+from backtest import BUY, SELL, max_drawdown
+
+# One row of the trade blotter
+TRADE_DTYPE = np.dtype([
+    ("day", np.int32),
+    ("date", "datetime64[D]"),
+    ("symbol", np.int32),
+    ("side", np.int8),
+    ("quantity", np.float64),
+    ("price", np.float64),
+    ("cash", np.float64),
+])
+
+TRADING_DAYS = 252
+
+
+def _grow(array, rows):
+    """Copy of array with room for `rows` rows, new rows filled like an empty ledger"""
+    grown = np.empty((rows,) + array.shape[1:], dtype=array.dtype)
+    grown[:len(array)] = array
+    if array.dtype.kind == "f":
+        grown[len(array):] = np.nan
+    elif array.dtype.kind == "M":
+        grown[len(array):] = np.datetime64("NaT")
+    return grown
+
+
+class PortfolioLedger:
+    """Preallocated per-day portfolio arrays plus a structured trade blotter
+
+    Positions and marked values are (days x symbols) arrays; values are NaN on
+    days a symbol was not marked. Cash, total and stock_sum are per day, and
+    `total` keeps the simulator's convention of marked holdings plus cash
+    relative to `reference_capital`. Storage doubles when it fills up.
+    """
+
+    DAY_ARRAYS = ["dates", "positions", "values", "cash", "total", "stock_sum"]
+
+    def __init__(self, symbols, reference_capital, capacity=256):
+        self.symbols = list(symbols)
+        self.symbol_index = {symbol: j for j, symbol in enumerate(self.symbols)}
+        self.reference_capital = reference_capital
+        self.days = 0
+        self.trade_count = 0
+
+        n_symbols = len(self.symbols)
+        self._dates = np.full(capacity, np.datetime64("NaT"), dtype="datetime64[D]")
+        self._positions = np.full((capacity, n_symbols), np.nan)
+        self._values = np.full((capacity, n_symbols), np.nan)
+        self._cash = np.full(capacity, np.nan)
+        self._total = np.full(capacity, np.nan)
+        self._stock_sum = np.full(capacity, np.nan)
+        self._trades = np.zeros(max(capacity, 16), dtype=TRADE_DTYPE)
+
+    def __len__(self):
+        return self.days
+
+    def reserve(self, days):
+        """Make room for `days` more days"""
+        needed = self.days + days
+        if needed <= len(self._cash):
+            return
+        rows = max(needed, 2 * len(self._cash))
+        for name in self.DAY_ARRAYS:
+            setattr(self, "_" + name, _grow(getattr(self, "_" + name), rows))
+
+    def _reserve_trades(self, trades):
+        needed = self.trade_count + trades
+        if needed > len(self._trades):
+            grown = np.zeros(max(needed, 2 * len(self._trades)), dtype=TRADE_DTYPE)
+            grown[:self.trade_count] = self._trades[:self.trade_count]
+            self._trades = grown
+
+    def column(self, symbol):
+        """Column of a symbol, adding one if the ledger has not seen it"""
+        if symbol not in self.symbol_index:
+            self.symbol_index[symbol] = len(self.symbols)
+            self.symbols.append(symbol)
+            for name in ("_positions", "_values"):
+                array = getattr(self, name)
+                setattr(self, name, np.concatenate([array, np.full((len(array), 1), np.nan)], axis=1))
+        return self.symbol_index[symbol]
+
+    def record_day(self, positions, values, cash, total, stock_sum, date=None):
+        """Append one day; positions and values are {symbol: amount} for that day"""
+        self.reserve(1)
+        columns = [(self.column(symbol), amount) for symbol, amount in positions.items()]
+        marks = [(self.column(symbol), amount) for symbol, amount in values.items()]
+        day = self.days
+        for j, amount in columns:
+            self._positions[day, j] = amount
+        for j, amount in marks:
+            self._values[day, j] = amount
+        if date is not None:
+            self._dates[day] = date
+        self._cash[day] = cash
+        self._total[day] = total
+        self._stock_sum[day] = stock_sum
+        self.days += 1
+        return day
+
+    def record_trade(self, day, symbol, side, quantity, price, cash, date=None):
+        """Append one fill to the blotter"""
+        self._reserve_trades(1)
+        self._trades[self.trade_count] = (
+            day, np.datetime64("NaT") if date is None else date, self.column(symbol), side, quantity, price, cash
+        )
+        self.trade_count += 1
+
+    def record_batch(self, result, symbols, dates=None):
+        """Append the days and fills of a backtest.simulate_trades result over `symbols`"""
+        n_days = len(result["total"])
+        self.reserve(n_days)
+        first = self.days
+        rows = slice(first, first + n_days)
+        columns = [self.column(symbol) for symbol in symbols]
+        self._positions[rows, columns] = result["positions"]
+        self._values[rows, columns] = result["values"]
+        self._cash[rows] = result["cash"]
+        self._total[rows] = result["total"]
+        self._stock_sum[rows] = result["stock_sum"]
+        if dates is not None:
+            self._dates[rows] = dates
+        self.days += n_days
+
+        trades = result["trades"]
+        self._reserve_trades(len(trades["day"]))
+        block = self._trades[self.trade_count:self.trade_count + len(trades["day"])]
+        block["day"] = np.asarray(trades["day"], dtype=np.int32) + first
+        block["symbol"] = np.take(columns, np.asarray(trades["symbol"], dtype=np.intp))
+        block["side"] = trades["side"]
+        block["quantity"] = trades["quantity"]
+        block["price"] = trades["price"]
+        block["cash"] = trades["cash"]
+        block["date"] = self._dates[block["day"]] if len(block) else block["date"]
+        self.trade_count += len(block)
+
+    @property
+    def dates(self):
+        return self._dates[:self.days]
+
+    @property
+    def positions(self):
+        return self._positions[:self.days]
+
+    @property
+    def values(self):
+        return self._values[:self.days]
+
+    @property
+    def cash(self):
+        return self._cash[:self.days]
+
+    @property
+    def total(self):
+        return self._total[:self.days]
+
+    @property
+    def stock_sum(self):
+        return self._stock_sum[:self.days]
+
+    @property
+    def trades(self):
+        return self._trades[:self.trade_count]
+
+    def symbol_values(self, symbol):
+        """Marked values of one symbol on the days it was marked"""
+        values = self.values[:, self.symbol_index[symbol]]
+        return values[~np.isnan(values)]
+
+    def last_values(self):
+        """Most recent marked value of every symbol that has one"""
+        last = {}
+        for j, symbol in enumerate(self.symbols):
+            marked = np.flatnonzero(~np.isnan(self.values[:, j]))
+            if len(marked):
+                last[symbol] = float(self.values[marked[-1], j])
+        return last
+
+    def equity(self):
+        """Marked holdings plus cash per day"""
+        return self.total + self.reference_capital
+
+    def returns(self):
+        """Daily simple returns of the equity curve"""
+        equity = self.equity()
+        if len(equity) < 2:
+            return np.empty(0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.diff(equity) / equity[:-1]
+
+    def turnover(self):
+        """Traded notional divided by average equity"""
+        equity = self.equity()
+        if len(equity) == 0 or np.mean(equity) == 0:
+            return 0.0
+        trades = self.trades
+        return float(np.sum(np.abs(trades["quantity"] * trades["price"])) / np.mean(equity))
+
+    def summary(self):
+        """Return, risk and activity statistics for the recorded days"""
+        equity = self.equity()
+        returns = self.returns()
+        returns = returns[np.isfinite(returns)]
+        final_value = float(equity[-1]) if len(equity) else float(self.reference_capital)
+        volatility = float(np.std(returns, ddof=1)) if len(returns) > 1 else 0.0
+        sides = self.trades["side"]
+        return {
+            "days": self.days,
+            "final_value": final_value,
+            "final_cash": float(self.cash[-1]) if self.days else float(self.reference_capital),
+            "total_return": final_value - self.reference_capital,
+            "return_pct": (final_value - self.reference_capital) / self.reference_capital * 100,
+            "mean_daily_return": float(np.mean(returns)) if len(returns) else 0.0,
+            "volatility": volatility,
+            "sharpe": float(np.mean(returns) / volatility * np.sqrt(TRADING_DAYS)) if volatility > 0 else 0.0,
+            "max_drawdown_pct": max_drawdown(equity) * 100,
+            "turnover": self.turnover(),
+            "trades": self.trade_count,
+            "buys": int(np.count_nonzero(sides == BUY)),
+            "sells": int(np.count_nonzero(sides == SELL)),
+        }
+
+    def day_frame(self):
+        """Per-day table with one position and value column per symbol"""
+        import pandas as pd
+
+        columns = {"date": self.dates, "cash": self.cash, "total": self.total, "stock_sum": self.stock_sum}
+        for j, symbol in enumerate(self.symbols):
+            columns[f"{symbol}_position"] = self.positions[:, j]
+            columns[f"{symbol}_value"] = self.values[:, j]
+        return pd.DataFrame(columns)
+
+    def trade_frame(self):
+        """The blotter as a table with symbol names"""
+        import pandas as pd
+
+        trades = pd.DataFrame(self.trades)
+        trades["symbol"] = np.asarray(self.symbols, dtype=object)[self.trades["symbol"]] if len(trades) else []
+        return trades
+
+    def arrays(self):
+        """Every array and the blotter, keyed as in to_npz()"""
+        return {
+            "symbols": np.asarray(self.symbols, dtype=str), "reference_capital": self.reference_capital,
+            "dates": self.dates, "positions": self.positions, "values": self.values,
+            "cash": self.cash, "total": self.total, "stock_sum": self.stock_sum, "trades": self.trades,
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """Rebuild a ledger from arrays() output or an opened .npz file"""
+        ledger = cls(arrays["symbols"].tolist(), float(arrays["reference_capital"]), capacity=len(arrays["cash"]))
+        ledger.days = len(arrays["cash"])
+        for name in cls.DAY_ARRAYS:
+            getattr(ledger, "_" + name)[:ledger.days] = arrays[name]
+        trades = arrays["trades"]
+        ledger._reserve_trades(len(trades))
+        ledger._trades[:len(trades)] = trades
+        ledger.trade_count = len(trades)
+        return ledger
+
+    def to_npz(self, path):
+        """Write every array and the blotter to one .npz file"""
+        np.savez(path, **self.arrays())
+
+    @classmethod
+    def load_npz(cls, path):
+        """Read a ledger written by to_npz()"""
+        with np.load(path, allow_pickle=False) as arrays:
+            return cls.from_arrays(arrays)
+
+    def to_parquet(self, prefix):
+        """Write {prefix}_days.parquet and {prefix}_trades.parquet (needs pyarrow or fastparquet)"""
+        paths = (f"{prefix}_days.parquet", f"{prefix}_trades.parquet")
+        try:
+            self.day_frame().to_parquet(paths[0], index=False)
+            self.trade_frame().to_parquet(paths[1], index=False)
+        except ImportError as e:
+            print(f"Parquet export unavailable: {e}")
+            return None
+        return paths
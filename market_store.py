@@ -0,0 +1,451 @@
+import argparse
+import glob
+import json
+import os
+import re
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import METRICS
+
+DATA_PATH = "stock_notebooks/stock_data/"
+STORE_PATH = "stock_notebooks/store/"
+
+STORE_VERSION = 1
+META_FILE = "meta.json"
+DATE_FILE = "date.npy"
+CSV_SUFFIX = "_price_data.csv"
+
+# Long-format CSVs (one row per symbol and date) are partitioned under here
+LONG_STORE_PATH = os.path.join(STORE_PATH, "long")
+CATALOG_FILE = "catalog.json"
+CATALOG_VERSION = 1
+LONG_CHUNK_ROWS = 100000
+
+
+def _column_file(name):
+    """Turn a column name into a safe file name"""
+    return re.sub(r"[^0-9A-Za-z_]+", "_", name) + ".npy"
+
+
+def _save_atomic(path, array):
+    """Write an array to a new file and swap it in, so open memmaps keep their old inode"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+
+def _source_stamp(csv_path):
+    """Size and mtime of the CSV a store was built from"""
+    stat = os.stat(csv_path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def write_symbol(store_path, symbol, df, date_column="datetime", source=None):
+    """Write one symbol's frame as one column file per field plus a date index"""
+    symbol_path = os.path.join(store_path, symbol)
+    os.makedirs(symbol_path, exist_ok=True)
+
+    # Rows with an unparseable date keep their position and borrow the previous date,
+    # so the index stays sorted and row order matches the CSV
+    dates = pd.to_datetime(df[date_column], format="ISO8601", errors="coerce").ffill().bfill()
+    dates = dates.to_numpy().astype("datetime64[D]")
+    if np.any(dates[1:] < dates[:-1]):
+        order = np.argsort(dates, kind="stable")
+        df = df.iloc[order]
+        dates = dates[order]
+    _save_atomic(os.path.join(symbol_path, DATE_FILE), dates)
+
+    columns = []
+    for name in df.columns:
+        if pd.api.types.is_integer_dtype(df[name]):
+            values = df[name].to_numpy(dtype=np.int64)
+            kind = "array"
+        elif pd.api.types.is_numeric_dtype(df[name]):
+            values = df[name].to_numpy(dtype=np.float64)
+            kind = "array"
+        else:
+            # Fixed-width bytes keep text columns memory-mappable
+            values = np.array(df[name].astype(str).str.encode("utf-8").tolist(), dtype="S")
+            kind = "text"
+        file_name = _column_file(name)
+        _save_atomic(os.path.join(symbol_path, file_name), values)
+        columns.append({"name": name, "kind": kind, "file": file_name, "dtype": values.dtype.str})
+
+    meta = {
+        "version": STORE_VERSION,
+        "symbol": symbol,
+        "rows": int(len(dates)),
+        "date_column": date_column,
+        "columns": columns,
+        "source": source,
+    }
+    meta_path = os.path.join(symbol_path, META_FILE)
+    with open(meta_path + ".tmp", "w") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(meta_path + ".tmp", meta_path)
+    return meta
+
+
+def convert_csv_to_store(data_path=DATA_PATH, store_path=STORE_PATH, symbols=None):
+    """Convert per-symbol price CSVs into the columnar store"""
+    if symbols is None:
+        paths = sorted(glob.glob(os.path.join(data_path, "*" + CSV_SUFFIX)))
+        symbols = [os.path.basename(path)[:-len(CSV_SUFFIX)] for path in paths]
+
+    converted = []
+    for symbol in symbols:
+        csv_path = os.path.join(data_path, f"{symbol}{CSV_SUFFIX}")
+        try:
+            df = pd.read_csv(csv_path)
+            write_symbol(store_path, symbol, df, source=_source_stamp(csv_path))
+            converted.append(symbol)
+        except FileNotFoundError as e:
+            print(f"Error converting {symbol}: {e}")
+        except Exception as e:
+            print(f"Unexpected error converting {symbol}: {e}")
+    return converted
+
+
+def long_store_path(csv_path, root=LONG_STORE_PATH):
+    """Partition directory for a long-format CSV, named after its path"""
+    name = re.sub(r"[^0-9A-Za-z_]+", "_", os.path.splitext(os.path.relpath(csv_path))[0]).strip("_")
+    return os.path.join(root, name)
+
+
+def _column_values(series):
+    """A chunk column as an int64, float64 or fixed-width bytes array"""
+    if pd.api.types.is_integer_dtype(series):
+        return series.to_numpy(dtype=np.int64)
+    if pd.api.types.is_numeric_dtype(series):
+        return series.to_numpy(dtype=np.float64)
+    return np.array(series.astype(str).str.encode("utf-8").tolist(), dtype="S")
+
+
+def _read_spill(path, n_columns):
+    """Concatenated columns of every piece appended to a spill file"""
+    pieces = []
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        while f.tell() < size:
+            pieces.append([np.load(f) for _ in range(n_columns)])
+    return [np.concatenate(column) for column in zip(*pieces)]
+
+
+def partition_long_csv(csv_path, store_path=None, chunk_rows=LONG_CHUNK_ROWS):
+    """Split a long-format price CSV into per-symbol store entries in one streaming pass
+
+    The file is read `chunk_rows` at a time. Each chunk's rows are grouped by
+    symbol code and appended to a per-symbol spill file, so memory is bounded
+    by the chunk size while reading and by the largest symbol while writing.
+    Every symbol then gets the usual columnar layout with a sorted date index,
+    and a catalog records the symbol codes (in order of first appearance),
+    row counts and date ranges. Returns the catalog.
+    """
+    store_path = store_path or long_store_path(csv_path)
+    spill_path = os.path.join(store_path, f".spill.{os.getpid()}")
+    os.makedirs(spill_path, exist_ok=True)
+    codes = {}
+    header = columns = None
+    try:
+        with METRICS.timer("long_partition"):
+            for chunk in pd.read_csv(csv_path, chunksize=chunk_rows, dtype={"symbol": "category"},
+                                     float_precision="round_trip"):
+                if header is None:
+                    header = list(chunk.columns)
+                    columns = [name for name in header if name != "symbol"]
+                # Chunk-local category codes -> codes that stay fixed across the whole file
+                local = chunk["symbol"].cat.codes.to_numpy()
+                lookup = np.array([codes.setdefault(str(symbol), len(codes))
+                                   for symbol in chunk["symbol"].cat.categories], dtype=np.int64)
+                rows = np.flatnonzero(local >= 0)
+                if not len(rows):
+                    continue
+                row_codes = lookup[local[rows]]
+                order = np.argsort(row_codes, kind="stable")
+                rows, row_codes = rows[order], row_codes[order]
+                starts = np.flatnonzero(np.r_[True, row_codes[1:] != row_codes[:-1]])
+                values = [_column_values(chunk[name]) for name in columns]
+                for lo, hi in zip(starts, np.r_[starts[1:], len(rows)]):
+                    piece = rows[lo:hi]
+                    with open(os.path.join(spill_path, f"{row_codes[lo]}.npy"), "ab") as f:
+                        for column in values:
+                            np.save(f, column[piece])
+
+            source = _source_stamp(csv_path)
+            symbols = sorted(codes, key=codes.get)
+            entries = []
+            for symbol in symbols:
+                spill_file = os.path.join(spill_path, f"{codes[symbol]}.npy")
+                arrays = _read_spill(spill_file, len(columns))
+                frame = pd.DataFrame({
+                    name: np.char.decode(array, "utf-8") if array.dtype.kind == "S" else array
+                    for name, array in zip(columns, arrays)
+                })
+                meta = write_symbol(store_path, symbol, frame, source={"long": source})
+                os.remove(spill_file)
+                dates = SymbolStore(store_path, symbol).dates
+                entries.append({
+                    "symbol": symbol,
+                    "code": codes[symbol],
+                    "rows": meta["rows"],
+                    "first": str(dates[0]) if len(dates) else None,
+                    "last": str(dates[-1]) if len(dates) else None,
+                })
+    finally:
+        shutil.rmtree(spill_path, ignore_errors=True)
+
+    # Partitions of symbols that have left the file
+    for name in os.listdir(store_path):
+        if name not in codes and os.path.exists(os.path.join(store_path, name, META_FILE)):
+            shutil.rmtree(os.path.join(store_path, name))
+
+    catalog = {
+        "version": CATALOG_VERSION,
+        "source": source,
+        "columns": header or list(pd.read_csv(csv_path, nrows=0).columns),
+        "symbols": entries,
+    }
+    catalog_path = os.path.join(store_path, CATALOG_FILE)
+    with open(catalog_path + ".tmp", "w") as f:
+        json.dump(catalog, f, indent=2)
+    os.replace(catalog_path + ".tmp", catalog_path)
+    return catalog
+
+
+class SymbolStore:
+    """Memory-mapped columns for a single symbol"""
+
+    def __init__(self, store_path, symbol):
+        self.path = os.path.join(store_path, symbol)
+        with open(os.path.join(self.path, META_FILE)) as f:
+            self.meta = json.load(f)
+        if self.meta["version"] != STORE_VERSION:
+            raise ValueError(f"Unsupported store version {self.meta['version']} for {symbol}")
+        self.symbol = symbol
+        self.rows = self.meta["rows"]
+        self.dates = np.load(os.path.join(self.path, DATE_FILE), mmap_mode="r")
+        self._arrays = {}
+
+    @property
+    def columns(self):
+        return [column["name"] for column in self.meta["columns"]]
+
+    def column(self, name):
+        """Memory-mapped array for a column, opened on first use"""
+        if name not in self._arrays:
+            for column in self.meta["columns"]:
+                if column["name"] == name:
+                    self._arrays[name] = np.load(os.path.join(self.path, column["file"]), mmap_mode="r")
+                    break
+            else:
+                raise KeyError(name)
+        return self._arrays[name]
+
+    def window(self, start=None, end=None, tail=None):
+        """Row bounds for a date range (inclusive) and/or a trailing window"""
+        lo, hi = 0, self.rows
+        if start is not None:
+            lo = int(np.searchsorted(self.dates, np.datetime64(start, "D"), side="left"))
+        if end is not None:
+            hi = int(np.searchsorted(self.dates, np.datetime64(end, "D"), side="right"))
+        if tail is not None:
+            lo = max(lo, hi - tail)
+        return lo, max(lo, hi)
+
+    def arrays(self, columns=None, start=None, end=None, tail=None):
+        """Zero-copy views of the requested columns over a window"""
+        lo, hi = self.window(start, end, tail)
+        names = columns if columns is not None else [
+            column["name"] for column in self.meta["columns"] if column["kind"] == "array"
+        ]
+        views = {name: self.column(name)[lo:hi] for name in names}
+        views["date"] = self.dates[lo:hi]
+        return views
+
+    def frame(self, columns=None, start=None, end=None, tail=None):
+        """DataFrame for a window, laid out like the source CSV"""
+        lo, hi = self.window(start, end, tail)
+        wanted = columns if columns is not None else self.columns
+        frame = {}
+        for column in self.meta["columns"]:
+            name = column["name"]
+            if name not in wanted:
+                continue
+            if column["kind"] == "text":
+                frame[name] = np.char.decode(self.column(name)[lo:hi], "utf-8")
+            else:
+                frame[name] = self.column(name)[lo:hi]
+        return pd.DataFrame(frame, index=pd.RangeIndex(lo, hi), copy=False)
+
+
+class MarketStore:
+    """Directory of per-symbol columnar stores, opened lazily"""
+
+    def __init__(self, store_path=STORE_PATH):
+        self.store_path = store_path
+        self._symbols = {}
+
+    def symbols(self):
+        """All symbols that have been converted into the store"""
+        if not os.path.isdir(self.store_path):
+            return []
+        return sorted(
+            name for name in os.listdir(self.store_path)
+            if os.path.exists(os.path.join(self.store_path, name, META_FILE))
+        )
+
+    def __contains__(self, symbol):
+        return os.path.exists(os.path.join(self.store_path, symbol, META_FILE))
+
+    def open(self, symbol):
+        """Open (or reuse) the store for a symbol"""
+        if symbol not in self._symbols:
+            self._symbols[symbol] = SymbolStore(self.store_path, symbol)
+        return self._symbols[symbol]
+
+    def frame(self, symbol, columns=None, start=None, end=None, tail=None):
+        return self.open(symbol).frame(columns, start, end, tail)
+
+
+class LongStore(MarketStore):
+    """Per-symbol partitions of a long-format (one row per symbol and date) price CSV
+
+    Partitions live under long_store_path(csv_path) in the same layout as the
+    per-symbol store, so each one opens as a memory-mapped SymbolStore and
+    every MarketStore reader works on it. They are rebuilt by refresh() when
+    the CSV changes.
+    """
+
+    def __init__(self, csv_path, store_path=None):
+        super().__init__(store_path or long_store_path(csv_path))
+        self.csv_path = csv_path
+        self.catalog = None
+
+    def _read_catalog(self):
+        try:
+            with open(os.path.join(self.store_path, CATALOG_FILE)) as f:
+                catalog = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if catalog.get("version") != CATALOG_VERSION or catalog.get("source") != _source_stamp(self.csv_path):
+            return None
+        return catalog
+
+    def refresh(self, chunk_rows=LONG_CHUNK_ROWS):
+        """Load the catalog, partitioning the CSV first if it is new or changed"""
+        self.catalog = self._read_catalog()
+        if self.catalog is None:
+            self._symbols = {}
+            self.catalog = partition_long_csv(self.csv_path, self.store_path, chunk_rows)
+        return self
+
+    def symbols(self):
+        """Symbols in order of their categorical codes"""
+        if self.catalog is None:
+            self.refresh()
+        return [entry["symbol"] for entry in self.catalog["symbols"]]
+
+    def query(self, symbols=None, start=None, end=None, columns=None):
+        """Long-format rows for some symbols over an inclusive date range
+
+        Only partitions whose date range overlaps [start, end] are opened, and
+        only their matching rows are read. Rows come back grouped by symbol in
+        date order, with `symbol` (always included) as a categorical over every
+        symbol in the file.
+        """
+        categories = self.symbols()
+        wanted = set(symbols) if symbols is not None else None
+        lo = np.datetime64(pd.Timestamp(start).date(), "D") if start is not None else None
+        hi = np.datetime64(pd.Timestamp(end).date(), "D") if end is not None else None
+        names = [name for name in self.catalog["columns"] if name != "symbol"]
+        if columns is not None:
+            names = [name for name in names if name in columns]
+
+        frames, codes = [], []
+        with METRICS.timer("long_query"):
+            for entry in self.catalog["symbols"]:
+                if wanted is not None and entry["symbol"] not in wanted:
+                    continue
+                if not entry["rows"] or (lo is not None and np.datetime64(entry["last"]) < lo) or (
+                        hi is not None and np.datetime64(entry["first"]) > hi):
+                    continue
+                frame = self.frame(entry["symbol"], names, lo, hi)
+                if len(frame):
+                    frames.append(frame)
+                    codes.append(np.full(len(frame), entry["code"]))
+
+            frame = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=names)
+            symbol = pd.Categorical.from_codes(np.concatenate(codes) if codes else np.empty(0, dtype=np.int64),
+                                               categories=categories)
+            position = sum(1 for name in self.catalog["columns"][:self.catalog["columns"].index("symbol")]
+                           if name in names)
+            frame.insert(position, "symbol", symbol)
+        return frame
+
+
+def open_long_store(csv_path, store_path=None, chunk_rows=LONG_CHUNK_ROWS):
+    """LongStore for a long-format CSV, partitioned and up to date"""
+    return LongStore(csv_path, store_path).refresh(chunk_rows)
+
+
+def is_fresh(store, symbol, data_path=DATA_PATH):
+    """True if the store for a symbol was built from the CSV currently on disk"""
+    if symbol not in store:
+        return False
+    csv_path = os.path.join(data_path, f"{symbol}{CSV_SUFFIX}")
+    if not os.path.exists(csv_path):
+        return True
+    return store.open(symbol).meta.get("source") == _source_stamp(csv_path)
+
+
+def load_symbol_frame(symbol, data_path=DATA_PATH, store=None, start=None, end=None, tail=None):
+    """Read a symbol's window from the columnar store, falling back to its CSV
+
+    With data_path None the store is the only source, as for a LongStore.
+    """
+    if store is not None and (data_path is None or is_fresh(store, symbol, data_path)):
+        with METRICS.timer("store_read"):
+            return store.frame(symbol, start=start, end=end, tail=tail)
+
+    with METRICS.timer("csv_parse"):
+        df = pd.read_csv(os.path.join(data_path, f"{symbol}{CSV_SUFFIX}"))
+    if start is not None or end is not None:
+        dates = pd.to_datetime(df["datetime"], format="ISO8601", errors="coerce")
+        keep = pd.Series(True, index=df.index)
+        if start is not None:
+            keep &= dates >= pd.Timestamp(start)
+        if end is not None:
+            keep &= dates <= pd.Timestamp(end)
+        df = df[keep]
+    if tail is not None:
+        df = df.tail(tail)
+    return df
+
+
+def main(argv=None):
+    """Convert the per-symbol CSVs into the columnar store"""
+    parser = argparse.ArgumentParser(description="Build the memory-mapped market data store")
+    parser.add_argument("--data-path", default=DATA_PATH)
+    parser.add_argument("--store-path", default=STORE_PATH)
+    parser.add_argument("--long", metavar="CSV", action="append", default=[],
+                        help="Partition a long-format CSV (one row per symbol and date) by symbol; repeatable")
+    parser.add_argument("symbols", nargs="*", help="Symbols to convert (default: every CSV)")
+    args = parser.parse_args(argv)
+
+    for csv_path in args.long:
+        # Under --store-path, laid out like the default LONG_STORE_PATH
+        store = open_long_store(csv_path, long_store_path(csv_path, os.path.join(args.store_path, "long")))
+        print(f"Partitioned {csv_path} into {len(store.symbols())} symbols in {store.store_path}")
+    if args.long and not args.symbols:
+        return
+
+    converted = convert_csv_to_store(args.data_path, args.store_path, args.symbols or None)
+    print(f"Converted {len(converted)} symbols into {args.store_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,313 @@
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from collections import OrderedDict
+
+import joblib
+import numpy as np
+
+from instrumentation import METRICS
+
+MODEL_PATH = "stock_notebooks/models/"
+MODEL_SUFFIX = "_model.pkl"
+COMPACT_SUFFIX = "_model.npz"
+META_SUFFIX = "_model.json"
+
+
+def feature_source(symbol, model_path=MODEL_PATH):
+    """Features a model was trained on: "csv" for the CSV's stored columns, "computed" for the feature cache
+
+    Models without a train.py sidecar, like the notebooks' own, used the CSV
+    columns; sidecars from before the field was recorded mean train.py
+    recomputed them.
+    """
+    path = os.path.join(model_path, f"{symbol}{META_SUFFIX}")
+    if not os.path.exists(path):
+        return "csv"
+    try:
+        with open(path) as f:
+            return json.load(f).get("feature_source", "computed")
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable metadata {path}: {e}")
+        return "csv"
+
+
+def unwrap_forest(model):
+    """The fitted forest inside a model, looking through RandomizedSearchCV wrappers"""
+    forest = getattr(model, "best_estimator_", model)
+    if not hasattr(forest, "estimators_"):
+        raise TypeError(f"Expected a fitted forest, got {type(forest).__name__}")
+    return forest
+
+
+class FlatForest:
+    """A RandomForestClassifier flattened into one array-of-nodes table
+
+    All trees share the node arrays; `roots` holds where each tree starts and
+    child indices are absolute. Prediction walks every tree for every sample at
+    once with NumPy, so sklearn is not needed at inference time.
+    """
+
+    ARRAYS = ["feature", "threshold", "left", "right", "missing_left", "value", "roots", "classes"]
+
+    def __init__(self, feature, threshold, left, right, missing_left, value, roots, classes,
+                 n_features, max_depth):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.missing_left = missing_left
+        self.value = value
+        self.roots = roots
+        self.classes_ = classes
+        self.n_features_in_ = int(n_features)
+        self.max_depth = int(max_depth)
+
+    @classmethod
+    def from_sklearn(cls, model):
+        """Flatten a fitted sklearn forest (or a search object wrapping one)"""
+        forest = unwrap_forest(model)
+        features, thresholds, lefts, rights, missing, values, roots = [], [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for estimator in forest.estimators_:
+            tree = estimator.tree_
+            is_leaf = tree.children_left == -1
+            roots.append(offset)
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(tree.threshold)
+            lefts.append(np.where(is_leaf, -1, tree.children_left + offset))
+            rights.append(np.where(is_leaf, -1, tree.children_right + offset))
+            missing.append(getattr(tree, "missing_go_to_left", np.zeros(tree.node_count, dtype=np.uint8)))
+
+            # Normalize leaf values the same way DecisionTreeClassifier.predict_proba does
+            value = tree.value[:, 0, :forest.n_classes_].astype(np.float64)
+            normalizer = value.sum(axis=1)[:, np.newaxis]
+            normalizer[normalizer == 0.0] = 1.0
+            values.append(value / normalizer)
+
+            offset += tree.node_count
+            max_depth = max(max_depth, tree.max_depth)
+
+        return cls(
+            np.concatenate(features).astype(np.int32),
+            np.concatenate(thresholds).astype(np.float64),
+            np.concatenate(lefts).astype(np.int32),
+            np.concatenate(rights).astype(np.int32),
+            np.concatenate(missing).astype(bool),
+            np.concatenate(values),
+            np.asarray(roots, dtype=np.int32),
+            np.asarray(forest.classes_),
+            forest.n_features_in_,
+            max_depth,
+        )
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name if name != "classes" else "classes_").nbytes for name in self.ARRAYS)
+
+    def save(self, path):
+        """Write the flat arrays to an .npz file"""
+        np.savez(
+            path,
+            feature=self.feature, threshold=self.threshold, left=self.left, right=self.right,
+            missing_left=self.missing_left, value=self.value, roots=self.roots, classes=self.classes_,
+            n_features=self.n_features_in_, max_depth=self.max_depth,
+        )
+
+    @classmethod
+    def load(cls, path):
+        """Read a forest written by save()"""
+        with np.load(path, allow_pickle=False) as arrays:
+            return cls(*(arrays[name] for name in cls.ARRAYS), arrays["n_features"], arrays["max_depth"])
+
+    def _leaves(self, X):
+        """Leaf index reached in every tree for every sample, shape (trees, samples)"""
+        nodes = np.repeat(self.roots[:, np.newaxis], len(X), axis=1)
+        samples = np.arange(len(X))[np.newaxis, :]
+        for _ in range(self.max_depth):
+            is_split = self.left[nodes] != -1
+            if not is_split.any():
+                break
+            x = X[samples, self.feature[nodes]]
+            go_left = np.where(np.isnan(x), self.missing_left[nodes], x <= self.threshold[nodes])
+            nodes = np.where(is_split, np.where(go_left, self.left[nodes], self.right[nodes]), nodes)
+        return nodes
+
+    def predict_proba(self, X, batch_size=4096):
+        """Class probabilities averaged over the trees, like RandomForestClassifier"""
+        # Trees compare float32 features against float64 thresholds, as sklearn does
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f"Expected {self.n_features_in_} features, got shape {X.shape}")
+
+        proba = np.zeros((len(X), len(self.classes_)))
+        for start in range(0, len(X), batch_size):
+            leaves = self._leaves(X[start:start + batch_size])
+            batch = proba[start:start + batch_size]
+            # Accumulate tree by tree so sums match sklearn's order exactly
+            for tree_leaves in leaves:
+                batch += self.value[tree_leaves]
+        proba /= len(self.roots)
+        return proba
+
+    def predict(self, X):
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1))
+
+
+def model_nbytes(model):
+    """Approximate resident size of a loaded model"""
+    if isinstance(model, FlatForest):
+        return model.nbytes
+    try:
+        forest = unwrap_forest(model)
+    except TypeError:
+        return 0
+    total = 0
+    for estimator in forest.estimators_:
+        state = estimator.tree_.__getstate__()
+        total += state["nodes"].nbytes + state["values"].nbytes
+    return total
+
+
+class ModelRegistry:
+    """Dict-like access to the per-symbol models, loaded on first use
+
+    Models are kept in least-recently-used order and evicted once their
+    combined size passes `max_bytes`. With `compact=True` the registry prefers
+    {SYMBOL}_model.npz flat forests written by export_compact().
+    """
+
+    def __init__(self, model_path=MODEL_PATH, max_bytes=None, mmap_mode=None, compact=False, symbols=None):
+        self.model_path = model_path
+        self.max_bytes = max_bytes
+        self.mmap_mode = mmap_mode
+        self.compact = compact
+        self._symbols = list(symbols) if symbols is not None else None
+        self._models = OrderedDict()
+        self._stats = {}
+
+    def symbols(self):
+        """Symbols with a model file on disk"""
+        if self._symbols is not None:
+            return list(self._symbols)
+        paths = glob.glob(os.path.join(self.model_path, "*" + MODEL_SUFFIX))
+        if self.compact:
+            paths += glob.glob(os.path.join(self.model_path, "*" + COMPACT_SUFFIX))
+        return sorted({os.path.basename(path).rsplit("_model.", 1)[0] for path in paths})
+
+    def __contains__(self, symbol):
+        return symbol in self._models or symbol in self.symbols()
+
+    def __iter__(self):
+        return iter(self.symbols())
+
+    def __len__(self):
+        return len(self.symbols())
+
+    def __getitem__(self, symbol):
+        if symbol in self._models:
+            self._models.move_to_end(symbol)
+            self._stats[symbol]["hits"] += 1
+            return self._models[symbol]
+        model = self._load(symbol)
+        self._models[symbol] = model
+        self._evict()
+        return model
+
+    def get(self, symbol, default=None):
+        try:
+            return self[symbol]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return self.symbols()
+
+    def items(self):
+        return [(symbol, self[symbol]) for symbol in self.symbols()]
+
+    def _path(self, symbol):
+        compact_path = os.path.join(self.model_path, f"{symbol}{COMPACT_SUFFIX}")
+        if self.compact and os.path.exists(compact_path):
+            return compact_path, "compact"
+        return os.path.join(self.model_path, f"{symbol}{MODEL_SUFFIX}"), "sklearn"
+
+    def _load(self, symbol):
+        path, kind = self._path(symbol)
+        if not os.path.exists(path):
+            raise KeyError(symbol)
+
+        start = time.perf_counter()
+        if kind == "compact":
+            model = FlatForest.load(path)
+        else:
+            model = joblib.load(path, mmap_mode=self.mmap_mode)
+        load_time = time.perf_counter() - start
+        METRICS.observe("model_load", load_time)
+
+        stats = self._stats.setdefault(symbol, {"loads": 0, "hits": 0})
+        stats.update({
+            "format": kind,
+            "file_bytes": os.path.getsize(path),
+            "nbytes": model_nbytes(model),
+            "load_time": load_time,
+        })
+        stats["loads"] += 1
+        return model
+
+    def _evict(self):
+        """Drop least recently used models until the resident size fits max_bytes"""
+        if self.max_bytes is None:
+            return
+        while len(self._models) > 1 and self.resident_bytes() > self.max_bytes:
+            symbol, _ = self._models.popitem(last=False)
+            self._stats[symbol]["evictions"] = self._stats[symbol].get("evictions", 0) + 1
+
+    def resident_bytes(self):
+        return sum(self._stats[symbol]["nbytes"] for symbol in self._models)
+
+    def stats(self):
+        """Load time, size and cache counters per model that has been loaded"""
+        return {
+            symbol: {**stats, "resident": symbol in self._models}
+            for symbol, stats in self._stats.items()
+        }
+
+    def export_compact(self, symbol):
+        """Write a symbol's sklearn model as a flat forest next to the .pkl"""
+        model = joblib.load(os.path.join(self.model_path, f"{symbol}{MODEL_SUFFIX}"))
+        path = os.path.join(self.model_path, f"{symbol}{COMPACT_SUFFIX}")
+        FlatForest.from_sklearn(model).save(path)
+        return path
+
+
+def main(argv=None):
+    """Export the sklearn models to flat forests and report load stats"""
+    parser = argparse.ArgumentParser(description="Export and inspect the trading models")
+    parser.add_argument("--model-path", default=MODEL_PATH)
+    parser.add_argument("--export", action="store_true", help="Write {SYMBOL}_model.npz flat forests")
+    parser.add_argument("symbols", nargs="*", help="Symbols to process (default: every model)")
+    args = parser.parse_args(argv)
+
+    registry = ModelRegistry(args.model_path)
+    symbols = args.symbols or registry.symbols()
+    if args.export:
+        for symbol in symbols:
+            print(f"Exported {registry.export_compact(symbol)}")
+
+    for compact in (False, True):
+        registry = ModelRegistry(args.model_path, compact=compact)
+        for symbol in symbols:
+            registry[symbol]
+        for symbol, stats in registry.stats().items():
+            print(f"{symbol:6} {stats['format']:8} load {stats['load_time'] * 1000:8.1f} ms  "
+                  f"resident {stats['nbytes'] / 1e6:8.2f} MB  file {stats['file_bytes'] / 1e6:8.2f} MB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+
+
+def _date_column(df):
+    """Name of the date column in a price frame"""
+    for name in ("date", "datetime"):
+        if name in df.columns:
+            return name
+    return None
+
+
+class MarketPanel:
+    """Per-symbol price data aligned on one shared, sorted date axis
+
+    Every field is a (dates x symbols) array with NaN where a symbol has no bar,
+    and `mask` marks the bars that exist, so any (date, symbol) cell is a
+    direct index instead of a scan.
+    """
+
+    def __init__(self, dates, symbols, values, mask, available=None):
+        self.dates = dates
+        self.symbols = list(symbols)
+        self.values = values
+        self.mask = mask
+        self.fields = list(values)
+        # Fields each symbol's source frame actually had
+        self.available = available if available is not None else {symbol: set(self.fields) for symbol in self.symbols}
+        self.date_index = {date: i for i, date in enumerate(dates.astype(object))}
+        self.symbol_index = {symbol: j for j, symbol in enumerate(self.symbols)}
+
+    def __len__(self):
+        return len(self.dates)
+
+    def locate(self, date, symbol):
+        """Row and column of a (date, symbol) cell"""
+        return self.date_index[pd.Timestamp(date).date()], self.symbol_index[symbol]
+
+    def get(self, field, date, symbol):
+        """Value of one field for a (date, symbol) cell, NaN if the bar is missing"""
+        i, j = self.locate(date, symbol)
+        return self.values[field][i, j]
+
+    def has_bar(self, date, symbol):
+        i, j = self.locate(date, symbol)
+        return bool(self.mask[i, j])
+
+    def features(self, symbol, fields):
+        """(dates x fields) matrix for one symbol"""
+        j = self.symbol_index[symbol]
+        return np.column_stack([self.values[field][:, j] for field in fields])
+
+    def window(self, start=None, end=None):
+        """Row slice covering a date range (inclusive)"""
+        lo = 0 if start is None else int(np.searchsorted(self.dates, np.datetime64(start, "D"), side="left"))
+        hi = len(self.dates) if end is None else int(np.searchsorted(self.dates, np.datetime64(end, "D"), side="right"))
+        return slice(lo, hi)
+
+    def tail(self, n):
+        """Row slice covering the last n dates"""
+        return slice(max(0, len(self.dates) - n), len(self.dates))
+
+
+def build_panel(data, fields, symbols=None):
+    """Align a dict of per-symbol frames onto a shared date axis"""
+    if symbols is None:
+        symbols = list(data)
+
+    symbol_dates = {}
+    frames = {}
+    for symbol in symbols:
+        df = data[symbol]
+        date_column = _date_column(df)
+        if date_column is None:
+            print(f"No date column for {symbol}, skipping")
+            continue
+        dates = pd.to_datetime(df[date_column], format="ISO8601", errors="coerce")
+        dates = dates.to_numpy().astype("datetime64[D]")
+
+        # Drop rows without a usable date and keep the first row for repeated dates
+        keep = ~np.isnat(dates)
+        _, first = np.unique(dates[keep], return_index=True)
+        rows = np.flatnonzero(keep)[first]
+        symbol_dates[symbol] = dates[rows]
+        frames[symbol] = df.iloc[rows]
+
+    symbols = [symbol for symbol in symbols if symbol in frames]
+    if symbols:
+        axis = np.unique(np.concatenate([symbol_dates[symbol] for symbol in symbols]))
+    else:
+        axis = np.array([], dtype="datetime64[D]")
+
+    values = {field: np.full((len(axis), len(symbols)), np.nan) for field in fields}
+    mask = np.zeros((len(axis), len(symbols)), dtype=bool)
+    available = {symbol: set(fields) & set(frames[symbol].columns) for symbol in symbols}
+    for j, symbol in enumerate(symbols):
+        positions = np.searchsorted(axis, symbol_dates[symbol])
+        mask[positions, j] = True
+        for field in available[symbol]:
+            values[field][positions, j] = frames[symbol][field].to_numpy(dtype=float)
+
+    return MarketPanel(axis, symbols, values, mask, available)
@@ -0,0 +1,358 @@
+import argparse
+import os
+import random
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from backtest import BUY, SELL, decide_orders
+from daily_trades import (
+    P_DOWN_THRESHOLD, P_UP_THRESHOLD, STRONG_FRACTION, STRONG_THRESHOLD, SYMBOLS, WEAK_FRACTION,
+)
+from feature_cache import FEATURE_CACHE_PATH, FeatureCache, load_feature_frame
+from indicators import FEATURES
+from instrumentation import METRICS
+from market_store import CSV_SUFFIX, DATA_PATH, STORE_PATH, MarketStore, load_symbol_frame
+from model_registry import MODEL_PATH, ModelRegistry, feature_source
+
+# A batch closes once it has MAX_BATCH requests or MAX_WAIT seconds after its first one
+MAX_BATCH = 256
+MAX_WAIT = 0.002
+# Recent request latencies kept for the percentiles
+LATENCY_WINDOW = 10000
+REQUEST_TIMEOUT = 10.0
+
+ACTIONS = {BUY: "Buy", SELL: "Sell"}
+
+
+class FeatureTable:
+    """Per-symbol feature rows by date, loaded on first use
+
+    Each symbol's rows carry the features its model was trained on, as in
+    daily_trades.load_stock_data: the CSV's stored columns, or the feature
+    cache's for models train.py fitted on recomputed ones. A symbol is
+    reloaded when its CSV changes on disk, so a long-running service picks
+    up bars appended by ingest.py.
+    """
+
+    def __init__(self, data_path=DATA_PATH, cache_path=FEATURE_CACHE_PATH, store_path=STORE_PATH,
+                 model_path=MODEL_PATH):
+        self.data_path = data_path
+        self.model_path = model_path
+        self.cache = FeatureCache(cache_path)
+        self.store = MarketStore(store_path)
+        self._tables = {}
+        self._lock = threading.Lock()
+
+    def _stamp(self, symbol):
+        try:
+            stat = os.stat(os.path.join(self.data_path, f"{symbol}{CSV_SUFFIX}"))
+            return stat.st_size, stat.st_mtime_ns
+        except OSError:
+            return None
+
+    def _load(self, symbol):
+        if feature_source(symbol, self.model_path) == "computed":
+            df = load_feature_frame(symbol, self.cache, self.data_path, self.store)
+        else:
+            df = load_symbol_frame(symbol, self.data_path, self.store)
+        dates = pd.to_datetime(df["datetime"], format="ISO8601", errors="coerce").to_numpy().astype("datetime64[D]")
+        valid = ~np.isnat(dates)
+        order = np.argsort(dates[valid], kind="stable")
+        features = df[FEATURES].to_numpy(dtype=np.float64)[valid][order]
+        return dates[valid][order], features
+
+    def table(self, symbol):
+        """(sorted dates, feature matrix) for a symbol"""
+        stamp = self._stamp(symbol)
+        with self._lock:
+            entry = self._tables.get(symbol)
+            if entry is None or entry[0] != stamp:
+                try:
+                    entry = self._tables[symbol] = (stamp,) + self._load(symbol)
+                except FileNotFoundError:
+                    raise KeyError(symbol)
+        return entry[1], entry[2]
+
+    def row(self, symbol, date=None):
+        """(ISO date, feature vector) for a date, or for the latest bar when date is None"""
+        dates, features = self.table(symbol)
+        if not len(dates):
+            raise ValueError(f"No feature rows for {symbol}")
+        if date is None:
+            i = len(dates) - 1
+        else:
+            day = np.datetime64(date, "D")
+            i = int(np.searchsorted(dates, day))
+            if i == len(dates) or dates[i] != day:
+                raise ValueError(f"Date {date} not found for {symbol}")
+        if np.isnan(features[i]).any():
+            raise ValueError(f"Features for {symbol} on {dates[i]} are not warmed up yet")
+        return str(dates[i]), features[i]
+
+
+class _Request:
+    __slots__ = ("symbol", "features", "date", "start", "done", "result", "error")
+
+    def __init__(self, symbol, features, date):
+        self.symbol = symbol
+        self.features = features
+        self.date = date
+        self.start = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class PredictionService:
+    """Coalesces concurrent signal requests into one predict_proba call per model
+
+    Request threads queue (symbol, feature vector) pairs and wait. A single
+    batching thread takes whatever arrived within `max_wait` of the first
+    queued request (up to `max_batch`), stacks the rows per symbol and scores
+    each symbol's rows with one call, so N clients asking at once cost one
+    sklearn call per symbol rather than N. Models stay loaded between batches.
+    """
+
+    def __init__(self, models, features=None, max_batch=MAX_BATCH, max_wait=MAX_WAIT,
+                 p_up_threshold=P_UP_THRESHOLD, p_down_threshold=P_DOWN_THRESHOLD,
+                 strong_threshold=STRONG_THRESHOLD, strong_fraction=STRONG_FRACTION, weak_fraction=WEAK_FRACTION):
+        self.models = models
+        self.features = features
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.thresholds = (p_up_threshold, p_down_threshold, strong_threshold, strong_fraction, weak_fraction)
+        self._queue = deque()
+        self._ready = threading.Condition()
+        self._thread = None
+        self._stats_lock = threading.Lock()
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._batch_sizes = Counter()
+        self._counts = Counter()
+        self._known = set()
+
+    def start(self):
+        """Start the batching thread; called on first submit"""
+        with self._ready:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="prediction-batcher", daemon=True)
+                self._thread.start()
+        return self
+
+    def _request(self, symbol, features=None, date=None):
+        """Validated request; without `features` the row comes from the feature table"""
+        if not isinstance(symbol, str):
+            raise TypeError(f"Symbol must be a string, got {type(symbol).__name__}")
+        symbol = symbol.upper()
+        if symbol not in self._known:
+            # A registry looks on disk, so remember the symbols it has
+            if symbol not in self.models:
+                raise KeyError(symbol)
+            self._known.add(symbol)
+        if features is None:
+            if self.features is None:
+                raise ValueError("No feature table to resolve dates against; send a feature vector")
+            date, features = self.features.row(symbol, date)
+        elif isinstance(features, dict):
+            missing = [name for name in FEATURES if name not in features]
+            if missing:
+                raise ValueError(f"Missing features: {', '.join(missing)}")
+            features = [features[name] for name in FEATURES]
+        features = np.asarray(features, dtype=np.float64)
+        if features.shape != (len(FEATURES),):
+            raise ValueError(f"Expected {len(FEATURES)} features ({', '.join(FEATURES)}), got shape {features.shape}")
+
+        return _Request(symbol, features, date)
+
+    def _enqueue(self, requests):
+        if self._thread is None:
+            self.start()
+        with self._ready:
+            self._queue.extend(requests)
+            self._ready.notify()
+
+    def submit(self, symbol, features=None, date=None):
+        """Queue one request and return its handle; errors in the request itself raise here
+
+        Without `features` the row is looked up in the feature table by date,
+        or the latest bar when date is None too.
+        """
+        request = self._request(symbol, features, date)
+        self._enqueue([request])
+        return request
+
+    def wait(self, request, timeout=REQUEST_TIMEOUT):
+        if not request.done.wait(timeout):
+            raise TimeoutError(f"Prediction for {request.symbol} timed out after {timeout}s")
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def predict(self, symbol, features=None, date=None, timeout=REQUEST_TIMEOUT):
+        """Signal for one symbol: probabilities and the strategy's action"""
+        return self.wait(self.submit(symbol, features, date), timeout)
+
+    def predict_many(self, requests, timeout=REQUEST_TIMEOUT):
+        """Signals for a list of {"symbol", "features" or "date"} dicts, queued together
+
+        Each entry gets its result or an {"error": ...} dict.
+        """
+        handles = []
+        for item in requests:
+            try:
+                handles.append(self._request(item["symbol"], item.get("features"), item.get("date")))
+            except (KeyError, ValueError, TypeError, AttributeError) as e:
+                symbol = item.get("symbol") if isinstance(item, dict) else None
+                handles.append({"symbol": symbol, "error": _error_message(e)})
+        # Queue the whole list at once so it lands in the same batch
+        self._enqueue([handle for handle in handles if not isinstance(handle, dict)])
+        results = []
+        for handle in handles:
+            if isinstance(handle, dict):
+                results.append(handle)
+                continue
+            try:
+                results.append(self.wait(handle, timeout))
+            except Exception as e:
+                results.append({"symbol": handle.symbol, "error": _error_message(e)})
+        return results
+
+    def _run(self):
+        while True:
+            with self._ready:
+                while not self._queue:
+                    self._ready.wait()
+                # Hold the batch open until it is full or the first request has waited max_wait
+                deadline = self._queue[0].start + self.max_wait
+                while len(self._queue) < self.max_batch:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    self._ready.wait(remaining)
+                batch = [self._queue.popleft() for _ in range(min(len(self._queue), self.max_batch))]
+            self._execute(batch)
+
+    def _execute(self, batch):
+        start = time.perf_counter()
+        groups = {}
+        for request in batch:
+            groups.setdefault(request.symbol, []).append(request)
+
+        for symbol, requests in groups.items():
+            try:
+                model = self.models[symbol]
+                X = np.vstack([request.features for request in requests])
+                names = getattr(model, "feature_names_in_", None)
+                if names is not None:
+                    # sklearn checks the column names the forest was fitted with
+                    X = pd.DataFrame(X, columns=names)
+                probs = model.predict_proba(X)
+                side, fraction = decide_orders(probs[:, :1], probs[:, 1:], *self.thresholds)
+                for i, request in enumerate(requests):
+                    request.result = {
+                        "symbol": symbol,
+                        "date": request.date,
+                        "p_down": float(probs[i, 0]),
+                        "p_up": float(probs[i, 1]),
+                        "action": ACTIONS.get(int(side[i, 0]), "Hold"),
+                        "fraction": float(fraction[i, 0]),
+                        # Rows scored by this symbol's predict_proba call
+                        "batch_size": len(requests),
+                    }
+            except Exception as e:
+                for request in requests:
+                    request.error = e
+
+        end = time.perf_counter()
+        METRICS.observe("predict_batch", end - start)
+        METRICS.count("predict_batches")
+        METRICS.count("predict_requests", len(batch))
+        with self._stats_lock:
+            self._batch_sizes[len(batch)] += 1
+            self._counts["batches"] += 1
+            self._counts["requests"] += len(batch)
+            self._counts["model_calls"] += len(groups)
+            self._counts["errors"] += sum(request.error is not None for request in batch)
+            for request in batch:
+                self._latencies.append(end - request.start)
+        for request in batch:
+            METRICS.observe("predict_request", end - request.start)
+            request.done.set()
+
+    def stats(self):
+        """Request and batch counts, latency percentiles (ms) and the batch size distribution"""
+        with self._stats_lock:
+            latencies = np.array(self._latencies)
+            sizes = dict(sorted(self._batch_sizes.items()))
+            counts = dict(self._counts)
+        requests = counts.get("requests", 0)
+        batches = counts.get("batches", 0)
+        result = {
+            "requests": requests,
+            "batches": batches,
+            "model_calls": counts.get("model_calls", 0),
+            "errors": counts.get("errors", 0),
+            "mean_batch_size": requests / batches if batches else 0.0,
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000,
+            "batch_sizes": {str(size): count for size, count in sizes.items()},
+            "latency_ms": {},
+        }
+        if len(latencies):
+            p50, p90, p99 = np.percentile(latencies, [50, 90, 99]) * 1000
+            result["latency_ms"] = {"p50": p50, "p90": p90, "p99": p99, "max": float(latencies.max() * 1000),
+                                    "window": len(latencies)}
+        return result
+
+
+def _error_message(error):
+    if isinstance(error, KeyError):
+        return f"Unknown symbol {error.args[0]}"
+    return str(error)
+
+
+def build_service(max_batch=MAX_BATCH, max_wait=MAX_WAIT, data_path=DATA_PATH, model_path=MODEL_PATH,
+                  cache_path=FEATURE_CACHE_PATH, store_path=STORE_PATH):
+    """Service over every model on disk, resolving dates to the features each model was trained on"""
+    models = ModelRegistry(model_path, compact=True)
+    return PredictionService(models, FeatureTable(data_path, cache_path, store_path, model_path), max_batch, max_wait)
+
+
+def main(argv=None):
+    """Load test: many client threads asking for signals at once"""
+    parser = argparse.ArgumentParser(description="Micro-batched prediction service load test")
+    parser.add_argument("--clients", type=int, default=32, help="Concurrent client threads")
+    parser.add_argument("--requests", type=int, default=2000, help="Total requests")
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH)
+    parser.add_argument("--max-wait-ms", type=float, default=MAX_WAIT * 1000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    service = build_service(args.max_batch, args.max_wait_ms / 1000)
+    symbols = [symbol for symbol in SYMBOLS if symbol in service.models]
+    dates = {symbol: service.features.table(symbol)[0][-250:] for symbol in symbols}
+    for symbol in symbols:
+        service.predict(symbol)  # warm the model and the feature table
+    rng = random.Random(args.seed)
+    work = [(symbol, str(rng.choice(dates[symbol]))) for symbol in rng.choices(symbols, k=args.requests)]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.clients) as pool:
+        results = list(pool.map(lambda item: service.predict(item[0], date=item[1]), work))
+    elapsed = time.perf_counter() - start
+
+    stats = service.stats()
+    print(f"{len(results)} requests from {args.clients} clients in {elapsed:.2f}s "
+          f"({len(results) / elapsed:,.0f}/s)")
+    print(f"{stats['batches']} batches, {stats['model_calls']} predict_proba calls, "
+          f"mean batch size {stats['mean_batch_size']:.1f}")
+    latency = stats["latency_ms"]
+    print(f"Latency p50 {latency['p50']:.2f} ms, p99 {latency['p99']:.2f} ms, max {latency['max']:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
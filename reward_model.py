@@ -0,0 +1,325 @@
+import argparse
+import hashlib
+import io
+import json
+import os
+import sys
+import time
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from rewards import TRAINING_DATA_FILE
+
+REWARD_MODEL_PATH = "stock_notebooks/reward_model.npz"
+CHECKPOINT_VERSION = 1
+BATCH_ROWS = 50000
+CHECKPOINT_EVERY = 10
+TEST_SIZE = 0.2
+
+# trading_model.ipynb regresses the reward on every other column, with the symbol one-hot encoded
+NUMERIC_COLUMNS = ["open", "close", "change_in_price", "prediction", "model_accuracy"]
+TARGET_COLUMN = "reward"
+
+
+def test_rows(rows, test_size=TEST_SIZE):
+    """Hold out a stable pseudo-random share of rows by their position in the file
+
+    The split depends only on the row number, so rows keep their side of the
+    split when more data is appended and training resumes.
+    """
+    mixed = (np.asarray(rows, dtype=np.uint64) * np.uint64(2654435761)) & np.uint64(0xFFFFFFFF)
+    return mixed < np.uint64(int(test_size * 2 ** 32))
+
+
+class Moments:
+    """Count, mean and centered cross-product matrix of a stream of vectors
+
+    Batches are merged with the pairwise update of Chan et al., which stays
+    accurate however many rows go in. New trailing dimensions can be added
+    later; earlier rows count as zeros there.
+    """
+
+    def __init__(self, dims=0):
+        self.n = 0
+        self.mean = np.zeros(dims)
+        self.cross = np.zeros((dims, dims))
+
+    def grow(self, dims):
+        if dims <= len(self.mean):
+            return
+        mean = np.zeros(dims)
+        cross = np.zeros((dims, dims))
+        mean[:len(self.mean)] = self.mean
+        cross[:len(self.mean), :len(self.mean)] = self.cross
+        self.mean, self.cross = mean, cross
+
+    def update(self, Z):
+        """Fold a (rows, dims) batch in"""
+        m = len(Z)
+        if m == 0:
+            return
+        batch_mean = Z.mean(axis=0)
+        centered = Z - batch_mean
+        batch_cross = centered.T @ centered
+        delta = batch_mean - self.mean
+        total = self.n + m
+        self.cross += batch_cross + np.outer(delta, delta) * (self.n * m / total)
+        self.mean += delta * (m / total)
+        self.n = total
+
+
+class StreamingRewardRegressor:
+    """Least squares fit of the reward, built from running moments instead of the data
+
+    Equivalent to the notebook's pd.get_dummies + LinearRegression on the
+    same training rows, but each batch is folded into fixed-size moment
+    matrices and then dropped, so memory does not grow with the file.
+    Symbols get a dummy column in order of first appearance (the vocabulary
+    is saved with the model, so every batch and every resumed run agrees),
+    or with hash_buckets a fixed number of CRC32-hashed columns.
+    """
+
+    def __init__(self, hash_buckets=None):
+        self.hash_buckets = hash_buckets
+        self.vocabulary = {}
+        dims = 1 + len(NUMERIC_COLUMNS) + (hash_buckets or 0)
+        # Vectors are [reward, numeric features..., symbol columns...]
+        self.train = Moments(dims)
+        self.test = Moments(dims)
+        self.coef_ = None
+        self.intercept_ = None
+
+    @property
+    def feature_names(self):
+        if self.hash_buckets:
+            symbols = [f"symbol_hash_{bucket}" for bucket in range(self.hash_buckets)]
+        else:
+            symbols = [f"symbol_{symbol}" for symbol in sorted(self.vocabulary, key=self.vocabulary.get)]
+        return NUMERIC_COLUMNS + symbols
+
+    def _symbol_columns(self, symbols, grow):
+        if self.hash_buckets:
+            return np.array([zlib.crc32(str(symbol).encode()) % self.hash_buckets for symbol in symbols])
+        if grow:
+            for symbol in pd.unique(symbols):
+                self.vocabulary.setdefault(str(symbol), len(self.vocabulary))
+        return np.array([self.vocabulary.get(str(symbol), -1) for symbol in symbols])
+
+    def design(self, frame, grow=False):
+        """[numeric features, symbol one-hot] matrix for a frame; unknown symbols encode as all zeros"""
+        columns = self._symbol_columns(frame["symbol"].to_numpy(), grow)
+        n_symbols = self.hash_buckets or len(self.vocabulary)
+        X = np.zeros((len(frame), len(NUMERIC_COLUMNS) + n_symbols))
+        X[:, :len(NUMERIC_COLUMNS)] = frame[NUMERIC_COLUMNS].to_numpy(dtype=np.float64)
+        known = columns >= 0
+        X[np.flatnonzero(known), len(NUMERIC_COLUMNS) + columns[known]] = 1.0
+        return X
+
+    def partial_fit(self, frame, rows):
+        """Fold a batch of trading_data.csv rows in; `rows` are their row numbers in the file"""
+        X = self.design(frame, grow=True)
+        Z = np.column_stack([frame[TARGET_COLUMN].to_numpy(dtype=np.float64), X])
+        for moments in (self.train, self.test):
+            moments.grow(Z.shape[1])
+        held_out = test_rows(rows)
+        self.train.update(Z[~held_out])
+        self.test.update(Z[held_out])
+        self.coef_ = None
+        return self
+
+    def solve(self):
+        """Coefficients from the training moments (minimum-norm, like LinearRegression's lstsq)"""
+        cross = self.train.cross
+        self.coef_ = np.linalg.lstsq(cross[1:, 1:], cross[1:, 0], rcond=None)[0]
+        self.intercept_ = self.train.mean[0] - self.train.mean[1:] @ self.coef_
+        return self
+
+    def predict(self, frame):
+        if self.coef_ is None:
+            self.solve()
+        return self.design(frame) @ self.coef_ + self.intercept_
+
+    def score(self, moments=None):
+        """R^2 on the held-out rows (or any Moments), computed from their moments alone"""
+        if self.coef_ is None:
+            self.solve()
+        moments = moments or self.test
+        if moments.n == 0:
+            return float("nan")
+        weights = np.concatenate([[1.0], -self.coef_])
+        residual_mean = weights @ moments.mean - self.intercept_
+        sse = weights @ moments.cross @ weights + moments.n * residual_mean ** 2
+        sst = moments.cross[0, 0]
+        return 1.0 - sse / sst if sst > 0 else float("nan")
+
+
+def iter_batches(path, batch_rows=BATCH_ROWS, offset=0, first_row=0):
+    """Yield (frame, row numbers, next row, end offset, raw bytes) batches of a CSV from a byte offset
+
+    Lines are read in binary so every batch ends on an exact byte offset that
+    a checkpoint can resume from. Reading stops at the last line that ends in
+    a newline: a final line without one may still be being appended, so it is
+    left for the next run. Rows with missing values are skipped.
+    """
+    with open(path, "rb") as f:
+        header = f.readline()
+        names = header.decode().strip().split(",")
+        if offset:
+            f.seek(offset)
+        end = f.tell()
+        row = first_row
+        while True:
+            lines = []
+            for _ in range(batch_rows):
+                line = f.readline()
+                if not line.endswith(b"\n"):
+                    break
+                lines.append(line)
+            if not lines:
+                return
+            raw = b"".join(lines)
+            end += len(raw)
+            frame = pd.read_csv(io.BytesIO(raw), header=None, names=names, float_precision="round_trip")
+            rows = np.arange(row, row + len(frame))
+            row += len(frame)
+            keep = frame[NUMERIC_COLUMNS + [TARGET_COLUMN, "symbol"]].notna().all(axis=1).to_numpy()
+            yield frame[keep], rows[keep], row, end, raw
+
+
+def save_checkpoint(path, model, state):
+    """Write the moments, vocabulary and read position to a temporary file and rename it into place"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    meta = {"version": CHECKPOINT_VERSION, "hash_buckets": model.hash_buckets,
+            "vocabulary": model.vocabulary, "train_n": model.train.n, "test_n": model.test.n, **state}
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(f, train_mean=model.train.mean, train_cross=model.train.cross,
+                 test_mean=model.test.mean, test_cross=model.test.cross, meta=np.array(json.dumps(meta)))
+    os.replace(tmp_path, path)
+
+
+def load_checkpoint(path):
+    """(model, state) from a checkpoint"""
+    with np.load(path) as data:
+        meta = json.loads(str(data["meta"]))
+        if meta["version"] != CHECKPOINT_VERSION:
+            raise ValueError(f"Unsupported reward model checkpoint version {meta['version']}")
+        model = StreamingRewardRegressor(meta["hash_buckets"])
+        model.vocabulary = meta["vocabulary"]
+        for name in ("train", "test"):
+            moments = getattr(model, name)
+            moments.n = meta[f"{name}_n"]
+            moments.mean = data[f"{name}_mean"]
+            moments.cross = data[f"{name}_cross"]
+    state = {key: meta[key] for key in ("source", "offset", "rows", "prefix_sha256")}
+    return model, state
+
+
+def _prefix_digest(path, offset, chunk_bytes=1 << 20):
+    """Running SHA-256 of the first `offset` bytes of a file, or of its header line for offset 0"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        if not offset:
+            digest.update(f.readline())
+            return digest
+        remaining = offset
+        while remaining:
+            chunk = f.read(min(chunk_bytes, remaining))
+            if not chunk:
+                break
+            digest.update(chunk)
+            remaining -= len(chunk)
+    return digest
+
+
+def _fresh_state(path, hash_buckets):
+    return (StreamingRewardRegressor(hash_buckets), {"source": path, "offset": 0, "rows": 0, "prefix_sha256": None},
+            _prefix_digest(path, 0))
+
+
+def resume_state(path, checkpoint, hash_buckets=None):
+    """Model, read position and running prefix hash to continue from, or a fresh start
+
+    A checkpoint is reused only if the file still starts with exactly the
+    bytes it consumed, so appended rows are trained on and a rewritten file
+    is trained from scratch.
+    """
+    if checkpoint and os.path.exists(checkpoint):
+        try:
+            model, state = load_checkpoint(checkpoint)
+            if model.hash_buckets == hash_buckets and os.path.getsize(path) >= state["offset"]:
+                digest = _prefix_digest(path, state["offset"])
+                if digest.hexdigest() == state["prefix_sha256"]:
+                    return model, state, digest
+            print(f"{path} changed since the checkpoint, training from scratch")
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Ignoring unreadable checkpoint {checkpoint}: {e}")
+    return _fresh_state(path, hash_buckets)
+
+
+def train_reward_model(path=TRAINING_DATA_FILE, checkpoint=REWARD_MODEL_PATH, batch_rows=BATCH_ROWS,
+                       hash_buckets=None, checkpoint_every=CHECKPOINT_EVERY, fresh=False):
+    """Stream a trading_data.csv-style file into the regressor, checkpointing as it goes
+
+    Returns the fitted model and a stats dict. Only the current batch and the
+    moment matrices are held in memory.
+    """
+    if fresh:
+        model, state, digest = _fresh_state(path, hash_buckets)
+    else:
+        model, state, digest = resume_state(path, checkpoint, hash_buckets)
+    resumed_rows = state["rows"]
+
+    start = time.perf_counter()
+    batches = 0
+    for frame, rows, next_row, offset, raw in iter_batches(path, batch_rows, state["offset"], state["rows"]):
+        model.partial_fit(frame, rows)
+        digest.update(raw)
+        state.update(offset=offset, rows=next_row, prefix_sha256=digest.hexdigest())
+        batches += 1
+        if checkpoint and batches % checkpoint_every == 0:
+            save_checkpoint(checkpoint, model, state)
+    if checkpoint and batches:
+        save_checkpoint(checkpoint, model, state)
+
+    model.solve()
+    return model, {
+        "rows": state["rows"],
+        "new_rows": state["rows"] - resumed_rows,
+        "batches": batches,
+        "train_rows": model.train.n,
+        "test_rows": model.test.n,
+        "r2": float(model.score()),
+        "seconds": time.perf_counter() - start,
+    }
+
+
+def main(argv=None):
+    """Train the reward regressor on trading_data.csv in fixed-size batches"""
+    parser = argparse.ArgumentParser(description="Out-of-core training of the trading_data.csv reward regressor")
+    parser.add_argument("path", nargs="?", default=TRAINING_DATA_FILE)
+    parser.add_argument("--checkpoint", default=REWARD_MODEL_PATH)
+    parser.add_argument("--batch-rows", type=int, default=BATCH_ROWS)
+    parser.add_argument("--hash-buckets", type=int, default=None,
+                        help="Hash symbols into this many columns instead of one column per symbol")
+    parser.add_argument("--fresh", action="store_true", help="Ignore the checkpoint and train from the start")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.path):
+        print(f"No training data at {args.path}. Export it with rewards.py first.")
+        return 1
+    model, stats = train_reward_model(args.path, args.checkpoint, args.batch_rows, args.hash_buckets,
+                                      fresh=args.fresh)
+    print(f"{stats['new_rows']} new rows in {stats['batches']} batches ({stats['seconds']:.2f}s), "
+          f"{stats['train_rows']} train / {stats['test_rows']} test rows in total")
+    print(f"Model R^2 Score: {stats['r2']}")
+    for name, coef in zip(model.feature_names, model.coef_):
+        print(f"  {name:24} {coef: .6g}")
+    print(f"  {'intercept':24} {model.intercept_: .6g}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,280 @@
+import argparse
+import filecmp
+import glob
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import METRICS
+from market_store import CSV_SUFFIX, DATA_PATH, STORE_PATH, MarketStore, load_symbol_frame
+from model_registry import MODEL_PATH, MODEL_SUFFIX
+
+REWARD_INDEX_PATH = "stock_notebooks/reward_index.npz"
+TRAINING_DATA_FILE = "trading_data.csv"
+INDEX_VERSION = 1
+
+# Columns of trading_data.csv, as written by trading_model.ipynb
+EXPORT_COLUMNS = ["symbol", "open", "close", "change_in_price", "prediction", "model_accuracy", "reward"]
+NOTEBOOK_FEATURES = ['RSI', 'k_percent', 'r_percent', 'Price_Rate_Of_Change', 'MACD', 'On Balance Volume']
+
+# Keys pack the symbol code into the high bits and the day into the low bits,
+# so one sorted int64 array indexes every symbol
+DAY_BITS = 32
+DAY_OFFSET = 1 << 31
+
+
+def _stamp(symbol, data_path):
+    """Size and mtime of a symbol's CSV, None when it only lives in the store"""
+    csv_path = os.path.join(data_path, f"{symbol}{CSV_SUFFIX}")
+    if not os.path.exists(csv_path):
+        return None
+    stat = os.stat(csv_path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def _days(dates):
+    """Dates as integer days since the epoch; unparseable dates become NaT"""
+    return pd.to_datetime(dates, format="ISO8601", errors="coerce").to_numpy().astype("datetime64[D]")
+
+
+def _keys(codes, days):
+    return (codes.astype(np.int64) << DAY_BITS) + (days.astype(np.int64) + DAY_OFFSET)
+
+
+def available_symbols(data_path=DATA_PATH, store_path=STORE_PATH):
+    """Every symbol with a price CSV or a store entry"""
+    symbols = set(MarketStore(store_path).symbols())
+    symbols.update(
+        os.path.basename(path)[:-len(CSV_SUFFIX)] for path in glob.glob(os.path.join(data_path, "*" + CSV_SUFFIX))
+    )
+    return sorted(symbols)
+
+
+def read_prices(symbol, data_path=DATA_PATH, store=None):
+    """A symbol's price rows with every float exactly as written in its CSV
+
+    The default pandas parser can be off by one unit in the last place, which
+    the notebook's float() never is; the store is used only without a CSV.
+    """
+    csv_path = os.path.join(data_path, f"{symbol}{CSV_SUFFIX}")
+    if os.path.exists(csv_path) or store is None:
+        with METRICS.timer("csv_parse"):
+            return pd.read_csv(csv_path, float_precision="round_trip")
+    return load_symbol_frame(symbol, data_path, store)
+
+
+def day_rewards(df):
+    """Per-row dates and the notebook's reward, close / open - 1, for rows with a valid date"""
+    dates = pd.to_datetime(df["datetime"], format="ISO8601", errors="coerce")
+    opens = pd.to_numeric(df["open"], errors="coerce").to_numpy(dtype=np.float64)
+    closes = pd.to_numeric(df["close"], errors="coerce").to_numpy(dtype=np.float64)
+    valid = dates.notna().to_numpy()
+    days = dates[valid].to_numpy().astype("datetime64[D]")
+    return days, closes[valid] / opens[valid] - 1
+
+
+class RewardIndex:
+    """Sorted (symbol, date) -> reward lookup table over every symbol's price data
+
+    One int64 key per row, sorted, so a single lookup is a binary search and a
+    batch of lookups is one vectorized searchsorted. When a date appears twice
+    the first row in the CSV wins, like the notebook's linear scan.
+    """
+
+    def __init__(self, symbols, keys, rewards, sources=None):
+        self.symbols = list(symbols)
+        self.codes = {symbol: j for j, symbol in enumerate(self.symbols)}
+        self.keys = keys
+        self.rewards = rewards
+        self.sources = sources or {}
+
+    def __len__(self):
+        return len(self.keys)
+
+    @classmethod
+    def build(cls, symbols=None, data_path=DATA_PATH, store_path=STORE_PATH):
+        """Read each symbol's prices and index them"""
+        symbols = sorted(dict.fromkeys(s.upper() for s in symbols)) if symbols else available_symbols(data_path, store_path)
+        store = MarketStore(store_path)
+        keys, rewards, sources = [], [], {}
+        with METRICS.timer("reward_index_build"):
+            for code, symbol in enumerate(symbols):
+                days, values = day_rewards(read_prices(symbol, data_path, store))
+                order = np.argsort(days, kind="stable")
+                days, values = days[order], values[order]
+                # First row per date, in CSV order
+                _, first = np.unique(days, return_index=True)
+                keys.append(_keys(np.full(len(first), code), days[first].astype(np.int64)))
+                rewards.append(values[first])
+                sources[symbol] = _stamp(symbol, data_path)
+        keys = np.concatenate(keys) if keys else np.empty(0, dtype=np.int64)
+        rewards = np.concatenate(rewards) if rewards else np.empty(0)
+        return cls(symbols, keys, rewards, sources)
+
+    @classmethod
+    def load(cls, path=REWARD_INDEX_PATH):
+        with np.load(path) as data:
+            meta = json.loads(str(data["meta"]))
+            if meta["version"] != INDEX_VERSION:
+                raise ValueError(f"Unsupported reward index version {meta['version']}")
+            return cls(meta["symbols"], data["keys"], data["rewards"], meta["sources"])
+
+    def save(self, path=REWARD_INDEX_PATH):
+        """Write the index to a temporary file and rename it into place"""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        meta = {"version": INDEX_VERSION, "symbols": self.symbols, "sources": self.sources}
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, keys=self.keys, rewards=self.rewards, meta=np.array(json.dumps(meta)))
+        os.replace(tmp_path, path)
+
+    def is_fresh(self, symbols, data_path=DATA_PATH):
+        """True if the index covers the symbols and none of their CSVs changed"""
+        return all(symbol in self.codes and self.sources.get(symbol) == _stamp(symbol, data_path)
+                   for symbol in symbols)
+
+    @classmethod
+    def open(cls, symbols=None, data_path=DATA_PATH, path=REWARD_INDEX_PATH, store_path=STORE_PATH):
+        """Load the persisted index, rebuilding and saving it when a CSV changed"""
+        wanted = [s.upper() for s in symbols] if symbols else available_symbols(data_path, store_path)
+        if os.path.exists(path):
+            try:
+                index = cls.load(path)
+                if index.is_fresh(wanted, data_path):
+                    return index
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Rebuilding unreadable reward index {path}: {e}")
+        index = cls.build(wanted, data_path, store_path)
+        index.save(path)
+        return index
+
+    def reward(self, symbol, date):
+        """Reward for one symbol and date; ValueError when there is no such row"""
+        code = self.codes.get(symbol.upper())
+        if code is None:
+            raise ValueError(f"Symbol {symbol} is not in the reward index")
+        key = _keys(np.array([code]), _days([date]).astype(np.int64))[0]
+        i = int(np.searchsorted(self.keys, key))
+        if i == len(self.keys) or self.keys[i] != key:
+            raise ValueError(f"Date {date} not found for {symbol.upper()}")
+        return float(self.rewards[i])
+
+    def lookup(self, symbols, dates):
+        """Rewards for paired symbols and dates; NaN where there is no row
+
+        `symbols` may be a single ticker, broadcast against `dates`.
+        """
+        days = _days(dates)
+        if isinstance(symbols, str):
+            symbols = [symbols] * len(days)
+        codes = pd.Index(self.symbols).get_indexer([s.upper() for s in symbols])
+        out = np.full(len(days), np.nan)
+        valid = (codes >= 0) & ~np.isnat(days)
+        if not valid.any() or not len(self.keys):
+            return out
+
+        keys = _keys(codes[valid], days[valid].astype(np.int64))
+        positions = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        found = self.keys[positions] == keys
+        hits = np.flatnonzero(valid)[found]
+        out[hits] = self.rewards[positions[found]]
+        return out
+
+
+def model_accuracy(symbol, df, model_path=MODEL_PATH):
+    """Test accuracy in percent, as the notebook computes it
+
+    Uses the accuracy train.py recorded next to the model when there is one,
+    otherwise scores the model on the notebook's train_test_split of df.
+    """
+    meta_path = os.path.join(model_path, f"{symbol}_model.json")
+    if os.path.exists(meta_path):
+        try:
+            with open(meta_path) as f:
+                accuracy = json.load(f).get("accuracy")
+            if accuracy is not None:
+                return accuracy * 100.0
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable metadata {meta_path}: {e}")
+
+    # joblib and sklearn are only needed for this fallback
+    import joblib
+    from sklearn.metrics import accuracy_score
+    from sklearn.model_selection import train_test_split
+
+    model = joblib.load(os.path.join(model_path, f"{symbol}{MODEL_SUFFIX}"))
+    _, X_test, _, y_test = train_test_split(df[NOTEBOOK_FEATURES], df["Prediction"], random_state=0)
+    return accuracy_score(y_test, model.predict(X_test), normalize=True) * 100.0
+
+
+def training_rows(symbol, df, accuracy):
+    """One symbol's trading_data.csv rows, skipping rows without a valid date"""
+    valid = pd.to_datetime(df["datetime"], format="ISO8601", errors="coerce").notna().to_numpy()
+    df = df[valid]
+    return pd.DataFrame({
+        "symbol": symbol,
+        "open": df["open"].to_numpy(),
+        "close": df["close"].to_numpy(),
+        "change_in_price": df["change_in_price"].to_numpy(),
+        "prediction": df["Prediction"].to_numpy(),
+        "model_accuracy": accuracy,
+        "reward": df["Price_Rate_Of_Change"].to_numpy(),
+    }, columns=EXPORT_COLUMNS)
+
+
+def export_training_data(symbols, path=TRAINING_DATA_FILE, data_path=DATA_PATH, model_path=MODEL_PATH,
+                         accuracies=None, store_path=STORE_PATH):
+    """Write trading_data.csv for the symbols in one pass
+
+    The file is rebuilt from scratch and renamed into place, so reruns give the
+    same file instead of appending duplicate rows. An unchanged file is left
+    untouched. Returns the number of rows written.
+    """
+    accuracies = accuracies or {}
+    store = MarketStore(store_path)
+    frames = []
+    for symbol in symbols:
+        df = read_prices(symbol, data_path, store)
+        accuracy = accuracies.get(symbol)
+        if accuracy is None:
+            accuracy = model_accuracy(symbol, df, model_path)
+        frames.append(training_rows(symbol, df, accuracy))
+    rows = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=EXPORT_COLUMNS)
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    rows.to_csv(tmp_path, index=False)
+    if os.path.exists(path) and filecmp.cmp(tmp_path, path, shallow=False):
+        os.remove(tmp_path)
+    else:
+        os.replace(tmp_path, path)
+    return len(rows)
+
+
+def main(argv=None):
+    """Refresh the reward index and rewrite trading_data.csv"""
+    parser = argparse.ArgumentParser(description="Build the reward index and export the training dataset")
+    parser.add_argument("symbols", nargs="*", help="Symbols to export (default: every CSV or store entry)")
+    parser.add_argument("--data-path", default=DATA_PATH)
+    parser.add_argument("--model-path", default=MODEL_PATH)
+    parser.add_argument("--index-path", default=REWARD_INDEX_PATH)
+    parser.add_argument("--output", default=TRAINING_DATA_FILE)
+    args = parser.parse_args(argv)
+
+    symbols = [s.upper() for s in args.symbols] or available_symbols(args.data_path)
+    index = RewardIndex.open(symbols, args.data_path, args.index_path)
+    print(f"Reward index: {len(index)} rows for {len(index.symbols)} symbols in {args.index_path}")
+
+    try:
+        rows = export_training_data(symbols, args.output, args.data_path, args.model_path)
+    except FileNotFoundError as e:
+        print(f"Error exporting training data: {e}")
+        return 1
+    print(f"Wrote {rows} rows to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
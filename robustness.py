@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+Monte Carlo robustness runs for the TradingSimulator strategy.
+Resamples many price paths from the CSV history and reports the spread of
+final value, drawdown and hit rate instead of a single 75-day result.
+"""
+
+import argparse
+import math
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from backtest import BUY, HOLD, SELL, decide_orders, predict_probabilities
+from daily_trades import FEATURES, SYMBOLS, load_models, load_stock_data
+from sweep import PARAMETERS, attach_arrays, release_arrays, share_arrays
+
+# "block" resamples blocks of consecutive daily bars per symbol; "window"
+# takes the real history over a random start date
+MODES = ("block", "window")
+N_PATHS = 2000
+PATH_DAYS = 75
+BLOCK_SIZE = 10
+# Paths simulated per task; every task is one vectorized pass
+CHUNK_PATHS = 250
+QUANTILES = [0.05, 0.25, 0.5, 0.75, 0.95]
+
+# Worker-side views of the shared inputs, set by _attach_inputs
+_inputs = {}
+
+
+def clean_history(data):
+    """Drop rows whose date does not parse, e.g. the notebooks' overwritten "1.0" rows
+
+    A row of 1.0s would show up as a -98% return followed by a 5000% one.
+    """
+    cleaned = {}
+    for symbol, df in data.items():
+        dates = pd.to_datetime(df["datetime"], format="ISO8601", errors="coerce")
+        cleaned[symbol] = df[dates.notna().to_numpy()].reset_index(drop=True)
+    return cleaned
+
+
+def bar_returns(closes):
+    """Close-to-close return of every bar, NaN for each symbol's first bar"""
+    returns = np.full(closes.shape, np.nan)
+    returns[1:] = closes[1:] / closes[:-1] - 1
+    return returns
+
+
+def aligned_rows(data, symbols):
+    """(dates, symbols) row of each date that every symbol has, in date order
+
+    The histories start on different days, so the same row number falls on
+    different dates per symbol; windows are drawn over this inner join instead.
+    """
+    days = [pd.to_datetime(data[symbol]["datetime"], format="ISO8601").to_numpy().astype("datetime64[D]")
+            for symbol in symbols]
+    common = days[0]
+    for symbol_days in days[1:]:
+        common = np.intersect1d(common, symbol_days)
+    rows = np.empty((len(common), len(symbols)), dtype=np.int32)
+    for j, symbol_days in enumerate(days):
+        # First row of each date, like the reward index
+        order = np.argsort(symbol_days, kind="stable")
+        rows[:, j] = order[np.searchsorted(symbol_days[order], common)]
+    return rows
+
+
+def draw_windows(rng, n_paths, path_days, aligned):
+    """(paths, days, symbols) row indices for random windows of the date-aligned history"""
+    if len(aligned) < path_days:
+        raise ValueError(f"Need at least {path_days} days shared by every symbol, have {len(aligned)}")
+    starts = rng.integers(0, len(aligned) - path_days + 1, n_paths)
+    return np.ascontiguousarray(aligned[starts[:, None] + np.arange(path_days)], dtype=np.int32)
+
+
+def draw_blocks(rng, n_paths, path_days, rows_per_symbol, block_size=BLOCK_SIZE):
+    """(paths, days, symbols) row indices for a moving block bootstrap, drawn per symbol
+
+    Blocks start on bars that have a return (not a symbol's first bar) and
+    keep block_size consecutive days, so a signal is still followed by the
+    return that came after it.
+    """
+    if block_size < 1:
+        raise ValueError(f"Block size must be at least 1, got {block_size}")
+    n_blocks = math.ceil(path_days / block_size)
+    index = np.empty((n_paths, path_days, len(rows_per_symbol)), dtype=np.int32)
+    for j, rows in enumerate(rows_per_symbol):
+        if rows <= block_size:
+            raise ValueError(f"Symbol {j} has {rows} rows, need more than the block size {block_size}")
+        starts = rng.integers(1, rows - block_size + 1, (n_paths, n_blocks))
+        blocks = starts[:, :, None] + np.arange(block_size)
+        index[:, :, j] = blocks.reshape(n_paths, -1)[:, :path_days]
+    return index
+
+
+def path_arrays(index, inputs, mode):
+    """Gather (paths, days, symbols) probabilities, closes and tradable flags for a set of paths"""
+    columns = np.arange(index.shape[2])
+    p_down = inputs["p_down"][index, columns]
+    p_up = inputs["p_up"][index, columns]
+    tradable = inputs["tradable"][index, columns]
+    if mode == "window":
+        closes = inputs["closes"][index, columns]
+    else:
+        # Chain the sampled returns onto the close of each path's first bar
+        growth = 1.0 + inputs["returns"][index, columns]
+        growth[:, 0] = 1.0
+        closes = inputs["closes"][index[:, 0], columns][:, None, :] * np.cumprod(growth, axis=1)
+    return p_down, p_up, closes, tradable
+
+
+def simulate_paths(side, fraction, closes, tradable, capital, reference_capital, allocation_divisor):
+    """backtest.simulate_trades for many paths at once
+
+    Inputs are (paths, days, symbols). Fills still run in day and symbol order
+    because cash is shared, but each step updates every path with one array
+    operation, using the same arithmetic as simulate_trades so each path's
+    equity matches it exactly. Returns equity (paths, days) relative to
+    reference_capital, as simulate_trades' total, and trade counts per path.
+    """
+    n_paths, n_days, n_symbols = closes.shape
+    cash = np.full(n_paths, float(capital))
+    holdings = np.zeros((n_paths, n_symbols))
+    last_value = np.zeros((n_paths, n_symbols))
+    marked = np.zeros((n_paths, n_symbols), dtype=bool)
+    total = np.empty((n_paths, n_days))
+    trade_count = np.zeros(n_paths, dtype=np.int64)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        for day in range(n_days):
+            for j in range(n_symbols):
+                live = tradable[:, day, j]
+                action = np.where(live, side[:, day, j], HOLD)
+                buy = action == BUY
+                sell = action == SELL
+                close = closes[:, day, j]
+                held = holdings[:, j]
+                investment = np.where(buy, fraction[:, day, j] * (cash / allocation_divisor),
+                                      fraction[:, day, j] * held)
+                quantity = investment / close
+                holdings[:, j] = np.where(buy, held + quantity, np.where(sell, held - quantity, held))
+                cash = np.where(buy, cash - investment, np.where(sell, cash + investment, cash))
+                trade_count += buy | sell
+                last_value[:, j] = np.where(live, holdings[:, j] * close, last_value[:, j])
+                marked[:, j] |= live
+
+            day_total = np.zeros(n_paths)
+            for j in range(n_symbols):
+                day_total = day_total + np.where(marked[:, j], last_value[:, j], 0.0)
+            total[:, day] = day_total + (cash - reference_capital)
+    return total, trade_count
+
+
+def path_metrics(equity, initial_capital):
+    """Final value, return, max drawdown and hit rate per path from (paths, days) equity
+
+    The hit rate is the share of days the portfolio gained, among the days its
+    value moved at all.
+    """
+    peaks = np.maximum.accumulate(equity, axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        drawdown = np.where(peaks > 0, 1.0 - equity / peaks, 0.0).max(axis=1)
+        changes = np.diff(equity, axis=1, prepend=initial_capital)
+        moved = (changes != 0).sum(axis=1)
+        hit_rate = np.where(moved > 0, (changes > 0).sum(axis=1) / moved, np.nan)
+    final_value = equity[:, -1]
+    return {
+        "final_value": final_value,
+        "return_pct": (final_value - initial_capital) / initial_capital * 100,
+        "max_drawdown_pct": drawdown * 100,
+        "hit_rate": hit_rate,
+    }
+
+
+def run_paths(task, inputs=None):
+    """Simulate paths [lo, hi) of the shared index array and return their metrics"""
+    lo, hi, mode, params = task
+    inputs = inputs if inputs is not None else _inputs
+    index = inputs["index"][lo:hi]
+    p_down, p_up, closes, tradable = path_arrays(index, inputs, mode)
+    side, fraction = decide_orders(
+        p_down, p_up, params["p_up_threshold"], params["p_down_threshold"],
+        params["strong_threshold"], params["strong_fraction"], params["weak_fraction"],
+    )
+    capital = params["initial_capital"]
+    n_symbols = closes.shape[2]
+    total, trade_count = simulate_paths(side, fraction, closes, tradable, capital, capital, n_symbols)
+    metrics = path_metrics(total + capital, capital)
+    metrics["trade_count"] = trade_count
+    # Equal-weight buy and hold over the same path, for comparison
+    metrics["hold_value"] = (capital / n_symbols * closes[:, -1] / closes[:, 0]).sum(axis=1)
+    return metrics
+
+
+def _attach_inputs(specs):
+    """Worker initializer: map the shared inputs without copying them"""
+    _inputs.update(attach_arrays(specs))
+
+
+def run_robustness(models, data, n_paths=N_PATHS, path_days=PATH_DAYS, mode="block", block_size=BLOCK_SIZE,
+                   seed=0, workers=None, params=None, symbols=None):
+    """Run the strategy over n_paths resampled paths and return one row per path
+
+    Probabilities are computed once over the whole history. The path indices
+    are drawn up front from `seed`, so results do not depend on the number of
+    workers; workers get the indices and the price and probability arrays
+    through shared memory.
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown resampling mode '{mode}', expected one of {MODES}")
+    params = {**PARAMETERS, **(params or {})}
+    symbols = [symbol for symbol in (symbols or SYMBOLS) if symbol in data]
+    data = clean_history({symbol: data[symbol] for symbol in symbols})
+    rows = [len(data[symbol]) for symbol in symbols]
+
+    p_down, p_up, closes, present, tradable = predict_probabilities(models, data, symbols, FEATURES, max(rows))
+    rng = np.random.default_rng(seed)
+    if mode == "window":
+        index = draw_windows(rng, n_paths, path_days, aligned_rows(data, symbols))
+    else:
+        index = draw_blocks(rng, n_paths, path_days, rows, block_size)
+    inputs = {"p_down": p_down, "p_up": p_up, "closes": closes, "returns": bar_returns(closes),
+              "tradable": tradable, "index": index}
+
+    tasks = [(lo, min(lo + CHUNK_PATHS, n_paths), mode, params) for lo in range(0, n_paths, CHUNK_PATHS)]
+    workers = min(workers or os.cpu_count() or 1, len(tasks))
+    if workers == 1:
+        parts = [run_paths(task, inputs) for task in tasks]
+    else:
+        blocks, specs = share_arrays(inputs)
+        try:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_attach_inputs, initargs=(specs,)) as pool:
+                parts = list(pool.map(run_paths, tasks))
+        finally:
+            release_arrays(blocks)
+
+    results = pd.DataFrame({name: np.concatenate([part[name] for part in parts]) for name in parts[0]})
+    results.insert(0, "path", np.arange(n_paths))
+    return results
+
+
+def summarize(results, initial_capital=PARAMETERS["initial_capital"]):
+    """Quantiles of the per-path metrics plus win rates against cash and buy-and-hold"""
+    columns = ["final_value", "return_pct", "max_drawdown_pct", "hit_rate", "trade_count", "hold_value"]
+    table = results[columns].quantile(QUANTILES)
+    table.index = [f"p{int(q * 100)}" for q in QUANTILES]
+    table.loc["mean"] = results[columns].mean()
+    return table, {
+        "paths": len(results),
+        "profitable": float((results["final_value"] > initial_capital).mean()),
+        "beats_hold": float((results["final_value"] > results["hold_value"]).mean()),
+    }
+
+
+def main(argv=None):
+    """Command line entry point for robustness runs"""
+    parser = argparse.ArgumentParser(description="Monte Carlo robustness runs for the trading strategy")
+    parser.add_argument("--paths", type=int, default=N_PATHS, help="Resampled paths to simulate")
+    parser.add_argument("--days", type=int, default=PATH_DAYS, help="Trading days per path")
+    parser.add_argument("--mode", choices=MODES, default="block",
+                        help="block: block bootstrap of daily bars per symbol; window: random start dates")
+    parser.add_argument("--block-size", type=int, default=BLOCK_SIZE, help="Days per bootstrap block")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument("--output", default=None, help="Write the per-path results to this CSV")
+    args = parser.parse_args(argv)
+    if args.block_size < 1:
+        parser.error("--block-size must be at least 1")
+
+    print("Loading trading models...")
+    models = load_models()
+    if not models:
+        print("Failed to load models. Exiting.")
+        return 1
+
+    print("Loading stock data...")
+    data = load_stock_data(sample_size=None)
+    if not data:
+        print("Failed to load stock data. Exiting.")
+        return 1
+
+    start = time.perf_counter()
+    results = run_robustness(models, data, args.paths, args.days, args.mode, args.block_size, args.seed, args.workers)
+    elapsed = time.perf_counter() - start
+    table, rates = summarize(results)
+
+    print(f"\n{rates['paths']} {args.mode} paths of {args.days} days in {elapsed:.2f}s")
+    print(table.to_string(float_format=lambda value: f"{value:,.2f}"))
+    print(f"\nProfitable paths: {rates['profitable'] * 100:.1f}%")
+    print(f"Paths beating equal-weight buy and hold: {rates['beats_hold'] * 100:.1f}%")
+    if args.output:
+        results.to_csv(args.output, index=False)
+        print(f"Per-path results saved to '{args.output}'")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -39,11 +39,15 @@ setup(
             "flake8>=3.8",
             "mypy>=0.800",
         ],
+        "parquet": [
+            "pyarrow>=8.0",
+        ],
     },
     entry_points={
         "console_scripts": [
             "trading-sim=daily_trades:main",
             "portfolio-viz=graph:main",
+            "trading-train=train:main",
         ],
     },
 )
@@ -0,0 +1,155 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from daily_trades import TradingSimulator
+from indicators import IndicatorEngine
+from ledger import PortfolioLedger
+from model_registry import MODEL_PATH, MODEL_SUFFIX
+
+CHECKPOINT_PATH = "stock_notebooks/sim_checkpoint.npz"
+# 2: indicator engines as named arrays instead of a pickle
+CHECKPOINT_VERSION = 2
+
+
+def model_stamps(symbols, model_path=MODEL_PATH):
+    """Size and mtime of each symbol's model file, so retrained models invalidate a checkpoint"""
+    stamps = {}
+    for symbol in symbols:
+        path = os.path.join(model_path, f"{symbol}{MODEL_SUFFIX}")
+        if os.path.exists(path):
+            stat = os.stat(path)
+            stamps[symbol] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    return stamps
+
+
+def _hash_day(digest, date, bars):
+    """Fold one (date, {symbol: row}) day into a running fingerprint"""
+    digest.update(str(date).encode())
+    for symbol in sorted(bars):
+        digest.update(symbol.encode())
+        digest.update(repr(list(bars[symbol].items())).encode())
+
+
+def save_checkpoint(path, simulator, key, last_date, days, fingerprint):
+    """Write the simulator's state to one .npz file, via a temporary file and a rename
+
+    The ledger and each indicator engine go in as their own named arrays and
+    everything else as JSON metadata, so loading never unpickles anything.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    meta = {
+        "version": CHECKPOINT_VERSION,
+        "key": key,
+        "last_date": str(last_date),
+        "days": days,
+        "fingerprint": fingerprint,
+        "capital": simulator.capital,
+        "costs_paid": simulator.costs_paid,
+        "holdings": simulator.holdings,
+        "last_fill": list(simulator.last_fill),
+        "engines": list(simulator.engines),
+    }
+    engines = {}
+    for i, engine in enumerate(simulator.engines.values()):
+        engines.update({f"engine{i}_{name}": array for name, array in engine.to_arrays().items()})
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(f, meta=np.array(json.dumps(meta)), **engines,
+                 **{f"ledger_{name}": array for name, array in simulator.ledger.arrays().items()})
+    os.replace(tmp_path, path)
+
+
+def load_checkpoint(path, simulator):
+    """Restore a checkpoint into a freshly built simulator; returns the metadata"""
+    with np.load(path, allow_pickle=False) as data:
+        meta = json.loads(str(data["meta"]))
+        if meta["version"] != CHECKPOINT_VERSION:
+            raise ValueError(f"Unsupported simulation checkpoint version {meta['version']}")
+        simulator.ledger = PortfolioLedger.from_arrays(
+            {name[len("ledger_"):]: data[name] for name in data.files if name.startswith("ledger_")}
+        )
+        simulator.engines = {
+            symbol: IndicatorEngine.from_arrays(
+                {name[len(prefix):]: data[name] for name in data.files if name.startswith(prefix)}
+            )
+            for symbol, prefix in ((symbol, f"engine{i}_") for i, symbol in enumerate(meta["engines"]))
+        }
+    simulator.capital = meta["capital"]
+    simulator.costs_paid = meta["costs_paid"]
+    simulator.holdings = meta["holdings"]
+    simulator.last_fill = tuple(meta["last_fill"])
+    return meta
+
+
+def resume_simulation(models, make_days, path=CHECKPOINT_PATH, symbols=None, compute_features=False,
+                      costs=None, stamps=None, **settings):
+    """Replay a day stream, trading only the days after the checkpoint
+
+    `make_days()` must return the full (date, {symbol: row}) stream from the
+    start of the history, e.g. bar_stream.csv_days. Days up to the checkpoint
+    are only hashed, not traded, and must hash to the checkpoint's fingerprint;
+    if the history, the symbols, the settings or the model stamps changed,
+    the whole stream is replayed instead. The result is therefore the same as
+    a full replay. `settings` are passed on to TradingSimulator. Returns the
+    simulator and a stats dict.
+    """
+    symbols = list(symbols) if symbols is not None else None
+    key = json.loads(json.dumps({
+        "symbols": symbols,
+        "compute_features": compute_features,
+        "costs": vars(costs) if costs is not None else None,
+        "models": stamps,
+        "settings": settings,
+    }))
+
+    def fresh():
+        return TradingSimulator(symbols=symbols, costs=costs, **settings)
+
+    simulator = fresh()
+    digest = hashlib.sha256()
+    days = iter(make_days())
+    resumed = 0
+    last_date = None
+
+    if path and os.path.exists(path):
+        try:
+            meta = load_checkpoint(path, simulator)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Ignoring unreadable checkpoint {path}: {e}")
+            meta = None
+        if meta is not None and meta["key"] == key:
+            checkpoint_date = np.datetime64(meta["last_date"], "D")
+            matched = False
+            for date, bars in days:
+                _hash_day(digest, date, bars)
+                resumed += 1
+                if date >= checkpoint_date:
+                    matched = date == checkpoint_date and digest.hexdigest() == meta["fingerprint"]
+                    break
+            if matched:
+                last_date = checkpoint_date
+            else:
+                print(f"History changed since the checkpoint in {path}, replaying from the start")
+        elif meta is not None:
+            print(f"Settings changed since the checkpoint in {path}, replaying from the start")
+        if last_date is None:
+            simulator, digest, days, resumed = fresh(), hashlib.sha256(), iter(make_days()), 0
+
+    def hashed(days):
+        for date, bars in days:
+            _hash_day(digest, date, bars)
+            yield date, bars
+
+    new_days = 0
+    for snapshot in simulator.replay(models, hashed(days), symbols, compute_features):
+        simulator.record_snapshot(snapshot)
+        last_date = snapshot["date"]
+        new_days += 1
+
+    if path and new_days:
+        save_checkpoint(path, simulator, key, last_date, resumed + new_days, digest.hexdigest())
+    return simulator, {"resumed_days": resumed, "new_days": new_days,
+                       "last_date": None if last_date is None else str(last_date)}
@@ -0,0 +1,185 @@
+import argparse
+import itertools
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from backtest import decide_orders, max_drawdown, predict_probabilities, simulate_trades
+from daily_trades import (
+    FEATURES,
+    INITIAL_CAPITAL,
+    P_DOWN_THRESHOLD,
+    P_UP_THRESHOLD,
+    STRONG_FRACTION,
+    STRONG_THRESHOLD,
+    SYMBOLS,
+    WEAK_FRACTION,
+    load_models,
+    load_stock_data,
+)
+
+# Parameters a sweep can vary, with the simulator's defaults
+PARAMETERS = {
+    "p_up_threshold": P_UP_THRESHOLD,
+    "p_down_threshold": P_DOWN_THRESHOLD,
+    "strong_threshold": STRONG_THRESHOLD,
+    "strong_fraction": STRONG_FRACTION,
+    "weak_fraction": WEAK_FRACTION,
+    "initial_capital": INITIAL_CAPITAL,
+}
+
+# Arrays every run reads; computed once and shared with the workers
+INPUT_NAMES = ["p_down", "p_up", "closes", "present", "tradable"]
+
+# Worker-side views of the shared inputs, set by _attach_inputs
+_inputs = {}
+_blocks = []
+
+
+def expand_grid(grid):
+    """Every combination of a {parameter: [values]} grid, filled out with defaults"""
+    unknown = set(grid) - set(PARAMETERS)
+    if unknown:
+        raise ValueError(f"Unknown sweep parameters: {sorted(unknown)}")
+    names = list(grid)
+    combinations = []
+    for values in itertools.product(*(grid[name] for name in names)):
+        params = dict(PARAMETERS)
+        params.update(zip(names, values))
+        combinations.append(params)
+    return combinations
+
+
+def run_combination(params, inputs=None):
+    """Run one parameter combination against precomputed probabilities"""
+    inputs = inputs if inputs is not None else _inputs
+    side, fraction = decide_orders(
+        inputs["p_down"], inputs["p_up"],
+        params["p_up_threshold"], params["p_down_threshold"],
+        params["strong_threshold"], params["strong_fraction"], params["weak_fraction"],
+    )
+    n_symbols = inputs["closes"].shape[1]
+    initial_capital = params["initial_capital"]
+    result = simulate_trades(
+        side, fraction, inputs["closes"], inputs["present"], inputs["tradable"],
+        initial_capital, [0] * n_symbols, initial_capital, n_symbols,
+    )
+
+    # The kernel's total is marked holdings plus cash relative to the starting capital
+    equity = result["total"] + initial_capital
+    final_value = float(equity[-1]) if equity.size else float(initial_capital)
+    return {
+        **params,
+        "final_value": final_value,
+        "return_pct": (final_value - initial_capital) / initial_capital * 100,
+        "max_drawdown_pct": max_drawdown(equity) * 100,
+        "trade_count": result["trade_count"],
+    }
+
+
+def share_arrays(arrays):
+    """Copy {name: array} into shared memory blocks; returns the blocks and the specs for attach_arrays"""
+    blocks = []
+    specs = {}
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+        blocks.append(block)
+        specs[name] = (block.name, array.shape, array.dtype.str)
+    return blocks, specs
+
+
+def attach_arrays(specs):
+    """Map shared arrays without copying them; the blocks stay open for the process lifetime"""
+    arrays = {}
+    for name, (block_name, shape, dtype) in specs.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        _blocks.append(block)
+        arrays[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+    return arrays
+
+
+def release_arrays(blocks):
+    """Close and free blocks created by share_arrays"""
+    for block in blocks:
+        block.close()
+        block.unlink()
+
+
+def _attach_inputs(specs):
+    """Worker initializer: map the shared input arrays without copying them"""
+    _inputs.update(attach_arrays(specs))
+
+
+def run_sweep(models, data, grid, sample_size=75, workers=None):
+    """Run every combination in a parameter grid and return a results table"""
+    combinations = expand_grid(grid)
+    p_down, p_up, closes, present, tradable = predict_probabilities(
+        models, data, SYMBOLS, FEATURES, sample_size
+    )
+    inputs = {"p_down": p_down, "p_up": p_up, "closes": closes, "present": present, "tradable": tradable}
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(combinations) == 1:
+        rows = [run_combination(params, inputs) for params in combinations]
+        return pd.DataFrame(rows)
+
+    blocks, specs = share_arrays({name: inputs[name] for name in INPUT_NAMES})
+    try:
+        chunksize = max(1, len(combinations) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_attach_inputs, initargs=(specs,)) as pool:
+            rows = list(pool.map(run_combination, combinations, chunksize=chunksize))
+    finally:
+        release_arrays(blocks)
+    return pd.DataFrame(rows)
+
+
+def main(argv=None):
+    """Command line entry point for parameter sweeps"""
+    parser = argparse.ArgumentParser(description="Sweep trading strategy parameters")
+    parser.add_argument("--p-up", type=float, nargs="+", default=[P_UP_THRESHOLD])
+    parser.add_argument("--p-down", type=float, nargs="+", default=[P_DOWN_THRESHOLD])
+    parser.add_argument("--strong-threshold", type=float, nargs="+", default=[STRONG_THRESHOLD])
+    parser.add_argument("--strong-fraction", type=float, nargs="+", default=[STRONG_FRACTION])
+    parser.add_argument("--weak-fraction", type=float, nargs="+", default=[WEAK_FRACTION])
+    parser.add_argument("--initial-capital", type=float, nargs="+", default=[INITIAL_CAPITAL])
+    parser.add_argument("--sample-size", type=int, default=75, help="Trailing days to simulate")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument("--output", default="sweep_results.csv")
+    args = parser.parse_args(argv)
+
+    grid = {
+        "p_up_threshold": args.p_up,
+        "p_down_threshold": args.p_down,
+        "strong_threshold": args.strong_threshold,
+        "strong_fraction": args.strong_fraction,
+        "weak_fraction": args.weak_fraction,
+        "initial_capital": args.initial_capital,
+    }
+
+    print("Loading trading models...")
+    models = load_models()
+    if not models:
+        print("Failed to load models. Exiting.")
+        return 1
+
+    print("Loading stock data...")
+    data = load_stock_data(sample_size=args.sample_size)
+    if not data:
+        print("Failed to load stock data. Exiting.")
+        return 1
+
+    results = run_sweep(models, data, grid, args.sample_size, args.workers)
+    results.to_csv(args.output, index=False)
+    print(f"Ran {len(results)} combinations, results saved to '{args.output}'")
+    print(results.sort_values("final_value", ascending=False).head(10).to_string(index=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -153,9 +153,425 @@ def test_python_files():
     except Exception as e:
         print(f"✗ Failed to import graph.py: {e}")
         return False
+
+    try:
+        import backtest
+        print("✓ backtest.py imported successfully")
+    except Exception as e:
+        print(f"✗ Failed to import backtest.py: {e}")
+        return False
+
+    try:
+        import market_store
+        print("✓ market_store.py imported successfully")
+    except Exception as e:
+        print(f"✗ Failed to import market_store.py: {e}")
+        return False
+
+    try:
+        import indicators
+        print("✓ indicators.py imported successfully")
+    except Exception as e:
+        print(f"✗ Failed to import indicators.py: {e}")
+        return False
+
+    try:
+        import panel
+        print("✓ panel.py imported successfully")
+    except Exception as e:
+        print(f"✗ Failed to import panel.py: {e}")
+        return False
+
+    try:
+        import sweep
+        print("✓ sweep.py imported successfully")
+    except Exception as e:
+        print(f"✗ Failed to import sweep.py: {e}")
+        return False
+
+    try:
+        import model_registry
+        print("✓ model_registry.py imported successfully")
+    except Exception as e:
+        print(f"✗ Failed to import model_registry.py: {e}")
+        return False
+
+    try:
+        import walk_forward
+        print("✓ walk_forward.py imported successfully")
+    except Exception as e:
+        print(f"✗ Failed to import walk_forward.py: {e}")
+        return False
+    try:
+        import feature_cache
+        print("✓ feature_cache.py imported successfully")
+    except Exception as e:
+        print(f"✗ Failed to import feature_cache.py: {e}")
+        return False
+    try:
+        import bar_stream
+        print("✓ bar_stream.py imported successfully")
+    except Exception as e:
+        print(f"✗ Failed to import bar_stream.py: {e}")
+        return False
+    try:
+        import ledger
+        print("✓ ledger.py imported successfully")
+    except Exception as e:
+        print(f"✗ Failed to import ledger.py: {e}")
+        return False
+    try:
+        import ingest
+        print("✓ ingest.py imported successfully")
+    except Exception as e:
+        print(f"✗ Failed to import ingest.py: {e}")
+        return False
+    try:
+        import dashboard
+        print("✓ dashboard.py imported successfully")
+    except Exception as e:
+        print(f"✗ Failed to import dashboard.py: {e}")
+        return False
+    try:
+        import benchmarks
+        print("✓ benchmarks.py imported successfully")
+    except Exception as e:
+        print(f"✗ Failed to import benchmarks.py: {e}")
+        return False
+    try:
+        import instrumentation
+        print("✓ instrumentation.py imported successfully")
+    except Exception as e:
+        print(f"✗ Failed to import instrumentation.py: {e}")
+        return False
+    try:
+        import universe
+        print("✓ universe.py imported successfully")
+    except Exception as e:
+        print(f"✗ Failed to import universe.py: {e}")
+        return False
+    try:
+        import train
+        print("✓ train.py imported successfully")
+    except Exception as e:
+        print(f"✗ Failed to import train.py: {e}")
+        return False
+    try:
+        import rewards
+        print("✓ rewards.py imported successfully")
+    except Exception as e:
+        print(f"✗ Failed to import rewards.py: {e}")
+        return False
+    try:
+        import prediction_service
+        print("✓ prediction_service.py imported successfully")
+    except Exception as e:
+        print(f"✗ Failed to import prediction_service.py: {e}")
+        return False
+    try:
+        import robustness
+        print("✓ robustness.py imported successfully")
+    except Exception as e:
+        print(f"✗ Failed to import robustness.py: {e}")
+        return False
+    try:
+        import reward_model
+        print("✓ reward_model.py imported successfully")
+    except Exception as e:
+        print(f"✗ Failed to import reward_model.py: {e}")
+        return False
+    try:
+        import sim_checkpoint
+        print("✓ sim_checkpoint.py imported successfully")
+    except Exception as e:
+        print(f"✗ Failed to import sim_checkpoint.py: {e}")
+        return False
     
     return True
 
+def test_startup():
+    """Test that the entry points start without loading pandas, matplotlib or sklearn"""
+    print("\nTesting entry point startup...")
+
+    from benchmarks import HEAVY_MODULES, import_profile
+
+    for module in ["daily_trades", "graph"]:
+        profile = import_profile(f"import {module}")
+        heavy = [name for name in HEAVY_MODULES if name in profile]
+        if heavy:
+            print(f"✗ Importing {module}.py loads {', '.join(heavy)}")
+            return False
+        print(f"✓ {module}.py imports in {profile[module] * 1000:.1f} ms")
+
+    # --help must not get past argument parsing into the heavy imports
+    profile = import_profile("import sys, daily_trades; sys.argv = ['daily_trades', '--help']; daily_trades.main()")
+    heavy = [name for name in HEAVY_MODULES if name in profile]
+    if heavy:
+        print(f"✗ daily_trades.py --help loads {', '.join(heavy)}")
+        return False
+    print("✓ daily_trades.py --help stays lightweight")
+
+    return True
+
+def test_feature_cache_clean_rows():
+    """Test that cached features skip the notebooks' overwritten "1.0" rows"""
+    print("\nTesting feature cache on KO and MSFT...")
+
+    import tempfile
+
+    import numpy as np
+    import pandas as pd
+    from feature_cache import FeatureCache, load_feature_frame
+    from indicators import IndicatorEngine
+    from market_store import DATA_PATH
+
+    with tempfile.TemporaryDirectory() as cache_path:
+        for symbol in ["KO", "MSFT"]:
+            csv_path = os.path.join(DATA_PATH, f"{symbol}_price_data.csv")
+            if not os.path.exists(csv_path):
+                print(f"✗ {csv_path} is missing")
+                return False
+            raw = pd.read_csv(csv_path)
+            clean = raw[pd.to_datetime(raw["datetime"], format="ISO8601", errors="coerce").notna()]
+            clean = clean.astype({name: float for name in ["close", "high", "low", "volume"]})
+            expected = IndicatorEngine().update_frame(clean)
+            cached = load_feature_frame(symbol, FeatureCache(cache_path))
+            if len(cached) != len(clean) or not np.array_equal(
+                    cached[expected.columns].to_numpy(), expected.to_numpy(), equal_nan=True):
+                print(f"✗ Cached {symbol} features differ from a recompute over the rows with valid dates")
+                return False
+            print(f"✓ {symbol} features skip {len(raw) - len(clean)} rows without a valid date")
+
+    return True
+
+def test_prediction_service_matches_simulator():
+    """Test that the prediction service's action for a date is the simulator's for that day"""
+    print("\nTesting prediction service against the simulator's rows...")
+
+    import pandas as pd
+    from backtest import decide_orders
+    from daily_trades import (
+        P_DOWN_THRESHOLD, P_UP_THRESHOLD, STRONG_FRACTION, STRONG_THRESHOLD, SYMBOLS, WEAK_FRACTION,
+        load_models, load_stock_data,
+    )
+    from indicators import FEATURES
+    from prediction_service import ACTIONS, FeatureTable, PredictionService
+
+    models = load_models()
+    data = load_stock_data()
+    if not models or not data:
+        print("✗ Models or stock data did not load")
+        return False
+
+    service = PredictionService(models, FeatureTable())
+    thresholds = (P_UP_THRESHOLD, P_DOWN_THRESHOLD, STRONG_THRESHOLD, STRONG_FRACTION, WEAK_FRACTION)
+    for symbol in SYMBOLS:
+        rows = data[symbol]
+        dates = pd.to_datetime(rows["datetime"], format="ISO8601", errors="coerce")
+        rows = rows[dates.notna().to_numpy()]
+        probs = models[symbol].predict_proba(rows[FEATURES])
+        side, _ = decide_orders(probs[:, :1], probs[:, 1:], *thresholds)
+        for date, action in zip(dates[dates.notna()].dt.strftime("%Y-%m-%d"), side[:, 0]):
+            result = service.predict(symbol, date=date)
+            if result["action"] != ACTIONS.get(int(action), "Hold"):
+                print(f"✗ {symbol} {date}: service says {result['action']}, "
+                      f"simulator {ACTIONS.get(int(action), 'Hold')}")
+                return False
+        print(f"✓ {symbol} actions match the simulator on {len(rows)} days")
+
+    return True
+
+def test_indicator_engine_matches_batch():
+    """Test that the streaming IndicatorEngine reproduces the batch compute_features exactly"""
+    print("\nTesting streaming indicators against the batch computation...")
+
+    import numpy as np
+    import pandas as pd
+    from indicators import IndicatorEngine, compute_features
+    from market_store import DATA_PATH
+
+    for symbol in ["AAPL", "KO"]:
+        csv_path = os.path.join(DATA_PATH, f"{symbol}_price_data.csv")
+        if not os.path.exists(csv_path):
+            print(f"✗ {csv_path} is missing")
+            return False
+        raw = pd.read_csv(csv_path)
+        clean = raw[pd.to_datetime(raw["datetime"], format="ISO8601", errors="coerce").notna()]
+        clean = clean.astype({name: float for name in ["close", "high", "low", "volume"]})
+        streamed = IndicatorEngine().update_frame(clean)
+        batch = compute_features(clean)
+        if not np.array_equal(batch[streamed.columns].to_numpy(), streamed.to_numpy(), equal_nan=True):
+            print(f"✗ Streamed {symbol} indicators differ from compute_features")
+            return False
+        print(f"✓ {symbol} streamed indicators match compute_features on {len(clean)} bars")
+
+    return True
+
+def test_flat_forest_matches_sklearn():
+    """Test that FlatForest.predict_proba reproduces the sklearn forest exactly"""
+    print("\nTesting FlatForest against RandomForestClassifier...")
+
+    import numpy as np
+    import pandas as pd
+    from indicators import FEATURES
+    from market_store import DATA_PATH
+    from model_registry import FlatForest
+    from sklearn.ensemble import RandomForestClassifier
+
+    csv_path = os.path.join(DATA_PATH, "AAPL_price_data.csv")
+    if not os.path.exists(csv_path):
+        print(f"✗ {csv_path} is missing")
+        return False
+    df = pd.read_csv(csv_path)
+    df = df[pd.to_datetime(df["datetime"], format="ISO8601", errors="coerce").notna()]
+    X = df[FEATURES].astype(float)
+    # Some missing values, so the trees learn and take their missing-value branches
+    X.iloc[::7, 0] = np.nan
+    label = np.sign(df["close"].astype(float).diff())
+    y = label.where(label != 0.0, 1.0).fillna(1.0)
+
+    model = RandomForestClassifier(n_estimators=25, random_state=0).fit(X, y)
+    if not np.array_equal(FlatForest.from_sklearn(model).predict_proba(X), model.predict_proba(X)):
+        print("✗ FlatForest probabilities differ from predict_proba")
+        return False
+    print(f"✓ FlatForest matches predict_proba on {len(X)} rows")
+
+    return True
+
+def test_window_paths_match_simulate_trades():
+    """Test that robustness window paths share dates and replay simulate_trades exactly"""
+    print("\nTesting robustness window paths against simulate_trades...")
+
+    import numpy as np
+    from backtest import decide_orders, simulate_trades, symbol_matrix
+    from daily_trades import (
+        INITIAL_CAPITAL, P_DOWN_THRESHOLD, P_UP_THRESHOLD, STRONG_FRACTION, STRONG_THRESHOLD, SYMBOLS, WEAK_FRACTION,
+    )
+    from market_store import load_symbol_frame
+    from robustness import aligned_rows, clean_history, draw_windows, path_arrays, simulate_paths
+
+    data = clean_history({symbol: load_symbol_frame(symbol) for symbol in SYMBOLS})
+    n_days = max(len(df) for df in data.values())
+    closes = symbol_matrix(data, SYMBOLS, "close", n_days)
+    tradable = ~np.isnan(closes)
+    # Seeded probabilities stand in for the models; the path kernel only sees the arrays
+    rng = np.random.default_rng(0)
+    p_up = np.where(tradable, rng.random(closes.shape), np.nan)
+    inputs = {"p_down": 1.0 - p_up, "p_up": p_up, "closes": closes, "tradable": tradable}
+    inputs["index"] = index = draw_windows(rng, 8, 75, aligned_rows(data, SYMBOLS))
+
+    dates = np.stack([data[symbol]["datetime"].to_numpy()[index[:, :, j]] for j, symbol in enumerate(SYMBOLS)])
+    if not (dates == dates[:1]).all():
+        print("✗ Window paths mix different dates across symbols")
+        return False
+
+    p_down, p_up, closes, tradable = path_arrays(index, inputs, "window")
+    side, fraction = decide_orders(p_down, p_up, P_UP_THRESHOLD, P_DOWN_THRESHOLD,
+                                   STRONG_THRESHOLD, STRONG_FRACTION, WEAK_FRACTION)
+    n_symbols = len(SYMBOLS)
+    total, _ = simulate_paths(side, fraction, closes, tradable, INITIAL_CAPITAL, INITIAL_CAPITAL, n_symbols)
+    for path in range(len(index)):
+        result = simulate_trades(side[path], fraction[path], closes[path], tradable[path], tradable[path],
+                                 INITIAL_CAPITAL, [0] * n_symbols, INITIAL_CAPITAL, n_symbols)
+        if not np.array_equal(np.asarray(result["total"]), total[path]):
+            print(f"✗ Path {path} differs from simulate_trades")
+            return False
+    print(f"✓ {len(index)} window paths share dates and match simulate_trades")
+
+    return True
+
+def test_reward_model_resume():
+    """Test that resuming the reward model after a half-written last line matches a fresh fit"""
+    print("\nTesting reward model resume after a partial line...")
+
+    import contextlib
+    import io
+    import tempfile
+
+    import numpy as np
+    from reward_model import TRAINING_DATA_FILE, train_reward_model
+
+    if not os.path.exists(TRAINING_DATA_FILE):
+        print(f"✗ {TRAINING_DATA_FILE} is missing")
+        return False
+    with open(TRAINING_DATA_FILE, "rb") as f:
+        data = f.read()
+    # Cut in the middle of the last line, as if the file were still being appended
+    cut = data.rfind(b"\n", 0, len(data) - 1) + 10
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "trading_data.csv")
+        checkpoint = os.path.join(directory, "reward_model.npz")
+        with open(path, "wb") as f:
+            f.write(data[:cut])
+        with contextlib.redirect_stdout(io.StringIO()):
+            train_reward_model(path, checkpoint)
+        with open(path, "ab") as f:
+            f.write(data[cut:])
+        with contextlib.redirect_stdout(io.StringIO()):
+            resumed, stats = train_reward_model(path, checkpoint)
+            fresh, fresh_stats = train_reward_model(path, None, fresh=True)
+
+    if stats["rows"] != fresh_stats["rows"]:
+        print(f"✗ Resumed fit read {stats['rows']} rows, a fresh fit {fresh_stats['rows']}")
+        return False
+    # Batch boundaries differ, so the moments agree only up to rounding
+    if not (np.allclose(resumed.coef_, fresh.coef_, rtol=1e-9, atol=1e-12)
+            and np.isclose(resumed.intercept_, fresh.intercept_, rtol=1e-9, atol=1e-12)):
+        print("✗ Resumed coefficients differ from a fresh fit")
+        return False
+    print(f"✓ Resumed fit reads {stats['rows']} rows and matches a fresh fit")
+
+    return True
+
+def test_checkpoint_resume_matches_replay():
+    """Test that a replay resumed from a checkpoint ends exactly where a full replay does"""
+    print("\nTesting simulation checkpoint resume against a full replay...")
+
+    import contextlib
+    import io
+    import tempfile
+
+    import numpy as np
+    import pandas as pd
+    from bar_stream import csv_days
+    from daily_trades import SYMBOLS
+    from indicators import FEATURES
+    from market_store import load_symbol_frame
+    from sim_checkpoint import resume_simulation
+    from sklearn.ensemble import RandomForestClassifier
+
+    # Small forests on each symbol's stored features stand in for the trained models
+    models = {}
+    for symbol in SYMBOLS:
+        df = load_symbol_frame(symbol)
+        df = df[pd.to_datetime(df["datetime"], format="ISO8601", errors="coerce").notna()].dropna(subset=FEATURES)
+        label = np.sign(df["close"].astype(float).diff())
+        models[symbol] = RandomForestClassifier(n_estimators=10, random_state=0).fit(
+            df[FEATURES].astype(float), label.where(label != 0.0, 1.0).fillna(1.0)
+        )
+
+    def days(end=None):
+        return lambda: csv_days(SYMBOLS, start="2023-06-01", end=end)
+
+    with tempfile.TemporaryDirectory() as directory, contextlib.redirect_stdout(io.StringIO()):
+        checkpoint = os.path.join(directory, "sim_checkpoint.npz")
+        full, _ = resume_simulation(models, days(), None, SYMBOLS, compute_features=True)
+        resume_simulation(models, days("2023-12-31"), checkpoint, SYMBOLS, compute_features=True)
+        resumed, stats = resume_simulation(models, days(), checkpoint, SYMBOLS, compute_features=True)
+
+    if not stats["resumed_days"] or not stats["new_days"]:
+        print(f"✗ Expected a resumed run, got {stats}")
+        return False
+    if (resumed.capital != full.capital or resumed.holdings != full.holdings
+            or not np.array_equal(resumed.ledger.total, full.ledger.total)):
+        print("✗ Resumed simulation differs from a full replay")
+        return False
+    print(f"✓ Resuming after {stats['resumed_days']} days matches a full replay of "
+          f"{stats['resumed_days'] + stats['new_days']} days")
+
+    return True
+
 def main():
     """Run all tests"""
     print("=" * 50)
@@ -167,7 +583,15 @@ def main():
         ("Project Structure", test_file_structure),
         ("Model Files", test_model_files),
         ("Data Files", test_data_files),
-        ("Python Files", test_python_files)
+        ("Python Files", test_python_files),
+        ("Startup", test_startup),
+        ("Feature Cache", test_feature_cache_clean_rows),
+        ("Prediction Service", test_prediction_service_matches_simulator),
+        ("Indicator Engine", test_indicator_engine_matches_batch),
+        ("Flat Forest", test_flat_forest_matches_sklearn),
+        ("Robustness Paths", test_window_paths_match_simulate_trades),
+        ("Reward Model", test_reward_model_resume),
+        ("Simulation Checkpoint", test_checkpoint_resume_matches_replay)
     ]
     
     results = []
@@ -1,6 +1,73 @@
-from flask import Flask, render_template
+import os
+import sys
+import threading
 
-app = Flask(__name__)
+from flask import Flask, Response, jsonify, render_template, request, send_from_directory
+
+# The app lives one level below the trading modules and their data paths
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from dashboard import MAX_POINTS, build_feed  # noqa: E402
+from feature_cache import FEATURE_CACHE_PATH  # noqa: E402
+from instrumentation import METRICS  # noqa: E402
+from market_store import DATA_PATH, STORE_PATH  # noqa: E402
+from model_registry import MODEL_PATH  # noqa: E402
+from prediction_service import build_service  # noqa: E402
+
+app = Flask(__name__, template_folder=".", static_folder=None)
+METRICS.enable()
+feed = None
+feed_lock = threading.Lock()
+service = None
+service_lock = threading.Lock()
+
+
+def _root_path(path):
+    """Repository-relative data path resolved against ROOT, whatever the working directory"""
+    return os.path.join(ROOT, path)
+
+
+def get_feed():
+    """Start replaying the simulation on first use"""
+    global feed
+    with feed_lock:
+        if feed is None:
+            feed = build_feed(data_path=_root_path(DATA_PATH), model_path=_root_path(MODEL_PATH))
+            feed.run_in_background()
+    return feed
+
+
+def get_service():
+    """Load the models for the prediction endpoint on first use; they stay loaded"""
+    global service
+    with service_lock:
+        if service is None:
+            service = build_service(data_path=_root_path(DATA_PATH), model_path=_root_path(MODEL_PATH),
+                                    cache_path=_root_path(FEATURE_CACHE_PATH),
+                                    store_path=_root_path(STORE_PATH)).start()
+    return service
+
+
+def _range_params(**extra):
+    params = {"start": request.args.get("start") or None, "end": request.args.get("end") or None}
+    params.update(extra)
+    return params
+
+
+def _conditional(name, params):
+    """JSON response that answers If-None-Match with 304 while the data is unchanged"""
+    try:
+        etag, body = get_feed().response(name, params)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype="application/json")
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
 
 
 @app.route("/")
@@ -8,5 +75,83 @@ def home():
     return render_template("index.html")
 
 
+@app.route("/static/styles.css")
+def styles():
+    return send_from_directory(app.root_path, "styles.css")
+
+
+@app.route("/api/status")
+def status():
+    return _conditional("status", {})
+
+
+@app.route("/api/portfolio")
+def portfolio():
+    return _conditional("portfolio", _range_params(points=request.args.get("points", MAX_POINTS, type=int)))
+
+
+@app.route("/api/symbols")
+def symbols():
+    return _conditional("symbols", _range_params(points=request.args.get("points", MAX_POINTS, type=int)))
+
+
+@app.route("/api/trades")
+def trades():
+    return _conditional("trades", _range_params(limit=request.args.get("limit", 500, type=int)))
+
+
+@app.route("/metrics")
+def metrics():
+    return Response(METRICS.to_prometheus(), mimetype="text/plain; version=0.0.4")
+
+
+@app.route("/api/metrics")
+def metrics_json():
+    return jsonify(METRICS.to_dict())
+
+
+@app.route("/api/predict", methods=["POST"])
+def predict():
+    """Signals for {"symbol", "features" | "date"} or {"requests": [...]}, batched with other clients"""
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return jsonify({"error": "Expected a JSON object"}), 400
+    if "requests" in body:
+        if not isinstance(body["requests"], list):
+            return jsonify({"error": "'requests' must be a list"}), 400
+        return jsonify({"results": get_service().predict_many(body["requests"])})
+    if "symbol" not in body:
+        return jsonify({"error": "Missing 'symbol'"}), 400
+    return _signal(body["symbol"], body.get("features"), body.get("date"))
+
+
+@app.route("/api/predict/<symbol>")
+def predict_symbol(symbol):
+    """Signal for a symbol on ?date=YYYY-MM-DD, or on its latest bar"""
+    return _signal(symbol, None, request.args.get("date") or None)
+
+
+@app.route("/api/predict/stats")
+def predict_stats():
+    return jsonify(get_service().stats())
+
+
+def _signal(symbol, features, date):
+    try:
+        return jsonify(get_service().predict(symbol, features, date))
+    except KeyError:
+        return jsonify({"error": f"Unknown symbol {symbol}"}), 404
+    except (ValueError, TypeError) as e:
+        return jsonify({"error": str(e)}), 400
+    except TimeoutError as e:
+        return jsonify({"error": str(e)}), 503
+
+
+@app.route("/api/advance", methods=["POST"])
+def advance():
+    days = request.args.get("days", 1, type=int)
+    return jsonify({"added": get_feed().advance(days), "version": get_feed().version})
+
+
 if __name__ == "__main__":
-    app.run(debug=True)
+    app.run(debug=True, threaded=True, use_reloader=False)
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Train the per-symbol RandomForest models that the simulators load.
+Replaces the per-ticker notebooks: features are the CSV's own indicator columns (the
+shared feature cache for OHLCV-only data), symbols train in parallel worker processes,
+and unchanged symbols are skipped.
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import joblib
+import numpy as np
+import pandas as pd
+import sklearn
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import accuracy_score
+from sklearn.model_selection import RandomizedSearchCV, train_test_split
+
+from feature_cache import FEATURE_CACHE_PATH, INPUT_COLUMNS, FeatureCache
+from indicators import FEATURES
+from market_store import CSV_SUFFIX, DATA_PATH, STORE_PATH, MarketStore, load_symbol_frame
+from model_registry import META_SUFFIX, MODEL_PATH, MODEL_SUFFIX
+
+# 2: train on the CSV's stored feature columns, which the simulators score on
+TRAINING_VERSION = 2
+
+# Hyperparameter space of the notebooks' RandomizedSearchCV
+SEARCH_GRID = {
+    "n_estimators": list(range(200, 2000, 200)),
+    "max_features": ["sqrt", None, "log2"],
+    "max_depth": list(range(10, 110, 10)) + [None],
+    "min_samples_split": [2, 5, 10, 20, 30, 40],
+    "min_samples_leaf": [1, 2, 7, 12, 14, 16, 20],
+    "bootstrap": [True, False],
+}
+
+
+def plan_workers(n_symbols, workers=None, cpus=None):
+    """Split the cores between symbol processes and trees per forest
+
+    Returns (processes, n_jobs per model) with processes * n_jobs <= cores, so
+    a few symbols still use every core and many symbols do not oversubscribe.
+    """
+    cpus = cpus or os.cpu_count() or 1
+    processes = max(1, min(workers or cpus, n_symbols, cpus))
+    return processes, max(1, cpus // processes)
+
+
+def prepare_training_frame(df):
+    """Price rows in date order, without rows whose date does not parse"""
+    dates = pd.to_datetime(df["datetime"], format="ISO8601", errors="coerce")
+    # Drop rows without a valid date, e.g. the notebooks' overwritten "1.0" rows
+    df = df[dates.notna().to_numpy()].copy()
+    df["datetime"] = dates[dates.notna()].dt.strftime("%Y-%m-%d").to_numpy()
+    df = df.sort_values("datetime", kind="stable").reset_index(drop=True)
+    return df
+
+
+def add_label(df):
+    """Prediction = sign of the day's close change, flat days counted as up"""
+    label = np.sign(df["close"].diff())
+    df["Prediction"] = label.where(label != 0.0, 1.0)
+    return df.dropna(subset=FEATURES + ["Prediction"])
+
+
+def stored_features(df):
+    """True if the frame carries every model feature as a column, as the notebook CSVs do"""
+    return all(name in df.columns for name in FEATURES)
+
+
+def data_hash(df, config):
+    """Fingerprint of the raw inputs, stored features, dates and training settings"""
+    columns = INPUT_COLUMNS + (FEATURES if stored_features(df) else [])
+    digest = hashlib.sha256()
+    digest.update(np.ascontiguousarray(df[columns].to_numpy(dtype=np.float64)).tobytes())
+    digest.update("\n".join(df["datetime"]).encode())
+    digest.update(json.dumps(config, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def read_metadata(model_path, symbol):
+    path = os.path.join(model_path, f"{symbol}{META_SUFFIX}")
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable metadata {path}: {e}")
+        return None
+
+
+def _write_atomic(path, write):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def save_model(model_path, symbol, model, metadata):
+    """Write the model, then its metadata, each through a temporary file and a rename"""
+    os.makedirs(model_path, exist_ok=True)
+    _write_atomic(os.path.join(model_path, f"{symbol}{MODEL_SUFFIX}"), lambda path: joblib.dump(model, path))
+
+    def write_metadata(path):
+        with open(path, "w") as f:
+            json.dump(metadata, f, indent=2)
+
+    _write_atomic(os.path.join(model_path, f"{symbol}{META_SUFFIX}"), write_metadata)
+
+
+def fit_model(X_train, y_train, config, n_jobs):
+    """Fixed forest as in the notebooks, or their randomized search when config["search"]"""
+    if not config["search"]:
+        model = RandomForestClassifier(n_estimators=config["trees"], oob_score=True, criterion="gini",
+                                       random_state=config["seed"], n_jobs=n_jobs)
+        return model.fit(X_train, y_train)
+    # The search parallelises over candidates, so each forest gets a single thread.
+    # Threads rather than joblib's default worker processes: a process pool nested
+    # inside a train_universe worker keeps it alive long after the symbol is done.
+    search = RandomizedSearchCV(RandomForestClassifier(n_jobs=1), param_distributions=SEARCH_GRID,
+                                n_iter=config["n_iter"], cv=3, random_state=config["seed"], n_jobs=n_jobs)
+    with joblib.parallel_backend("threading", n_jobs=n_jobs):
+        return search.fit(X_train, y_train).best_estimator_
+
+
+def train_symbol(symbol, config, data_path=DATA_PATH, model_path=MODEL_PATH, cache_path=FEATURE_CACHE_PATH,
+                 n_jobs=1, force=False):
+    """Train and save one symbol's model; returns a status dict"""
+    start = time.perf_counter()
+    try:
+        store = MarketStore(STORE_PATH) if data_path == DATA_PATH else None
+        df = prepare_training_frame(load_symbol_frame(symbol, data_path, store))
+        fingerprint = data_hash(df, config)
+        metadata = read_metadata(model_path, symbol)
+        model_file = os.path.join(model_path, f"{symbol}{MODEL_SUFFIX}")
+        if (not force and metadata is not None and metadata.get("data_hash") == fingerprint
+                and os.path.exists(model_file)):
+            return {"symbol": symbol, "status": "skipped", "accuracy": metadata.get("accuracy"),
+                    "seconds": time.perf_counter() - start}
+
+        # Train on the features the simulators will score: the CSV's own columns
+        # when it has them, otherwise the shared on-disk feature cache, which
+        # load_stock_data then serves for this model (see feature_source)
+        source = "csv" if stored_features(df) else "computed"
+        if source == "computed":
+            df = FeatureCache(cache_path).with_features(symbol, df)
+        df = add_label(df)
+        X_train, X_test, y_train, y_test = train_test_split(
+            df[FEATURES], df["Prediction"], random_state=config["seed"]
+        )
+        model = fit_model(X_train, y_train, config, n_jobs)
+        accuracy = accuracy_score(y_test, model.predict(X_test))
+        # Inference runs one symbol at a time; do not spawn threads per call
+        model.n_jobs = None
+
+        seconds = time.perf_counter() - start
+        save_model(model_path, symbol, model, {
+            "symbol": symbol,
+            "features": FEATURES,
+            "feature_source": source,
+            "accuracy": accuracy,
+            "train_rows": len(X_train),
+            "test_rows": len(X_test),
+            "first_date": df["datetime"].iloc[0],
+            "last_date": df["datetime"].iloc[-1],
+            "data_hash": fingerprint,
+            "config": config,
+            "params": {key: value for key, value in model.get_params().items() if key != "n_jobs"},
+            "sklearn": sklearn.__version__,
+            "trained_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "train_seconds": seconds,
+        })
+        return {"symbol": symbol, "status": "trained", "accuracy": accuracy, "seconds": seconds}
+    except Exception as e:
+        return {"symbol": symbol, "status": "failed", "error": str(e), "seconds": time.perf_counter() - start}
+
+
+def training_config(trees=100, search=False, n_iter=100, seed=0):
+    """Settings that change the trained model; part of every data hash"""
+    return {"version": TRAINING_VERSION, "trees": trees, "search": search, "n_iter": n_iter, "seed": seed}
+
+
+def train_universe(symbols, config, data_path=DATA_PATH, model_path=MODEL_PATH,
+                   cache_path=FEATURE_CACHE_PATH, workers=None, force=False):
+    """Train every symbol across a process pool and return the status rows"""
+    processes, n_jobs = plan_workers(len(symbols), workers)
+    print(f"Training {len(symbols)} symbols in {processes} processes x {n_jobs} jobs")
+    args = (config, data_path, model_path, cache_path, n_jobs, force)
+
+    results = []
+    if processes == 1:
+        for symbol in symbols:
+            results.append(train_symbol(symbol, *args))
+            _report(results[-1])
+        return results
+
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        futures = [pool.submit(train_symbol, symbol, *args) for symbol in symbols]
+        for future in as_completed(futures):
+            results.append(future.result())
+            _report(results[-1])
+    order = {symbol: i for i, symbol in enumerate(symbols)}
+    return sorted(results, key=lambda row: order[row["symbol"]])
+
+
+def _report(result):
+    if result["status"] == "failed":
+        print(f"✗ {result['symbol']}: {result['error']}")
+    elif result["status"] == "skipped":
+        print(f"- {result['symbol']}: inputs unchanged, skipped")
+    else:
+        print(f"✓ {result['symbol']}: accuracy {result['accuracy'] * 100:.2f}% ({result['seconds']:.1f}s)")
+
+
+def main(argv=None):
+    """Train models for the given symbols, every CSV by default"""
+    parser = argparse.ArgumentParser(description="Train per-symbol RandomForest models in parallel")
+    parser.add_argument("symbols", nargs="*", help="Symbols to train (default: every CSV in --data-path)")
+    parser.add_argument("--universe", default=None, help="Universe file or comma separated symbols")
+    parser.add_argument("--data-path", default=DATA_PATH)
+    parser.add_argument("--model-path", default=MODEL_PATH)
+    parser.add_argument("--cache-path", default=FEATURE_CACHE_PATH)
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: cores, capped at symbols)")
+    parser.add_argument("--trees", type=int, default=100)
+    parser.add_argument("--search", action="store_true", help="Tune with the notebooks' RandomizedSearchCV")
+    parser.add_argument("--n-iter", type=int, default=100, help="Search candidates with --search")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--force", action="store_true", help="Retrain even when the inputs are unchanged")
+    args = parser.parse_args(argv)
+
+    symbols = args.symbols
+    if not symbols and args.universe:
+        from universe import resolve_universe
+        symbols = resolve_universe(args.universe)
+    if not symbols:
+        symbols = sorted(
+            os.path.basename(path)[:-len(CSV_SUFFIX)]
+            for path in glob.glob(os.path.join(args.data_path, "*" + CSV_SUFFIX))
+        )
+    if not symbols:
+        print("No symbols to train. Exiting.")
+        return 1
+
+    config = training_config(args.trees, args.search, args.n_iter, args.seed)
+    start = time.perf_counter()
+    results = train_universe(symbols, config, args.data_path, args.model_path, args.cache_path,
+                             args.workers, args.force)
+    counts = {status: sum(row["status"] == status for row in results) for status in ("trained", "skipped", "failed")}
+    print(f"\n{counts['trained']} trained, {counts['skipped']} skipped, {counts['failed']} failed "
+          f"in {time.perf_counter() - start:.1f}s")
+    return 1 if counts["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
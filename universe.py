@@ -0,0 +1,56 @@
+import os
+
+# Default universe file read by the simulators when present
+UNIVERSE_FILE = "universe.txt"
+
+
+def read_universe_file(path):
+    """Tickers from a text file: one or more per line, comma or space separated, # comments"""
+    symbols = []
+    with open(path) as f:
+        for line in f:
+            line = line.split("#", 1)[0]
+            symbols += [token.strip().upper() for token in line.replace(",", " ").split() if token.strip()]
+    return list(dict.fromkeys(symbols))
+
+
+def scan_universe(data_path=None, model_path=None, prices=None):
+    """Symbols that have both a price CSV (or store entry) and a trained model on disk
+
+    With a long-format `prices` CSV, the symbols in that file count as priced instead.
+    """
+    # market_store and model_registry pull in pandas and joblib, so import them late
+    from market_store import CSV_SUFFIX, DATA_PATH, STORE_PATH, MarketStore, open_long_store
+    from model_registry import MODEL_PATH, ModelRegistry
+
+    if prices is not None:
+        priced = set(open_long_store(prices).symbols())
+    else:
+        data_path = data_path or DATA_PATH
+        priced = set(MarketStore(STORE_PATH).symbols())
+        if os.path.isdir(data_path):
+            priced.update(name[:-len(CSV_SUFFIX)] for name in os.listdir(data_path) if name.endswith(CSV_SUFFIX))
+    return [symbol for symbol in ModelRegistry(model_path or MODEL_PATH, compact=True).symbols() if symbol in priced]
+
+
+def resolve_universe(source=None, data_path=None, model_path=None, prices=None):
+    """Turn a universe setting into a ticker list
+
+    `source` can be a list of tickers, a comma separated string, a universe
+    file, or "scan" to use every symbol with data and a model. With no source
+    the UNIVERSE_FILE is used if it exists, otherwise None (the default four);
+    with a long-format `prices` CSV and no source, the file is scanned.
+    """
+    if source is None:
+        if prices is not None:
+            return scan_universe(data_path, model_path, prices)
+        if not os.path.exists(UNIVERSE_FILE):
+            return None
+        source = UNIVERSE_FILE
+    if not isinstance(source, str):
+        return list(dict.fromkeys(source))
+    if source == "scan":
+        return scan_universe(data_path, model_path, prices)
+    if os.path.exists(source):
+        return read_universe_file(source)
+    return list(dict.fromkeys(token.strip().upper() for token in source.split(",") if token.strip()))
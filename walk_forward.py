@@ -0,0 +1,154 @@
+import copy
+import hashlib
+import json
+import os
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.base import clone
+
+
+def predict(train, test, predictors, model, threshold=0.6):
+    """Fit on train and return the Target / Predictions frame for test, as in get_money.ipynb"""
+    model.fit(train[predictors], train["Target"])
+    preds = model.predict_proba(test[predictors])[:, 1]
+    preds = np.where(preds >= threshold, 1.0, 0.0)
+    preds = pd.Series(preds, index=test.index, name="Predictions")
+    return pd.concat([test["Target"], preds], axis=1)
+
+
+def _fold_hashes(X, y, bounds):
+    """Chained hash of the training prefix for every fold, so each row is hashed once"""
+    digest = hashlib.sha256()
+    hashes = []
+    previous = 0
+    for end in bounds:
+        digest.update(np.ascontiguousarray(X[previous:end]).tobytes())
+        digest.update(np.ascontiguousarray(y[previous:end]).tobytes())
+        hashes.append(digest.copy().hexdigest())
+        previous = end
+    return hashes
+
+
+def _fit_fold(model, X, y, end):
+    """Fit a fresh copy of the model on rows [0, end) without copying the prefix"""
+    fold_model = clone(model)
+    fold_model.fit(X[:end], y[:end])
+    return fold_model
+
+
+class WalkForwardBacktest:
+    """Expanding-window backtest with parallel folds and a fitted-model cache
+
+    Fold i trains on rows [0, start + i * step) and predicts the next `step`
+    rows. Fitted fold models are cached on disk keyed by the training data,
+    predictors, hyperparameters and fold, so rerunning after a small change
+    only refits the folds whose inputs changed.
+
+    With `warm_start_trees`, each fold reuses the previous fold's forest and
+    adds that many trees trained on the longer prefix instead of refitting.
+    Older trees then keep their shorter training window, so results differ
+    from a full refit; folds run sequentially in that mode.
+    """
+
+    def __init__(self, model, predictors, start=2500, step=250, threshold=0.6,
+                 n_jobs=1, cache_path=None, warm_start_trees=None):
+        self.model = model
+        self.predictors = list(predictors)
+        self.start = start
+        self.step = step
+        self.threshold = threshold
+        self.n_jobs = n_jobs
+        self.cache_path = cache_path
+        self.warm_start_trees = warm_start_trees
+        self.stats = {"folds": 0, "cache_hits": 0, "fits": 0}
+
+    def _params_key(self):
+        params = {key: repr(value) for key, value in sorted(self.model.get_params().items())}
+        return json.dumps({
+            "model": type(self.model).__name__,
+            "params": params,
+            "predictors": self.predictors,
+            "warm_start_trees": self.warm_start_trees,
+        }, sort_keys=True)
+
+    def _cache_file(self, data_hash, fold):
+        if self.cache_path is None:
+            return None
+        key = hashlib.sha256(f"{self._params_key()}|{data_hash}|{fold}".encode()).hexdigest()
+        return os.path.join(self.cache_path, f"{key}.pkl")
+
+    def _load_cached(self, path):
+        if self.cache_path is None or not os.path.exists(path):
+            return None
+        try:
+            return joblib.load(path)
+        except Exception as e:
+            print(f"Ignoring unreadable fold cache {path}: {e}")
+            return None
+
+    def _save_cached(self, path, model):
+        if self.cache_path is None:
+            return
+        os.makedirs(self.cache_path, exist_ok=True)
+        joblib.dump(model, path + ".tmp")
+        os.replace(path + ".tmp", path)
+
+    def _fit_folds(self, X, y, bounds, hashes):
+        """Fitted model for every fold, from the cache where possible"""
+        paths = [self._cache_file(data_hash, fold) for fold, data_hash in enumerate(hashes)]
+        models = [self._load_cached(path) for path in paths]
+        self.stats["cache_hits"] += sum(model is not None for model in models)
+        missing = [fold for fold, model in enumerate(models) if model is None]
+
+        if self.warm_start_trees:
+            for fold in missing:
+                previous = models[fold - 1] if fold > 0 else None
+                if previous is None:
+                    models[fold] = _fit_fold(self.model, X, y, bounds[fold])
+                else:
+                    grown = copy.deepcopy(previous)
+                    grown.set_params(warm_start=True, n_estimators=previous.n_estimators + self.warm_start_trees)
+                    grown.fit(X[:bounds[fold]], y[:bounds[fold]])
+                    models[fold] = grown
+                self._save_cached(paths[fold], models[fold])
+        elif missing:
+            # Loky memory-maps large arrays for the workers, so X is shared rather than copied per fold
+            fitted = joblib.Parallel(n_jobs=self.n_jobs)(
+                joblib.delayed(_fit_fold)(self.model, X, y, bounds[fold]) for fold in missing
+            )
+            for fold, model in zip(missing, fitted):
+                models[fold] = model
+                self._save_cached(paths[fold], model)
+
+        self.stats["fits"] += len(missing)
+        return models
+
+    def run(self, data):
+        """Walk forward over data and return the Target / Predictions frame"""
+        # Trees fit and predict on C-contiguous float32, so fold prefixes X[:end] go in without a copy
+        X = np.ascontiguousarray(data[self.predictors].to_numpy(dtype=np.float32))
+        y = data["Target"].to_numpy()
+        bounds = list(range(self.start, len(data), self.step))
+        if not bounds:
+            return pd.DataFrame(columns=["Target", "Predictions"])
+
+        hashes = _fold_hashes(X, y, bounds)
+        models = self._fit_folds(X, y, bounds, hashes)
+        self.stats["folds"] += len(bounds)
+
+        all_predictions = []
+        for end, model in zip(bounds, models):
+            test = data.iloc[end:end + self.step]
+            preds = model.predict_proba(X[end:end + self.step])[:, 1]
+            preds = pd.Series(np.where(preds >= self.threshold, 1.0, 0.0), index=test.index, name="Predictions")
+            all_predictions.append(pd.concat([test["Target"], preds], axis=1))
+        return pd.concat(all_predictions)
+
+
+def backtest(data, model, predictors, start=2500, step=250, n_jobs=1, cache_path=None, warm_start_trees=None):
+    """Drop-in replacement for get_money.ipynb's backtest()"""
+    engine = WalkForwardBacktest(model, predictors, start, step, n_jobs=n_jobs,
+                                 cache_path=cache_path, warm_start_trees=warm_start_trees)
+    return engine.run(data)